@@ -2,6 +2,23 @@
 
 # Script to backup the SHG PostgreSQL database
 # Usage: ./backup_db.sh [optional_output_directory]
+#
+# Full backup in pg_dump's directory format, dumped with parallel jobs and
+# streamed out of the container as tar through zstd (no uncompressed copy on the
+# host, no second compression pass). Restore with ./restore_db.sh <file.tar.zst>.
+#
+# Rotation: every backup lands in daily/; the first one of a week and of a month
+# is also hard-linked into weekly/ and monthly/. Each folder keeps the newest
+# BACKUP_KEEP_DAILY / _WEEKLY / _MONTHLY files.
+#
+# Between full backups, ./snapshot_db.sh exports only the changed garten rows.
+#
+# Settings (environment or .env.prod):
+#   BACKUP_JOBS          parallel pg_dump jobs (default: CPUs of the db container)
+#   BACKUP_ZSTD_LEVEL    zstd level (default: 3)
+#   BACKUP_KEEP_DAILY=7  BACKUP_KEEP_WEEKLY=4  BACKUP_KEEP_MONTHLY=6
+
+set -euo pipefail
 
 # Configuration
 CONTAINER_NAME="django_db"
@@ -13,50 +30,92 @@ if [ ! -f "$ENV_FILE" ]; then
     exit 1
 fi
 
-# Extract DB user and name from .env.prod
-# We use grep/cut to simple extraction. 
-# It assumes lines like POSTGRES_USER=django_user
-DB_USER=$(grep "^POSTGRES_USER=" $ENV_FILE | cut -d '=' -f2 | tr -d '\r"')
-DB_NAME=$(grep "^POSTGRES_DB=" $ENV_FILE | cut -d '=' -f2 | tr -d '\r"')
+if ! command -v zstd > /dev/null; then
+    echo "Error: zstd is not installed (apt install zstd)."
+    exit 1
+fi
+
+# Value from the environment, else from .env.prod, else the default
+setting() {
+    local value="${!1:-}"
+    if [ -z "$value" ]; then
+        value=$(grep "^$1=" "$ENV_FILE" | tail -n 1 | cut -d '=' -f2- | tr -d '\r"' || true)
+    fi
+    echo "${value:-$2}"
+}
+
+DB_USER=$(setting POSTGRES_USER "")
+DB_NAME=$(setting POSTGRES_DB "")
 
 if [ -z "$DB_USER" ] || [ -z "$DB_NAME" ]; then
     echo "Error: Could not extract POSTGRES_USER or POSTGRES_DB from $ENV_FILE"
     exit 1
 fi
 
+JOBS=$(setting BACKUP_JOBS "$(docker exec "$CONTAINER_NAME" nproc)")
+LEVEL=$(setting BACKUP_ZSTD_LEVEL 3)
+KEEP_DAILY=$(setting BACKUP_KEEP_DAILY 7)
+KEEP_WEEKLY=$(setting BACKUP_KEEP_WEEKLY 4)
+KEEP_MONTHLY=$(setting BACKUP_KEEP_MONTHLY 6)
+
 # Set output directory
 OUTPUT_DIR="${1:-./backups}"
-mkdir -p "$OUTPUT_DIR"
+mkdir -p "$OUTPUT_DIR/daily" "$OUTPUT_DIR/weekly" "$OUTPUT_DIR/monthly" "$OUTPUT_DIR/snapshots"
 
 # Generate filename with timestamp
 TIMESTAMP=$(date +"%Y-%m-%d_%H-%M-%S")
-BACKUP_FILE="$OUTPUT_DIR/backup_shg_${TIMESTAMP}.sql"
+NAME="backup_shg_${TIMESTAMP}.tar.zst"
+BACKUP_FILE="$OUTPUT_DIR/daily/$NAME"
+PARTIAL_FILE="$BACKUP_FILE.partial"
+DUMP_DIR="/tmp/shg_dump_${TIMESTAMP}"
 
 echo "Starting backup for database '$DB_NAME'..."
-echo "Container: $CONTAINER_NAME"
+echo "Container: $CONTAINER_NAME ($JOBS parallel jobs)"
 echo "Target: $BACKUP_FILE"
 
-# Execute pg_dump
-# We don't need the password if we execute as the postgres user inside the container,
-# or we can rely on .pgpass. But simpler is usually just running it.
-# Docker exec usually runs as root, so we might need to specify user inside container.
-# The official postgres image runs as 'postgres' user usually, or we pass credentials.
-# Best practice: use PGPASSWORD env var inline inside the exec or rely on trust auth (since local).
-# Actually, 'docker exec' runs as root by default, so we can su to postgres or just run pg_dump.
-# Since we know the DB user (django_user), we force that user.
-
-docker exec -t $CONTAINER_NAME pg_dump -U "$DB_USER" "$DB_NAME" > "$BACKUP_FILE"
-
-if [ $? -eq 0 ]; then
-    echo "✅ Backup successful: $BACKUP_FILE"
-    # Gzip the backup to save space
-    gzip "$BACKUP_FILE"
-    echo "📦 Compressed: $BACKUP_FILE.gz"
-else
-    echo "❌ Backup failed!"
-    # Clean up empty file if it exists and size is 0
-    if [ ! -s "$BACKUP_FILE" ]; then
-        rm -f "$BACKUP_FILE"
+trap 'rm -f "$PARTIAL_FILE"; echo "❌ Backup failed!"' ERR
+
+# Everything committed before this transaction horizon is in the dump;
+# snapshot_db.sh continues from here
+TOKEN=$(docker exec "$CONTAINER_NAME" psql -U "$DB_USER" -d "$DB_NAME" -Atc \
+    "SELECT pg_snapshot_xmin(pg_current_snapshot())")
+
+# No 'docker exec -t': a TTY would mangle the binary stream.
+# pg_dump does not compress (--compress=0), zstd does that multi-threaded on the host.
+docker exec "$CONTAINER_NAME" sh -c '
+    set -e
+    trap "rm -rf \"$1\"" EXIT
+    pg_dump -U "$2" -d "$3" --format=directory --jobs="$4" --compress=0 --file="$1"
+    tar -C "$1" -cf - .
+' sh "$DUMP_DIR" "$DB_USER" "$DB_NAME" "$JOBS" | zstd -T0 -"$LEVEL" -q -o "$PARTIAL_FILE"
+
+mv "$PARTIAL_FILE" "$BACKUP_FILE"
+trap - ERR
+echo "$TOKEN" > "$OUTPUT_DIR/snapshots/.token"
+echo "✅ Backup successful: $BACKUP_FILE ($(du -h "$BACKUP_FILE" | cut -f1))"
+
+# Promote to weekly/monthly when there is no newer copy there yet
+promote() {
+    local dir="$OUTPUT_DIR/$1"
+    if [ -z "$(find "$dir" -name 'backup_shg_*.tar.zst' -mtime -"$2" -print -quit)" ]; then
+        ln -f "$BACKUP_FILE" "$dir/$NAME"
+        echo "📦 Kept as $1 backup"
     fi
-    exit 1
+}
+promote weekly 7
+promote monthly 30
+
+# Keep the newest N backups per folder
+prune() {
+    find "$OUTPUT_DIR/$1" -name 'backup_shg_*.tar.zst' -printf '%T@ %p\n' | sort -rn \
+        | tail -n +"$(($2 + 1))" | cut -d ' ' -f2- | xargs -r rm -f --
+}
+prune daily "$KEEP_DAILY"
+prune weekly "$KEEP_WEEKLY"
+prune monthly "$KEEP_MONTHLY"
+
+# Snapshots older than the oldest daily backup cannot be replayed onto anything we keep
+OLDEST=$(find "$OUTPUT_DIR/daily" -name 'backup_shg_*.tar.zst' -printf '%T@ %p\n' | sort -n | head -n 1 | cut -d ' ' -f2-)
+if [ -n "$OLDEST" ]; then
+    find "$OUTPUT_DIR/snapshots" -name 'snapshot_shg_*.jsonl.zst' ! -newer "$OLDEST" -delete
 fi
@@ -2,7 +2,10 @@
 # Register your models here.
 # Datei: garten/admin.py
 from django.contrib import admin
-from .models import Sorte, PflanzplanEintrag, Kategorie, Art
+from django.db import transaction
+from . import bestand, filter_options
+from .models import Sorte, PflanzplanEintrag, Kategorie, Art, Bestandsbewegung
+from .pagination import GeschaetzterPaginator
 
 
 @admin.register(Kategorie)
@@ -20,21 +23,57 @@ class ArtAdmin(admin.ModelAdmin):
 @admin.register(Sorte)
 class SorteAdmin(admin.ModelAdmin):
     list_display = ('name', 'kategorie', 'art', 'bestand', 'einheit', 'info_url')
+    list_select_related = ('kategorie', 'art')
     search_fields = ('name', 'kategorie__name', 'art__name')
+    autocomplete_fields = ('kategorie', 'art')
+    paginator = GeschaetzterPaginator
+    show_full_result_count = False
     actions = ['duplicate_sorte']
 
     def duplicate_sorte(self, request, queryset):
-        for obj in queryset:
-            new_obj = Sorte.objects.get(pk=obj.pk)
-            new_obj.pk = None
-            new_obj.name = f"{obj.name} (Kopie)"
-            new_obj.save()
-        self.message_user(request, f"{queryset.count()} Sorte(n) dupliziert.")
+        kopien = []
+        for obj in queryset.order_by('pk'):
+            obj.pk = None
+            obj.name = f"{obj.name} (Kopie)"
+            obj.version = 1
+            obj._state.adding = True
+            kopien.append(obj)
+        # One INSERT for all copies; bulk_create() skips save() and the signals
+        with transaction.atomic():
+            kopien = Sorte.objects.bulk_create(kopien)
+            bestand.eroeffnen(kopien)
+        filter_options.invalidate(Sorte)
+        self.message_user(request, f"{len(kopien)} Sorte(n) dupliziert.")
     duplicate_sorte.short_description = "Ausgewählte Sorten duplizieren"
 
 @admin.register(PflanzplanEintrag)
 class PflanzplanEintragAdmin(admin.ModelAdmin):
     list_display = ('sorte', 'jahr', 'aussaatdatum', 'anzahl_samen', 'art_der_aussaat')
+    # Sorte.__str__ shows the Kategorie
+    list_select_related = ('sorte', 'sorte__kategorie')
     list_filter = ('jahr', 'art_der_aussaat')
     search_fields = ('sorte__name',)
     readonly_fields = ('jahr',)
+    autocomplete_fields = ('sorte',)
+    paginator = GeschaetzterPaginator
+    show_full_result_count = False
+
+
+@admin.register(Bestandsbewegung)
+class BestandsbewegungAdmin(admin.ModelAdmin):
+    """Read-only: the ledger is written through garten.bestand and never edited."""
+    list_display = ('erstellt_am', 'sorte', 'menge', 'grund', 'pflanzplan_eintrag_id')
+    list_filter = ('grund',)
+    search_fields = ('sorte__name',)
+    list_select_related = ('sorte', 'sorte__kategorie')
+    paginator = GeschaetzterPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
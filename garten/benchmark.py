@@ -0,0 +1,274 @@
+"""
+Synthetic datasets and timed benchmarks for `manage.py benchmark`.
+
+erzeuge_daten() fills the database with a reproducible garden catalogue at
+any scale (scale=1: 50 Kategorien, 500 Arten, 20k Sorten, 200k entries over
+20 years). BENCHMARKS lists every list view, sorte_analyse, the API endpoints
+and both importers; messe() times one of them and counts its queries.
+vergleiche() checks results against a stored baseline.
+
+benchmarks/baseline.json is the committed baseline for the default dataset
+(scale=1). Timings depend on the machine and database, so CI regenerates it
+with --save-baseline whenever its runner changes and otherwise runs
+`manage.py benchmark --require-baseline`, which fails when the baseline is
+missing, was measured on another scale or database, lacks a benchmark, or
+is exceeded.
+"""
+import csv
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import bestand, filter_options, statistik, sync
+from .models import Art, Kategorie, PflanzplanEintrag, Sorte
+from .pagination import KeysetPaginator
+from .views import PFLANZPLAN_SORTIERUNGEN
+
+GROESSEN = {'kategorien': 50, 'arten': 500, 'sorten': 20000, 'eintraege': 200000, 'jahre': 20}
+IMPORT_GROESSEN = {'sorten': 2000, 'eintraege': 5000}
+BATCH_SIZE = 2000
+
+MONATE = ('Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli', 'August', 'September', 'Oktober',
+          'November', 'Dezember')
+WOERTER = ('Rote', 'Gelbe', 'Frühe', 'Späte', 'Lange', 'Runde', 'Wilde', 'Süße', 'Scharfe', 'Kleine')
+GEFAESSE = ('Anzuchtschale', 'Multitopfplatte', 'Quelltopf', 'Topf 9cm', '')
+
+
+def skaliert(scale):
+    return {name: max(1, round(anzahl * scale)) if name != 'jahre' else anzahl for name, anzahl in GROESSEN.items()}
+
+
+def erzeuge_daten(scale=1.0, seed=1):
+    """
+    Creates the dataset with bulk_create and returns the generated counts.
+    The same scale and seed always produce the same rows.
+    """
+    rnd = random.Random(seed)
+    groessen = skaliert(scale)
+    letztes_jahr = datetime.date.today().year
+
+    with transaction.atomic():
+        kategorien = Kategorie.objects.bulk_create(
+            [Kategorie(name=f"Kategorie {i:03d}") for i in range(groessen['kategorien'])], batch_size=BATCH_SIZE,
+        )
+        arten = Art.objects.bulk_create(
+            [Art(name=f"Art {i:04d}") for i in range(groessen['arten'])], batch_size=BATCH_SIZE,
+        )
+        sorten = [
+            Sorte(
+                name=f"{rnd.choice(WOERTER)} Sorte {i:05d}",
+                # Some Sorten without Kategorie/Art, like in the real catalogue
+                kategorie=rnd.choice(kategorien) if rnd.random() > 0.05 else None,
+                art=rnd.choice(arten) if rnd.random() > 0.2 else None,
+                aussaat_start_monat=rnd.randint(1, 6),
+                aussaat_end_monat=rnd.randint(6, 12),
+                bestand=round(rnd.uniform(0, 50), 2),
+                einheit=rnd.choice(('ANZ', 'G')),
+            )
+            for i in range(groessen['sorten'])
+        ]
+        for sorte in sorten:
+            sorte.ableiten()  # bulk_create skips save()
+        sorten = Sorte.objects.bulk_create(sorten, batch_size=BATCH_SIZE)
+        bestand.eroeffnen(sorten)
+
+        schluessel = set()
+        eintraege = []
+        while len(schluessel) < groessen['eintraege']:
+            sorte = rnd.choice(sorten)
+            aussaat = datetime.date(letztes_jahr - rnd.randrange(groessen['jahre']), rnd.randint(1, 7), rnd.randint(1, 28))
+            if (sorte.pk, aussaat) in schluessel:
+                continue
+            schluessel.add((sorte.pk, aussaat))
+            anzucht = rnd.random() < 0.6
+            eintraege.append(PflanzplanEintrag(
+                sorte=sorte,
+                jahr=aussaat.year,  # bulk_create skips save()
+                aussaatdatum=aussaat,
+                anzahl_samen=rnd.randint(1, 40),
+                art_der_aussaat='ANZUCHT' if anzucht else 'FREILAND',
+                anzuchtgefaess=rnd.choice(GEFAESSE) if anzucht else '',
+                pikierdatum=aussaat + datetime.timedelta(days=rnd.randint(10, 30)) if anzucht else None,
+                pflanzdatum=aussaat + datetime.timedelta(days=rnd.randint(40, 80)) if rnd.random() < 0.5 else None,
+            ))
+            if len(eintraege) >= BATCH_SIZE:
+                PflanzplanEintrag.objects.bulk_create(eintraege)
+                eintraege = []
+        PflanzplanEintrag.objects.bulk_create(eintraege)
+
+    # bulk_create sends no signals
+    filter_options.invalidate(Kategorie, Art, Sorte, PflanzplanEintrag)
+    statistik.neu_aufbauen()
+    return {
+        'kategorien': Kategorie.objects.count(),
+        'arten': Art.objects.count(),
+        'sorten': Sorte.objects.count(),
+        'eintraege': PflanzplanEintrag.objects.count(),
+    }
+
+
+def _deutsches_datum(datum):
+    return f"{datum.day}. {MONATE[datum.month - 1]} {datum.year}"
+
+
+def schreibe_importdateien(verzeichnis, scale=1.0, seed=2):
+    """Sorte.json and Pflanzplan.csv in the importers' export formats, half of them new rows."""
+    rnd = random.Random(seed)
+    anzahl_sorten = max(1, round(IMPORT_GROESSEN['sorten'] * scale))
+    anzahl_eintraege = max(1, round(IMPORT_GROESSEN['eintraege'] * scale))
+    vorhandene = list(Sorte.objects.order_by('id').values_list('name', flat=True)[:anzahl_sorten // 2])
+    namen = vorhandene + [f"Import Sorte {i:05d}" for i in range(anzahl_sorten - len(vorhandene))]
+
+    sorten_pfad = os.path.join(verzeichnis, 'Sorte.json')
+    with open(sorten_pfad, 'w', encoding='utf-8') as datei:
+        json.dump([{
+            'Name': name,
+            'Anzucht': f"1. {MONATE[rnd.randint(0, 5)]} 2025",
+            'Art': f"Art {rnd.randrange(GROESSEN['arten']):04d}",
+            'Bestand': f"{rnd.uniform(0, 50):.2f}".replace('.', ','),
+            'Einheit': rnd.choice(('g', 'k')),
+            'Kategorie': f"Kategorie {rnd.randrange(GROESSEN['kategorien']):03d}",
+            'URL': '',
+        } for name in namen], datei, ensure_ascii=False)
+
+    pflanzplan_pfad = os.path.join(verzeichnis, 'Pflanzplan.csv')
+    with open(pflanzplan_pfad, 'w', encoding='utf-8', newline='') as datei:
+        writer = csv.writer(datei)
+        writer.writerow(['Name', 'Anzahl', 'Aussaat', 'pikiert', 'ID', 'wie?', 'wo?', 'Sorten'])
+        for i in range(anzahl_eintraege):
+            aussaat = datetime.date(2025, rnd.randint(1, 7), rnd.randint(1, 28))
+            writer.writerow([
+                i, rnd.randint(1, 40), _deutsches_datum(aussaat), '', i, rnd.choice(('Anzucht', 'Freiland')), '',
+                f"{rnd.choice(namen)} (https://example.org)",
+            ])
+    return sorten_pfad, pflanzplan_pfad
+
+
+def _get(pfad, **params):
+    def lauf(client, kontext):
+        response = client.get(pfad, params)
+        assert response.status_code == 200, f"{pfad}: HTTP {response.status_code}"
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return lauf
+
+
+def _get_mit(pfad, parameter):
+    """Like _get, with query parameters that depend on the generated data."""
+    def lauf(client, kontext):
+        return _get(pfad, **parameter(kontext))(client, kontext)
+    return lauf
+
+
+def _import(kommando, datei, *args):
+    def lauf(client, kontext):
+        # Rolled back, so every repetition imports into the same data
+        with transaction.atomic():
+            call_command(kommando, kontext[datei], *args, stdout=StringIO(), stderr=StringIO())
+            transaction.set_rollback(True)
+    return lauf
+
+
+BENCHMARKS = {
+    'index': _get('/'),
+    'pflanzplan_list': _get('/pflanzplan/'),
+    'pflanzplan_list_jahr': _get_mit('/pflanzplan/', lambda k: {'jahr': k['jahr']}),
+    'pflanzplan_list_sorte': _get_mit('/pflanzplan/', lambda k: {'sorte': k['sorte_id']}),
+    'pflanzplan_list_kategorie_sortiert': _get('/pflanzplan/', sort='sorte__kategorie__name'),
+    'pflanzplan_list_seite_10': _get_mit('/pflanzplan/', lambda k: {'cursor': k['cursor_seite_10']}),
+    'sorte_list': _get('/sorten/'),
+    'sorte_list_kategorie': _get_mit('/sorten/', lambda k: {'kategorie': k['kategorie_id']}),
+    'sorte_analyse': _get_mit('/sorten-analyse/', lambda k: {'lookup_id': k['sorte_name']}),
+    'auswahl_sorten': _get('/auswahl/sorte/', q='sorte 1'),
+    'sorte_create': _get('/sorten/neu/'),
+    'pflanzplan_create': _get('/pflanzplan/neu/'),
+    'api_sorten': _get('/api/sorten/'),
+    'api_pflanzplan': _get('/api/pflanzplan/'),
+    'api_kategorien': _get('/api/kategorien/'),
+    'api_arten': _get('/api/arten/'),
+    'api_sorten_kalender': _get('/api/sorten/kalender/', monat=4),
+    'api_sorten_jahresplan': _get('/api/sorten/jahresplan/'),
+    'aussaat_kalender': _get('/kalender/', monat=4),
+    'bestand_knapp': _get('/bestand/knapp/'),
+    'api_sync_delta': _get_mit('/api/sync/', lambda k: {'since': k['sync_token']}),
+    'export_pflanzplan_csv': _get_mit('/pflanzplan/export/', lambda k: {'jahr': k['jahr']}),
+    'import_sorten': _import('import_sorten', 'sorten_datei', '--bulk'),
+    'import_pflanzplan': _import('import_pflanzplan', 'pflanzplan_datei'),
+}
+
+
+def kontext():
+    """Values from the generated data that the parametrised benchmarks need."""
+    eintrag = PflanzplanEintrag.objects.select_related('sorte').order_by('-jahr', 'id').first()
+    sorte = eintrag.sorte if eintrag else Sorte.objects.order_by('id').first()
+    # "Weiter" cursor of the tenth page of the default Pflanzplan ordering
+    paginator = KeysetPaginator(PflanzplanEintrag.objects.all(), PFLANZPLAN_SORTIERUNGEN['-jahr'])
+    cursor = None
+    for _ in range(10):
+        cursor = paginator.page(cursor).next_cursor or cursor
+    return {
+        'cursor_seite_10': cursor,
+        'jahr': PflanzplanEintrag.objects.order_by('-jahr').values_list('jahr', flat=True).first(),
+        'sorte_id': sorte.pk,
+        'sorte_name': sorte.name,
+        'kategorie_id': Kategorie.objects.values_list('pk', flat=True).first(),
+        # Past the overlap window of the freshly generated rows: the fixed cost of a delta sync
+        'sync_token': sync.token(timezone.now() + datetime.timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)),
+    }
+
+
+def messe(lauf, client, kontext, wiederholungen=5):
+    """Runs once to warm up the caches, then returns median/min/max ms and the query count."""
+    lauf(client, kontext)
+    zeiten = []
+    for _ in range(wiederholungen):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            lauf(client, kontext)
+            zeiten.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(zeiten), 2),
+        'min_ms': round(min(zeiten), 2),
+        'max_ms': round(max(zeiten), 2),
+        'queries': len(queries),
+    }
+
+
+def vergleiche(ergebnisse, baseline, toleranz, streng=False):
+    """
+    Returns one message per benchmark that is slower than baseline * (1 + toleranz)
+    or runs more queries. With streng, benchmarks missing from the baseline count too.
+    """
+    regressionen = []
+    for name, ergebnis in ergebnisse.items():
+        basis = baseline.get(name)
+        if not basis:
+            if streng:
+                regressionen.append(f"{name}: fehlt in der Baseline")
+            continue
+        if ergebnis['queries'] > basis['queries']:
+            regressionen.append(f"{name}: {ergebnis['queries']} Queries statt {basis['queries']}")
+        if ergebnis['median_ms'] > basis['median_ms'] * (1 + toleranz):
+            regressionen.append(
+                f"{name}: {ergebnis['median_ms']:.1f} ms statt {basis['median_ms']:.1f} ms "
+                f"(+{100 * (ergebnis['median_ms'] / basis['median_ms'] - 1):.0f}%)"
+            )
+    return regressionen
+
+
+def importdateien(scale):
+    """Temporary directory with the importer inputs; the caller cleans it up."""
+    verzeichnis = tempfile.TemporaryDirectory()
+    sorten_datei, pflanzplan_datei = schreibe_importdateien(verzeichnis.name, scale)
+    return verzeichnis, {'sorten_datei': sorten_datei, 'pflanzplan_datei': pflanzplan_datei}
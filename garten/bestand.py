@@ -0,0 +1,196 @@
+"""
+Seed stock ledger.
+
+Every change of Sorte.bestand is appended to Bestandsbewegung and applied
+to bestand with `bestand = bestand + <menge>` in the same transaction, so
+edits from several phones at once add up instead of overwriting each other:
+
+- a new Sorte books its initial bestand as INVENTUR,
+- editing bestand (form, API, admin, import) books the difference as
+  KORREKTUR. The SorteForm and the API send back the bestand the editor read
+  (`bestand_gelesen`) and the difference is taken to that, so a sowing
+  booked since the page or response was loaded is kept. Without it (admin,
+  API clients that leave it out) the difference is taken to the value
+  loaded by the saving request,
+- a new Pflanzplan entry (form, API, import) deducts anzahl_samen from
+  Sorten counted in pieces (einheit ANZ) as AUSSAAT. Changing the entry
+  books the difference, deleting it books the reversal (STORNO).
+
+Entries from before the ledger never booked anything and do not book when
+edited later either. Sorte.bestand is denormalized: abgleichen()
+(`manage.py bestand_abgleichen`) resets it to the ledger sum where they
+differ, e.g. after a raw SQL edit.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import filter_options
+from .models import Bestandsbewegung, Sorte
+
+BATCH_SIZE = 500
+
+_BETRAG = DecimalField(max_digits=9, decimal_places=2)
+
+
+def bewegungen_anlegen(bewegungen):
+    """Appends the movements and adds their sums to Sorte.bestand, one UPDATE per batch."""
+    bewegungen = [b for b in bewegungen if b.menge]
+    if not bewegungen:
+        return
+    summen = defaultdict(Decimal)
+    for bewegung in bewegungen:
+        summen[bewegung.sorte_id] += Decimal(bewegung.menge)
+    jetzt = timezone.now()
+    with transaction.atomic():
+        Bestandsbewegung.objects.bulk_create(bewegungen, batch_size=BATCH_SIZE)
+        # Sorted, so concurrent bookings lock the rows in the same order
+        sorte_ids = sorted(summen)
+        for start in range(0, len(sorte_ids), BATCH_SIZE):
+            teil = sorte_ids[start:start + BATCH_SIZE]
+            Sorte.objects.filter(pk__in=teil).update(
+                bestand=F('bestand') + Case(*[When(pk=pk, then=Value(summen[pk])) for pk in teil], output_field=_BETRAG),
+                updated_at=jetzt,
+            )
+        # Usually inside the caller's transaction, see signals.invalidate_filter_options
+        transaction.on_commit(lambda: filter_options.invalidate(Sorte))
+
+
+def buchen(sorte, menge, grund, pflanzplan_eintrag=None):
+    """One movement; returns the new bestand."""
+    bewegungen_anlegen([Bestandsbewegung(
+        sorte_id=getattr(sorte, 'pk', sorte), menge=menge, grund=grund, pflanzplan_eintrag=pflanzplan_eintrag,
+    )])
+    return Sorte.objects.values_list('bestand', flat=True).get(pk=getattr(sorte, 'pk', sorte))
+
+
+def eroeffnen(sorten):
+    """INVENTUR movements for the bestand of Sorten just written with bulk_create()."""
+    Bestandsbewegung.objects.bulk_create(
+        [Bestandsbewegung(sorte=sorte, menge=sorte.bestand, grund=Bestandsbewegung.INVENTUR)
+         for sorte in sorten if sorte.bestand],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def sorte_speichern(sorte, speichern, *args, **kwargs):
+    """Sorte.save(): writes every field but bestand, which is booked, see the module docstring."""
+    geladen = getattr(sorte, '_bestand_geladen', None)
+    # Set by SorteForm/SorteSerializer: the bestand the editor was shown
+    gelesen = sorte.__dict__.pop('_bestand_gelesen', None)
+    update_fields = kwargs.get('update_fields')
+    with transaction.atomic():
+        if sorte.pk is None or sorte._state.adding:
+            speichern(*args, **kwargs)
+            if sorte.bestand:
+                Bestandsbewegung.objects.create(sorte=sorte, menge=sorte.bestand, grund=Bestandsbewegung.INVENTUR)
+        elif geladen is None or (update_fields is not None and 'bestand' not in update_fields):
+            speichern(*args, **kwargs)
+        else:
+            felder = update_fields if update_fields is not None else [
+                feld.name for feld in sorte._meta.concrete_fields if not feld.primary_key
+            ]
+            speichern(*args, **{**kwargs, 'update_fields': [f for f in felder if f != 'bestand']})
+            differenz = Decimal(str(sorte.bestand)) - (geladen if gelesen is None else Decimal(gelesen))
+            if differenz:
+                sorte.bestand = buchen(sorte, differenz, Bestandsbewegung.KORREKTUR)
+            elif gelesen is not None and gelesen != geladen:
+                # Unchanged, but booked since the editor read it
+                sorte.bestand = geladen
+    sorte._bestand_geladen = sorte.bestand
+
+
+def korrekturen_buchen(sorten, vorher):
+    """
+    KORREKTUR movements for Sorten written with bulk_update(); `vorher` are
+    copies from before the edit. Where the client sent bestand_gelesen the
+    Sorten get the booked bestand back.
+    """
+    alt = {sorte.pk: sorte.bestand for sorte in vorher}
+    gelesen = {sorte.pk: Decimal(sorte.__dict__.pop('_bestand_gelesen'))
+               for sorte in sorten if '_bestand_gelesen' in sorte.__dict__}
+    bewegungen_anlegen([
+        Bestandsbewegung(sorte_id=sorte.pk, menge=Decimal(sorte.bestand) - gelesen.get(sorte.pk, alt[sorte.pk]),
+                         grund=Bestandsbewegung.KORREKTUR)
+        for sorte in sorten
+    ])
+    if gelesen:
+        aktuell = dict(Sorte.objects.filter(pk__in=list(gelesen)).values_list('pk', 'bestand'))
+        for sorte in sorten:
+            sorte.bestand = aktuell.get(sorte.pk, sorte.bestand)
+
+
+def aussaaten_buchen(eintraege, neu=False):
+    """
+    Books the seeds of saved Pflanzplan entries: new entries (neu=True) are
+    deducted, entries booked before get the difference to what they should
+    have booked now, also when they moved to another Sorte.
+    """
+    if not eintraege:
+        return
+    gebucht = defaultdict(dict)
+    if not neu:
+        zeilen = (Bestandsbewegung.objects.filter(pflanzplan_eintrag__in=[e.pk for e in eintraege])
+                  .order_by().values_list('pflanzplan_eintrag_id', 'sorte_id').annotate(summe=Sum('menge')))
+        for eintrag_id, sorte_id, summe in zeilen:
+            gebucht[eintrag_id][sorte_id] = summe
+    zu_buchen = [e for e in eintraege if neu or gebucht.get(e.pk)]
+    if not zu_buchen:
+        return
+    stueck = set(Sorte.objects.filter(pk__in={e.sorte_id for e in zu_buchen}, einheit='ANZ')
+                 .values_list('pk', flat=True))
+    bewegungen = []
+    for eintrag in zu_buchen:
+        soll = {eintrag.sorte_id: -Decimal(eintrag.anzahl_samen)} if eintrag.sorte_id in stueck else {}
+        bisher = gebucht.get(eintrag.pk, {})
+        for sorte_id in sorted(soll.keys() | bisher.keys()):
+            bewegungen.append(Bestandsbewegung(
+                sorte_id=sorte_id, menge=soll.get(sorte_id, 0) - bisher.get(sorte_id, 0),
+                grund=Bestandsbewegung.AUSSAAT, pflanzplan_eintrag_id=eintrag.pk,
+            ))
+    bewegungen_anlegen(bewegungen)
+
+
+def aussaat_stornieren(eintrag):
+    """Gives back what a deleted Pflanzplan entry had deducted."""
+    zeilen = (Bestandsbewegung.objects.filter(pflanzplan_eintrag_id=eintrag.pk)
+              .order_by().values_list('sorte_id').annotate(summe=Sum('menge')))
+    bewegungen_anlegen([
+        Bestandsbewegung(sorte_id=sorte_id, menge=-summe, grund=Bestandsbewegung.STORNO, pflanzplan_eintrag_id=eintrag.pk)
+        for sorte_id, summe in zeilen
+    ])
+
+
+def abgleichen():
+    """Resets Sorte.bestand to its ledger sum where the two differ; returns how many Sorten changed."""
+    summe = (Bestandsbewegung.objects.filter(sorte=OuterRef('pk')).order_by()
+             .values('sorte').annotate(summe=Sum('menge')).values('summe'))
+    soll = Coalesce(Subquery(summe), Value(Decimal(0)), output_field=_BETRAG)
+    anzahl = Sorte.objects.annotate(soll=soll).exclude(bestand=F('soll')).update(bestand=soll, updated_at=timezone.now())
+    if anzahl:
+        filter_options.invalidate(Sorte)
+    return anzahl
+
+
+def knapp(tage=365):
+    """
+    Sorten whose bestand does not cover what was sown from them in the last
+    `tage` days (or is used up), with `verbrauch` and `fehlmenge` annotated,
+    largest shortfall first; one aggregate query.
+    """
+    seit = timezone.now() - datetime.timedelta(days=tage)
+    verbrauch = Sum(
+        -F('bewegungen__menge'),
+        filter=Q(bewegungen__grund__in=[Bestandsbewegung.AUSSAAT, Bestandsbewegung.STORNO],
+                 bewegungen__erstellt_am__gte=seit),
+    )
+    return (Sorte.objects.select_related('kategorie')
+            .annotate(verbrauch=Coalesce(verbrauch, Value(Decimal(0)), output_field=_BETRAG))
+            .annotate(fehlmenge=F('verbrauch') - F('bestand'))
+            .filter(fehlmenge__gte=0)
+            .order_by('-fehlmenge', 'name', 'id'))
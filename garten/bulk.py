@@ -0,0 +1,187 @@
+"""
+Bulk write actions for the API viewsets, on /api/<resource>/bulk/:
+
+- POST   a list of objects: created with one bulk_create(),
+- PATCH  a list of partial objects with "id": saved with one bulk_update()
+         of the fields that were sent,
+- DELETE a list of ids.
+
+The whole list is validated before anything is written and the write runs in
+one transaction: either every item is applied or the response is a 400 with
+the errors by list index, like DRF's ListSerializer. PATCH items may carry
+the `version` the client read (models.Versioniert); the rows are locked for
+the transaction and any outdated item makes it a 409. Foreign keys are checked
+with one query per related model (VorgeladenerPrimaryKeyRelatedField), unique
+constraints with one query for the whole list.
+
+bulk_create()/bulk_update() skip save() and the signals, so the derived
+fields (Model.ableiten()), updated_at and filter_options are handled here.
+Fields listed in Model.GEBUCHTE_FELDER are not written by bulk_update();
+viewsets book them in bulk_verbuchen(), inside the transaction, and add
+their own follow-up work in bulk_nachbereiten(). Deletes go through
+QuerySet.delete() and therefore through the usual signals.
+"""
+import copy
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError, Q, UniqueConstraint
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import filter_options
+from .models import Versioniert
+from .serializers import VersionKonflikt
+
+
+def _liste(data):
+    if not isinstance(data, list):
+        raise serializers.ValidationError({'detail': 'Erwartet wird eine Liste.'})
+    grenze = getattr(settings, 'API_MAX_BULK_SIZE', 1000)
+    if len(data) > grenze:
+        raise serializers.ValidationError({'detail': f'Höchstens {grenze} Einträge pro Anfrage.'})
+    return data
+
+
+def _eindeutige_felder(model):
+    """Field tuples of the model's unconditional unique constraints."""
+    felder = [tuple(c.fields) for c in model._meta.constraints
+              if isinstance(c, UniqueConstraint) and c.fields and c.condition is None]
+    return felder + [tuple(f) for f in model._meta.unique_together]
+
+
+class BulkAktionenMixin:
+    """For ModelViewSets whose serializer uses BulkFaehigMixin."""
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        items = _liste(request.data)
+        if request.method == 'DELETE':
+            return self.bulk_loeschen(items)
+        with transaction.atomic():
+            if request.method == 'POST':
+                objekte, vorher, felder = self._bulk_anlegen(items), [], None
+            else:
+                objekte, vorher, felder = self._bulk_aendern(items)
+            jetzt = timezone.now()
+            for obj in objekte:
+                if hasattr(obj, 'ableiten'):
+                    obj.ableiten()
+                obj.updated_at = jetzt
+                if felder is not None and isinstance(obj, Versioniert):
+                    # The rows are locked since _bulk_aendern()
+                    obj.version += 1
+                    felder.add('version')
+            self._eindeutig_pruefen(objekte)
+            model = self.get_queryset().model
+            try:
+                if felder is None:
+                    model.objects.bulk_create(objekte)
+                else:
+                    abgeleitet = getattr(model, 'ABGELEITETE_FELDER', ())
+                    gebucht = getattr(model, 'GEBUCHTE_FELDER', ())
+                    model.objects.bulk_update(objekte, sorted({*felder, *abgeleitet, 'updated_at'} - {*gebucht}))
+            except IntegrityError:
+                # Rows written concurrently since _eindeutig_pruefen()
+                raise serializers.ValidationError({'detail': 'Ein Eintrag verletzt eine Eindeutigkeitsregel.'})
+            self.bulk_verbuchen(objekte, vorher if felder is not None else None)
+        self.bulk_nachbereiten(objekte, vorher)
+        antwort = self.get_serializer(objekte, many=True).data
+        return Response(antwort, status=status.HTTP_201_CREATED if felder is None else status.HTTP_200_OK)
+
+    def _bulk_kontext(self, items):
+        """Serializer context with every referenced related row loaded, one query per related model."""
+        vorgeladen = {}
+        for name, feld in self.get_serializer().fields.items():
+            if not isinstance(feld, serializers.PrimaryKeyRelatedField) or feld.read_only:
+                continue
+            pks = set()
+            for item in items:
+                wert = item.get(name) if isinstance(item, dict) else None
+                if isinstance(wert, (int, str)) and not isinstance(wert, bool) and str(wert).isdigit():
+                    pks.add(int(wert))
+            model = feld.get_queryset().model
+            vorgeladen.setdefault(model, {}).update(feld.get_queryset().in_bulk(pks) if pks else {})
+        return {**self.get_serializer_context(), 'bulk': True, 'vorgeladen': vorgeladen}
+
+    def _bulk_anlegen(self, items):
+        serializer = self.get_serializer_class()(data=items, many=True, context=self._bulk_kontext(items))
+        serializer.is_valid(raise_exception=True)
+        model = self.get_queryset().model
+        return [model(**{feld: wert for feld, wert in daten.items() if feld != 'version'})
+                for daten in serializer.validated_data]
+
+    def _bulk_aendern(self, items):
+        kontext = self._bulk_kontext(items)
+        ids = [item.get('id') for item in items if isinstance(item, dict)]
+        vorhanden = self.get_queryset().select_for_update(of=('self',)).in_bulk(
+            [pk for pk in ids if isinstance(pk, int) and not isinstance(pk, bool)])
+        objekte, vorher, felder, fehler, konflikte = [], [], set(), {}, {}
+        for index, item in enumerate(items):
+            obj = vorhanden.get(item.get('id')) if isinstance(item, dict) else None
+            if obj is None:
+                fehler[index] = {'id': ['Unbekannte oder fehlende ID.']}
+                continue
+            serializer = self.get_serializer_class()(obj, data=item, partial=True, context=kontext)
+            if not serializer.is_valid():
+                fehler[index] = serializer.errors
+                continue
+            version = serializer.validated_data.pop('version', obj.version)
+            if version != obj.version:
+                konflikte[index] = {'version': [f'Veraltet, aktuell ist Version {obj.version}.']}
+                continue
+            vorher.append(copy.copy(obj))
+            for feld, wert in serializer.validated_data.items():
+                setattr(obj, feld, wert)
+                felder.add(feld)
+            objekte.append(obj)
+        if fehler:
+            raise serializers.ValidationError(fehler)
+        if konflikte:
+            raise VersionKonflikt(konflikte)
+        if len({obj.pk for obj in objekte}) < len(objekte):
+            raise serializers.ValidationError({'detail': 'Jede ID darf nur einmal vorkommen.'})
+        return objekte, vorher, felder
+
+    def _eindeutig_pruefen(self, objekte):
+        """Checks the unique constraints of the whole list against itself and the table in one query each."""
+        model = self.get_queryset().model
+        for felder in _eindeutige_felder(model):
+            namen = [model._meta.get_field(f).attname for f in felder]
+            schluessel = [tuple(getattr(obj, n) for n in namen) for obj in objekte]
+            bedingung = Q()
+            for werte in set(schluessel):
+                bedingung |= Q(**dict(zip(namen, werte)))
+            belegt = set(model.objects.filter(bedingung).exclude(pk__in=[o.pk for o in objekte if o.pk])
+                         .values_list(*namen)) if schluessel else set()
+            fehler, gesehen = {}, set()
+            for index, werte in enumerate(schluessel):
+                if werte in belegt or werte in gesehen:
+                    fehler[index] = {'non_field_errors': [f"Die Felder {', '.join(felder)} müssen eine eindeutige Menge bilden."]}
+                gesehen.add(werte)
+            if fehler:
+                raise serializers.ValidationError(fehler)
+
+    def bulk_loeschen(self, ids):
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise serializers.ValidationError({'detail': 'Erwartet wird eine Liste von IDs.'})
+        with transaction.atomic():
+            queryset = self.get_queryset().model.objects.filter(pk__in=ids)
+            fehlend = set(ids) - set(queryset.values_list('pk', flat=True))
+            if fehlend:
+                return Response({'detail': f'Unbekannte IDs: {sorted(fehlend)}'}, status=status.HTTP_404_NOT_FOUND)
+            try:
+                queryset.delete()
+            except ProtectedError as error:
+                return Response({'detail': f'Wird noch verwendet: {len(error.protected_objects)} abhängige Einträge.'},
+                                status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def bulk_verbuchen(self, objekte, vorher):
+        """Runs inside the transaction after the write; `vorher` is None for created rows."""
+
+    def bulk_nachbereiten(self, objekte, vorher):
+        """Runs after the commit; `vorher` holds copies of the updated rows from before the change."""
+        filter_options.invalidate(self.get_queryset().model)
@@ -0,0 +1,120 @@
+"""
+Conditional GET (ETag / Last-Modified) for the list pages and the API.
+
+A response is described by Count() and Max('updated_at') of every model it
+shows. The aggregates are cached per filter_options version: saves, deletes
+and invalidate() bump the version, so they are only computed again after a
+change. A revalidation of unchanged data therefore answers 304 without
+rendering and without running a query.
+
+Deleting a row lowers the count but not Max('updated_at'), and a transaction
+that commits late can add or change rows with an updated_at older than the
+maximum already seen. So the ETag also carries the version itself, and once
+the version moved Last-Modified is the time the change was first seen, so
+clients that only send If-Modified-Since also get the new page.
+
+The ETag also covers the user and the CSRF cookie, because the pages greet
+the user and carry a CSRF token. Responses are marked private/no-cache:
+browsers keep them, but must revalidate every time.
+"""
+import hashlib
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import filter_options
+
+
+def _letzter_key(model):
+    return f'garten:stand:{model._meta.model_name}:letzter'
+
+
+def stand(model):
+    """{'anzahl': ..., 'geaendert': ..., 'version': ...} of the whole table, cached per version."""
+    version = filter_options.version(model)
+    key = f'garten:stand:{model._meta.model_name}:v{version}'
+    werte = cache.get(key)
+    if werte is None:
+        werte = model.objects.aggregate(anzahl=Count('pk'), geaendert=Max('updated_at'))
+        werte['version'] = version
+        vorher = cache.get(_letzter_key(model))
+        if vorher and vorher.get('version') != version:
+            # Changed since the last computation; deletions and late commits
+            # do not move Max('updated_at')
+            werte['geaendert'] = timezone.now()
+        cache.set(key, werte, filter_options.TIMEOUT)
+        cache.set(_letzter_key(model), werte, None)
+    return werte
+
+
+def validatoren(user, cookies, models):
+    """(ETag, Last-Modified) for a response showing `models` to `user`."""
+    staende = [stand(model) for model in models]
+    teile = [str(user.pk), cookies.get(settings.CSRF_COOKIE_NAME, '')]
+    teile += [
+        f"{s['version']}:{s['anzahl']}:{s['geaendert'].isoformat() if s['geaendert'] else '-'}" for s in staende
+    ]
+    etag = 'W/"%s"' % hashlib.md5('|'.join(teile).encode(), usedforsecurity=False).hexdigest()
+    geaendert = max((s['geaendert'] for s in staende if s['geaendert']), default=None)
+    return etag, int(geaendert.timestamp()) if geaendert else None
+
+
+def _header(response, etag, geaendert):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if geaendert and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(geaendert)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def antwort(request, models, erzeugen):
+    """Returns a 304, or erzeugen() with the validators set. For DRF views and other sync code."""
+    if request.method not in ('GET', 'HEAD'):
+        return erzeugen()
+    etag, geaendert = validatoren(request.user, request.COOKIES, models)
+    response = get_conditional_response(request, etag=etag, last_modified=geaendert) or erzeugen()
+    return _header(response, etag, geaendert)
+
+
+def bedingt(*models):
+    """
+    View decorator: answers If-None-Match / If-Modified-Since with 304 unless
+    one of `models` changed. Goes below @login_required.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                # auser() is cached from login_required; request.user would load it again
+                user = await request.auser()
+                etag, geaendert = await sync_to_async(validatoren)(user, request.COOKIES, models)
+                response = get_conditional_response(request, etag=etag, last_modified=geaendert)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _header(response, etag, geaendert)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                return antwort(request, models, lambda: view(request, *args, **kwargs))
+        return inner
+    return decorator
+
+
+class BedingteAntwortMixin:
+    """Conditional GET for list/retrieve of a DRF viewset; set bedingt_modelle."""
+    bedingt_modelle = ()
+
+    def list(self, request, *args, **kwargs):
+        return antwort(request, self.bedingt_modelle, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return antwort(request, self.bedingt_modelle, partial(super().retrieve, request, *args, **kwargs))
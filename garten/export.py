@@ -0,0 +1,195 @@
+"""
+CSV/XLSX export of the Pflanzplan and the Sorten catalogue, used by the
+export views and `manage.py export`.
+
+Rows are read with values_list().iterator(), so the full result set is never
+held in memory: on PostgreSQL the iterator fetches CHUNK_SIZE rows at a time
+through a server-side cursor (except with DB_PGBOUNCER, which disables them).
+CSV goes out in chunks as the rows arrive; XLSX is written by xlsxwriter in
+constant-memory mode to a temporary file and sent from there, because the
+zip container is only complete once the workbook is closed.
+
+The views check the filter parameters with filter_werte() before the first
+byte goes out, because an error inside the stream can only cut the download
+off. Text that a spreadsheet would run as a formula is exported as text.
+"""
+import csv
+import io
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .models import PflanzplanEintrag, Sorte
+
+CHUNK_SIZE = 2000
+ROWS_PER_CHUNK = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+FORMATE = ('csv', 'xlsx')
+
+# Spreadsheets treat cells starting with one of these as a formula
+FORMEL_ZEICHEN = ('=', '+', '-', '@')
+
+PFLANZPLAN_SPALTEN = (
+    ('Jahr', 'jahr'),
+    ('Aussaatdatum', 'aussaatdatum'),
+    ('Sorte', 'sorte__name'),
+    ('Kategorie', 'sorte__kategorie__name'),
+    ('Art der Aussaat', 'art_der_aussaat'),
+    ('Anzahl Samen', 'anzahl_samen'),
+    ('Anzuchtgefäß', 'anzuchtgefaess'),
+    ('Pikierdatum', 'pikierdatum'),
+    ('Pflanzdatum', 'pflanzdatum'),
+    ('Beschreibung', 'beschreibung'),
+)
+
+SORTE_SPALTEN = (
+    ('Name', 'name'),
+    ('Kategorie', 'kategorie__name'),
+    ('Art', 'art__name'),
+    ('Aussaat von (Monat)', 'aussaat_start_monat'),
+    ('Aussaat bis (Monat)', 'aussaat_end_monat'),
+    ('Bestand', 'bestand'),
+    ('Einheit', 'einheit'),
+    ('URL', 'info_url'),
+)
+
+
+def filter_werte(**werte):
+    """
+    The given filter parameters as int, None where empty. Raises ValueError
+    naming the first parameter that is not a whole number.
+    """
+    geprueft = {}
+    for name, wert in werte.items():
+        if wert is None or wert == '':
+            geprueft[name] = None
+            continue
+        try:
+            geprueft[name] = int(wert)
+        except (TypeError, ValueError):
+            raise ValueError(f"Ungültiger Wert für {name}: {wert!r}") from None
+    return geprueft
+
+
+def filter_pflanzplan(queryset, jahr=None, kategorie_id=None, sorte_id=None):
+    """The jahr/kategorie/sorte filters of the Pflanzplan list."""
+    if jahr:
+        queryset = queryset.filter(jahr=jahr)
+    if kategorie_id:
+        queryset = queryset.filter(sorte__kategorie_id=kategorie_id)
+    if sorte_id:
+        queryset = queryset.filter(sorte_id=sorte_id)
+    return queryset
+
+
+def filter_sorten(queryset, kategorie_id=None, art_id=None):
+    """The kategorie/art filters of the Sorten list."""
+    if kategorie_id:
+        queryset = queryset.filter(kategorie_id=kategorie_id)
+    if art_id:
+        queryset = queryset.filter(art_id=art_id)
+    return queryset
+
+
+def pflanzplan_zeilen(jahr=None, kategorie_id=None, sorte_id=None):
+    """Returns (header, rows) for the Pflanzplan; rows is a lazy generator."""
+    queryset = filter_pflanzplan(PflanzplanEintrag.objects.all(), jahr, kategorie_id, sorte_id)
+    # Matches pflanzplan_jahr_aussaat_idx, so PostgreSQL can stream without sorting first
+    queryset = queryset.order_by('-jahr', 'aussaatdatum', 'id')
+    return _zeilen(queryset, PFLANZPLAN_SPALTEN, {'art_der_aussaat': dict(PflanzplanEintrag.AUSSAAT_ART)})
+
+
+def sorte_zeilen(kategorie_id=None, art_id=None):
+    """Returns (header, rows) for the Sorten catalogue; rows is a lazy generator."""
+    queryset = filter_sorten(Sorte.objects.all(), kategorie_id, art_id).order_by('kategorie__name', 'name', 'id')
+    return _zeilen(queryset, SORTE_SPALTEN, {'einheit': dict(Sorte.EINHEITEN)})
+
+
+def _zeilen(queryset, spalten, labels):
+    header = [titel for titel, _ in spalten]
+    felder = [feld for _, feld in spalten]
+
+    def rows():
+        for row in queryset.values_list(*felder).iterator(chunk_size=CHUNK_SIZE):
+            yield [labels[feld].get(wert, wert) if feld in labels else wert for feld, wert in zip(felder, row)]
+
+    return header, rows()
+
+
+def _als_text(wert):
+    # A leading apostrophe makes Excel and LibreOffice show the cell as text
+    if isinstance(wert, str) and wert.startswith(FORMEL_ZEICHEN):
+        return "'" + wert
+    return wert
+
+
+def csv_chunks(header, rows):
+    """Yields the CSV as text chunks; the header goes out before the query runs."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    # The BOM makes Excel read the file as UTF-8; import_pflanzplan strips it again
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    yield flush()
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_als_text(wert) for wert in row])
+        if i % ROWS_PER_CHUNK == 0:
+            yield flush()
+    if chunk := flush():
+        yield chunk
+
+
+def write_xlsx(target, titel, header, rows):
+    """Writes one worksheet to `target` (path or binary file) row by row."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(target, {
+        # Flushes every row to disk instead of keeping the sheet in memory
+        'constant_memory': True,
+        'default_date_format': 'dd.mm.yyyy',
+        # write_row() would turn text starting with '=' into a formula
+        'strings_to_formulas': False,
+    })
+    worksheet = workbook.add_worksheet(titel)
+    worksheet.write_row(0, 0, header, workbook.add_format({'bold': True}))
+    for i, row in enumerate(rows, 1):
+        worksheet.write_row(i, 0, row)
+    workbook.close()
+
+
+def xlsx_chunks(titel, header, rows):
+    """Yields the finished workbook in binary chunks from a temporary file."""
+    with tempfile.TemporaryFile() as datei:
+        write_xlsx(datei, titel, header, rows)
+        datei.seek(0)
+        while chunk := datei.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def streaming_response(request, chunks, content_type, filename=None):
+    # Django buffers a sync iterator completely when serving it over ASGI
+    # (and an async one over WSGI), so hand over what the server streams.
+    if isinstance(request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+async def _async_chunks(chunks):
+    next_chunk = sync_to_async(next)
+    ende = object()
+    while (chunk := await next_chunk(chunks, ende)) is not ende:
+        yield chunk
@@ -0,0 +1,73 @@
+"""
+Cached option lists for the filter dropdowns.
+
+Each list is stored under a key that contains a per-model version number.
+The signal handlers in signals.py bump the version when a transaction that
+saved or deleted a row of that model commits, so stale lists are never read
+again and simply expire. Code that writes with bulk_create()/bulk_update()/update() has to
+call invalidate() itself, because those bypass the signals.
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Art, Kategorie, PflanzplanEintrag
+
+TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(model):
+    return f'garten:optionen:{model._meta.model_name}:version'
+
+
+def _startwert():
+    # Not 1: after a flush of the shared cache the numbers must not repeat, or
+    # per-process caches keyed on them (the row fragments) would serve old rows
+    return time.time_ns()
+
+
+def version(model):
+    key = _version_key(model)
+    current = cache.get(key)
+    if current is None:
+        start = _startwert()
+        cache.add(key, start, timeout=None)
+        current = cache.get(key, start)
+    return current
+
+
+def versionen(*models):
+    """Combined version of several models, e.g. for template fragment cache keys."""
+    return '.'.join(str(version(model)) for model in models)
+
+
+def invalidate(*models):
+    for model in models:
+        try:
+            cache.incr(_version_key(model))
+        except ValueError:
+            # Nothing cached yet for this model
+            cache.add(_version_key(model), _startwert(), timeout=None)
+
+
+def _cached(model, name, load):
+    key = f'garten:optionen:{model._meta.model_name}:v{version(model)}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        cache.set(key, value, TIMEOUT)
+    return value
+
+
+def jahre():
+    return _cached(PflanzplanEintrag, 'jahre', lambda: list(
+        PflanzplanEintrag.objects.values_list('jahr', flat=True).distinct().order_by('-jahr')
+    ))
+
+
+def kategorien():
+    return _cached(Kategorie, 'kategorien', lambda: list(Kategorie.objects.values('id', 'name')))
+
+
+def arten():
+    return _cached(Art, 'arten', lambda: list(Art.objects.values('id', 'name')))
@@ -1,7 +1,79 @@
 from django import forms
-from .models import Sorte, PflanzplanEintrag, Kategorie, Art
+from django.urls import reverse
 
-class KategorieForm(forms.ModelForm):
+from .models import Sorte, PflanzplanEintrag, Kategorie, Art, VersionConflict
+
+
+class AuswahlWidget(forms.Select):
+    """
+    Select for a ModelChoiceField into a table that grows with the catalogue:
+    renders only the empty and the selected option, the search field in front
+    of it loads matching rows page by page from the auswahl view. The field
+    itself still checks the submitted pk with one query.
+    """
+    template_name = 'garten/widgets/auswahl.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        meta = self.choices.queryset.model._meta
+        context['widget']['attrs'].update({
+            'data-url': reverse('auswahl', args=[meta.model_name]),
+            'data-placeholder': f'{meta.verbose_name} suchen...',
+        })
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Iterating self.choices would load the whole table
+        field = self.choices.field
+        optionen = [('', field.empty_label)] if field.empty_label is not None else []
+        pks = [v for v in value if v.isdigit()]
+        if pks:
+            optionen += field.queryset.filter(pk__in=pks).order_by().values_list('pk', 'name')
+        return [
+            (None, [self.create_option(name, wert, label, str(wert) in value, index, attrs=attrs)], index)
+            for index, (wert, label) in enumerate(optionen)
+        ]
+
+    def use_required_attribute(self, initial):
+        return forms.Widget.use_required_attribute(self, initial) and self.choices.field.empty_label is not None
+
+
+class VersionFormMixin(forms.Form):
+    """
+    Carries the version the form was rendered with (models.Versioniert), so
+    saving it over a change made in the meantime fails instead of silently
+    overwriting it. Views save through speichern().
+    """
+    version = forms.IntegerField(required=False, min_value=1, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault('version', self.instance.version)
+
+    def save(self, commit=True):
+        if self.cleaned_data.get('version'):
+            self.instance.version = self.cleaned_data['version']
+        return super().save(commit)
+
+    def speichern(self):
+        """save(); on a version conflict adds a form error and returns None."""
+        try:
+            return self.save()
+        except VersionConflict:
+            aktuell = type(self.instance).objects.filter(pk=self.instance.pk).values_list('version', flat=True).first()
+            if aktuell is None:
+                self.add_error(None, "Der Eintrag wurde inzwischen gelöscht.")
+                return None
+            # Saving again overwrites the other change on purpose
+            self.data = self.data.copy()
+            self.data[self.add_prefix('version')] = aktuell
+            self.add_error(None, "Der Eintrag wurde inzwischen von jemand anderem geändert. "
+                                 "Bitte die Angaben prüfen und erneut speichern, um die Änderung zu überschreiben.")
+            return None
+
+
+class KategorieForm(VersionFormMixin, forms.ModelForm):
     class Meta:
         model = Kategorie
         fields = ['name']
@@ -9,7 +81,7 @@ class KategorieForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
-class ArtForm(forms.ModelForm):
+class ArtForm(VersionFormMixin, forms.ModelForm):
     class Meta:
         model = Art
         fields = ['name']
@@ -17,14 +89,18 @@ class ArtForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
-class SorteForm(forms.ModelForm):
+class SorteForm(VersionFormMixin, forms.ModelForm):
+    # The bestand the form was rendered with; a changed bestand is booked as the
+    # difference to it, so sowings booked in the meantime are kept (garten.bestand)
+    bestand_gelesen = forms.DecimalField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Sorte
         fields = ['name', 'kategorie', 'art', 'bestand', 'einheit', 'info_url', 'aussaat_start_monat', 'aussaat_end_monat']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
-            'kategorie': forms.Select(attrs={'class': 'form-control'}),
-            'art': forms.Select(attrs={'class': 'form-control'}),
+            'kategorie': AuswahlWidget(attrs={'class': 'form-control'}),
+            'art': AuswahlWidget(attrs={'class': 'form-control'}),
             'bestand': forms.NumberInput(attrs={'class': 'form-control'}),
             'einheit': forms.Select(attrs={'class': 'form-control'}),
             'info_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://...'}),
@@ -32,14 +108,31 @@ class SorteForm(forms.ModelForm):
             'aussaat_end_monat': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 12}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault('bestand_gelesen', self.instance.bestand)
+
+    def save(self, commit=True):
+        if self.cleaned_data.get('bestand_gelesen') is not None:
+            self.instance._bestand_gelesen = self.cleaned_data['bestand_gelesen']
+        return super().save(commit)
+
 class PflanzplanForm(forms.ModelForm):
     class Meta:
         model = PflanzplanEintrag
         fields = ['sorte', 'aussaatdatum', 'anzahl_samen', 'art_der_aussaat', 'anzuchtgefaess']
         widgets = {
-            'sorte': forms.Select(attrs={'class': 'form-control'}),
+            'sorte': AuswahlWidget(attrs={'class': 'form-control'}),
             'aussaatdatum': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'anzahl_samen': forms.NumberInput(attrs={'class': 'form-control'}),
             'art_der_aussaat': forms.Select(attrs={'class': 'form-control'}),
             'anzuchtgefaess': forms.TextInput(attrs={'class': 'form-control'}),
         }
+
+class PflanzplanFilterForm(forms.Form):
+    """The Sorte filter of the Pflanzplan list; Jahre and Kategorien stay plain cached dropdowns."""
+    sorte = forms.ModelChoiceField(
+        Sorte.objects.all(), required=False, empty_label='Alle Sorten',
+        widget=AuswahlWidget(attrs={'style': 'padding: 0.5rem; border-radius: 4px; border: 1px solid #ccc;'}),
+    )
@@ -0,0 +1,71 @@
+"""
+Sowing calendar: which Sorten may be sown in a given month or date range.
+
+Sorte.aussaat_monate holds the sowing window as a 12-bit mask (bit 0 =
+January), computed by Sorte.ableiten() from aussaat_start_monat and
+aussaat_end_monat. A window whose start lies after its end wraps across the
+year end (November to February = Nov, Dec, Jan, Feb).
+
+Windows are contiguous, so there are only 133 distinct non-empty masks (12 x 12
+start/end pairs, twelve of which cover the whole year). "Covers one of these
+months" therefore becomes
+`aussaat_monate IN (<the masks that do>)`, which PostgreSQL answers from the
+B-tree index on the column instead of testing every row.
+"""
+import datetime
+
+MONATE = ('Jan', 'Feb', 'Mär', 'Apr', 'Mai', 'Jun', 'Jul', 'Aug', 'Sep', 'Okt', 'Nov', 'Dez')
+
+
+def monatsmaske(start, ende):
+    """Bitmask of the window start..ende (1-12, may wrap); a single month if only one is set."""
+    start = start or ende
+    ende = ende or start
+    if not start or not 1 <= start <= 12 or not 1 <= ende <= 12:
+        return 0
+    maske = 0
+    monat = start
+    while True:
+        maske |= 1 << (monat - 1)
+        if monat == ende:
+            return maske
+        monat = monat % 12 + 1
+
+
+# Every mask monatsmaske() can return for a non-empty window
+FENSTER = frozenset(monatsmaske(start, ende) for start in range(1, 13) for ende in range(1, 13))
+
+
+def monate(maske):
+    """The months (1-12) of a mask."""
+    return [monat for monat in range(1, 13) if maske & (1 << (monat - 1))]
+
+
+def zeitraum_maske(von, bis=None):
+    """Mask of every month touched by the dates von..bis (inclusive)."""
+    bis = bis or von
+    if bis < von:
+        raise ValueError("Das Ende liegt vor dem Anfang.")
+    if (bis.year - von.year) * 12 + bis.month - von.month >= 11:
+        return (1 << 12) - 1
+    return monatsmaske(von.month, bis.month)
+
+
+def filter_saebar(queryset, maske):
+    """Sorten whose window shares a month with `maske`; index-friendly, see the module docstring."""
+    return queryset.filter(aussaat_monate__in=sorted(f for f in FENSTER if f & maske))
+
+
+def maske_aus_parametern(params, heute=None):
+    """
+    Month mask from ?monat=1-12 or ?von=YYYY-MM-DD[&bis=YYYY-MM-DD]; the
+    current month without either. Raises ValueError for invalid input.
+    """
+    if params.get('von'):
+        von = datetime.date.fromisoformat(params['von'])
+        bis = datetime.date.fromisoformat(params['bis']) if params.get('bis') else None
+        return zeitraum_maske(von, bis)
+    monat = int(params['monat']) if params.get('monat') else (heute or datetime.date.today()).month
+    if not 1 <= monat <= 12:
+        raise ValueError("Monat muss zwischen 1 und 12 liegen.")
+    return monatsmaske(monat, monat)
@@ -0,0 +1,109 @@
+import datetime
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from garten import benchmark
+from garten.models import Sorte
+
+
+class Command(BaseCommand):
+    help = (
+        "Misst Listenansichten, Sorten-Analyse, API und Importer auf einem synthetischen Datenbestand "
+        "in einer eigenen Test-Datenbank und vergleicht mit der gespeicherten Baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0,
+                            help="Datenmenge relativ zu 20k Sorten / 200k Einträgen (Standard: 1)")
+        parser.add_argument("--repeat", type=int, default=5, help="Messungen pro Benchmark")
+        parser.add_argument("--only", nargs="+", choices=sorted(benchmark.BENCHMARKS), help="Nur diese Benchmarks")
+        parser.add_argument("--baseline", default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"))
+        parser.add_argument("--save-baseline", action="store_true", help="Ergebnis als neue Baseline speichern")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Erlaubte Verlangsamung (0.25 = +25%%)")
+        parser.add_argument("--require-baseline", action="store_true",
+                            help="Für CI: Fehler, wenn die Baseline fehlt, nicht passt oder einen Benchmark nicht kennt")
+        parser.add_argument("--keepdb", action="store_true", help="Test-Datenbank samt Daten wiederverwenden")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            # Own cache, so the benchmark data never shows up in the live app's cached dropdowns
+            caches = {alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"benchmark-{alias}"}
+                      for alias in settings.CACHES}
+            with override_settings(CACHES=caches):
+                ergebnisse = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        meta = {"scale": options["scale"], "vendor": connection.vendor}
+        self.compare(ergebnisse, meta, options)
+        if options["save_baseline"]:
+            self.save(ergebnisse, meta, options)
+
+    def run_benchmarks(self, options):
+        if not Sorte.objects.exists():
+            self.stdout.write(f"Erzeuge Daten (scale={options['scale']})...")
+            anzahl = benchmark.erzeuge_daten(options["scale"])
+            self.stdout.write(", ".join(f"{wert} {name}" for name, wert in anzahl.items()))
+
+        user = User.objects.get_or_create(username="benchmark")[0]
+        client = Client()
+        client.force_login(user)
+
+        verzeichnis, kontext = benchmark.importdateien(options["scale"])
+        kontext.update(benchmark.kontext())
+        ergebnisse = {}
+        try:
+            for name, lauf in benchmark.BENCHMARKS.items():
+                if options["only"] and name not in options["only"]:
+                    continue
+                ergebnis = benchmark.messe(lauf, client, kontext, options["repeat"])
+                ergebnisse[name] = ergebnis
+                self.stdout.write(
+                    f"{name:40} {ergebnis['median_ms']:9.1f} ms  "
+                    f"(min {ergebnis['min_ms']:.1f}, max {ergebnis['max_ms']:.1f})  {ergebnis['queries']:3} Queries"
+                )
+        finally:
+            verzeichnis.cleanup()
+        return ergebnisse
+
+    def compare(self, ergebnisse, meta, options):
+        if not os.path.exists(options["baseline"]):
+            self.ohne_vergleich(f"Keine Baseline unter {options['baseline']} (--save-baseline legt sie an).", options)
+            return
+        with open(options["baseline"], encoding="utf-8") as datei:
+            baseline = json.load(datei)
+        if baseline.get("meta", {}).get("scale") != meta["scale"] or baseline.get("meta", {}).get("vendor") != meta["vendor"]:
+            self.ohne_vergleich(f"Baseline wurde mit {baseline.get('meta')} gemessen, jetzt {meta}; kein Vergleich.", options)
+            return
+
+        regressionen = benchmark.vergleiche(
+            ergebnisse, baseline["ergebnisse"], options["tolerance"], streng=options["require_baseline"],
+        )
+        if regressionen and not options["save_baseline"]:
+            for meldung in regressionen:
+                self.stderr.write(meldung)
+            raise CommandError(f"{len(regressionen)} Regression(en) gegenüber der Baseline.")
+        self.stdout.write(self.style.SUCCESS("Keine Regressionen gegenüber der Baseline."))
+
+    def ohne_vergleich(self, meldung, options):
+        if options["require_baseline"] and not options["save_baseline"]:
+            raise CommandError(meldung)
+        self.stderr.write(meldung)
+
+    def save(self, ergebnisse, meta, options):
+        os.makedirs(os.path.dirname(options["baseline"]), exist_ok=True)
+        meta["erstellt"] = datetime.datetime.now().isoformat(timespec="seconds")
+        with open(options["baseline"], "w", encoding="utf-8") as datei:
+            json.dump({"meta": meta, "ergebnisse": ergebnisse}, datei, indent=2, sort_keys=True)
+            datei.write("\n")
+        self.stdout.write(self.style.SUCCESS(f"Baseline gespeichert: {options['baseline']}"))
@@ -0,0 +1,68 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Misst die DB-Latenz pro simuliertem Request: neue Verbindung pro Request "
+        "(vorher) gegen die konfigurierte Verbindungsverwaltung (nachher)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Anzahl simulierter Requests pro Modus")
+        parser.add_argument("--queries", type=int, default=3, help="Abfragen pro Request")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        configured = connections[options["database"]]
+        if configured.vendor != "postgresql":
+            self.stderr.write("Der Benchmark ist nur gegen PostgreSQL aussagekräftig.")
+            return
+
+        # "vorher": the old settings - no pool, connection closed after every request
+        settings = copy.deepcopy(configured.settings_dict)
+        settings["CONN_MAX_AGE"] = 0
+        settings["OPTIONS"] = {k: v for k, v in settings["OPTIONS"].items() if k != "pool"}
+        unpooled = configured.__class__(settings, alias="benchmark_vorher")
+
+        try:
+            vorher = self.measure(unpooled, options["requests"], options["queries"])
+        finally:
+            unpooled.close()
+        nachher = self.measure(configured, options["requests"], options["queries"])
+
+        mode = "Pool" if "pool" in configured.settings_dict["OPTIONS"] else (
+            f"CONN_MAX_AGE={configured.settings_dict['CONN_MAX_AGE']}"
+        )
+        self.report("Neue Verbindung pro Request", vorher)
+        self.report(f"Konfiguriert ({mode})", nachher)
+        self.stdout.write(self.style.SUCCESS(
+            f"Median pro Request: {statistics.median(vorher):.2f} ms -> {statistics.median(nachher):.2f} ms"
+        ))
+
+    @staticmethod
+    def measure(connection, requests, queries):
+        durations = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            # Same bookkeeping as Django's request_started/request_finished handlers
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            connection.close_if_unusable_or_obsolete()
+            durations.append((time.perf_counter() - start) * 1000)
+        return durations
+
+    def report(self, label, durations):
+        durations = sorted(durations)
+        p95 = durations[int(len(durations) * 0.95) - 1] if len(durations) >= 20 else durations[-1]
+        self.stdout.write(
+            f"{label}: Median {statistics.median(durations):.2f} ms, "
+            f"Mittel {statistics.mean(durations):.2f} ms, p95 {p95:.2f} ms"
+        )
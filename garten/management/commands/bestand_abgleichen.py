@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from garten import bestand
+
+
+class Command(BaseCommand):
+    help = "Setzt den Bestand jeder Sorte auf die Summe ihrer Bestandsbewegungen, wo beide abweichen"
+
+    def handle(self, *args, **options):
+        anzahl = bestand.abgleichen()
+        self.stdout.write(self.style.SUCCESS(f"{anzahl} Sorten abgeglichen."))
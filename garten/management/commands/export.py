@@ -0,0 +1,53 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from garten import export
+
+
+class Command(BaseCommand):
+    help = "Exportiert den Pflanzplan oder den Sortenkatalog als CSV oder XLSX, ohne alle Zeilen im Speicher zu halten"
+
+    def add_arguments(self, parser):
+        parser.add_argument("was", choices=["pflanzplan", "sorten"])
+        parser.add_argument("-o", "--output", default="-", help="Zieldatei, '-' für stdout (nur CSV)")
+        parser.add_argument("--format", choices=["csv", "xlsx"], help="Standard: aus der Dateiendung, sonst CSV")
+        parser.add_argument("--jahr", type=int)
+        parser.add_argument("--kategorie", type=int, help="Kategorie-ID")
+        parser.add_argument("--sorte", type=int, help="Sorte-ID (nur pflanzplan)")
+        parser.add_argument("--art", type=int, help="Art-ID (nur sorten)")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        fmt = options["format"] or ("xlsx" if path.lower().endswith(".xlsx") else "csv")
+        if fmt == "xlsx" and path == "-":
+            raise CommandError("XLSX braucht eine Zieldatei (-o datei.xlsx).")
+
+        if options["was"] == "pflanzplan":
+            titel = "Pflanzplan"
+            header, rows = export.pflanzplan_zeilen(options["jahr"], options["kategorie"], options["sorte"])
+        else:
+            titel = "Sorten"
+            header, rows = export.sorte_zeilen(options["kategorie"], options["art"])
+        rows = self.count(rows)
+
+        if fmt == "xlsx":
+            export.write_xlsx(path, titel, header, rows)
+        elif path == "-":
+            for chunk in export.csv_chunks(header, rows):
+                self.stdout.write(chunk, ending="")
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as datei:
+                for chunk in export.csv_chunks(header, rows):
+                    datei.write(chunk)
+
+        if path != "-":
+            self.stdout.write(self.style.SUCCESS(
+                f"Export fertig: {self.anzahl} Zeilen nach {os.path.abspath(path)} geschrieben."
+            ))
+
+    def count(self, rows):
+        self.anzahl = 0
+        for row in rows:
+            self.anzahl += 1
+            yield row
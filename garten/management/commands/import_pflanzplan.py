@@ -1,9 +1,14 @@
-import os
-import json
+import csv
 import datetime
+import io
+import json
+import os
 import re
+import sys
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import transaction
+from garten import bestand, filter_options, statistik
 from garten.models import Sorte, PflanzplanEintrag
 
 GERMAN_MONTHS = {
@@ -41,87 +46,202 @@ def extract_sorte_name(sorte_raw_str):
         return sorte_raw_str.split("(")[0].strip()
     return sorte_raw_str.strip()
 
+def normalize_key(key):
+    """Strips BOMs and decorative prefixes from export headers, e.g. '🥕 Sorten' -> 'Sorten'."""
+    if key is None:
+        return None
+    return re.sub(r"^[\W_]+", "", key.replace("\ufeff", "")).strip()
+
+def iter_rows(stream, fmt):
+    """Yields one dict per record without reading the whole stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        reader.fieldnames = [normalize_key(name) for name in reader.fieldnames or []]
+        yield from reader
+    elif fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield {normalize_key(k): v for k, v in json.loads(line).items()}
+    else:
+        # Plain JSON arrays cannot be parsed incrementally with the stdlib.
+        for item in json.load(stream):
+            yield {normalize_key(k): v for k, v in item.items()}
+
+def guess_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    return "csv"
+
+def parse_eintrag_felder(item):
+    """The non-key PflanzplanEintrag fields of one export row."""
+    # Anzucht vs Freiland
+    wie = (item.get("wie?") or "").lower()
+    art_der_aussaat = 'FREILAND' if 'freiland' in wie else 'ANZUCHT'
+
+    # Anzahl
+    anz_str = str(item.get("Anzahl") or "0").strip()
+    try:
+        anzahl = int(anz_str)
+    except ValueError:
+        anzahl = 0
+
+    # Pflanzdatum ist im Export nicht enthalten, nur 'pikiert'.
+    return {
+        'anzahl_samen': anzahl,
+        'art_der_aussaat': art_der_aussaat,
+        'anzuchtgefaess': (item.get("wo?") or "")[:100],
+        'pikierdatum': parse_german_date(item.get("pikiert")),
+        'beschreibung': f"Importiert aus Pflanzplan-Export. ID: {item.get('ID')}",
+    }
+
+class SortenResolver:
+    """
+    Import-scoped index of casefolded Sorte names, built with one query
+    instead of a name__iexact lookup per row.
+    """
+
+    def __init__(self, stderr):
+        self.stderr = stderr
+        self.ids = {}
+        self.mehrdeutig = set()
+        for sorte_id, name in Sorte.objects.order_by("id").values_list("id", "name"):
+            key = name.strip().casefold()
+            if key in self.ids:
+                self.mehrdeutig.add(key)
+            else:
+                self.ids[key] = sorte_id
+
+    def resolve(self, name):
+        key = name.casefold()
+        if key in self.mehrdeutig:
+            self.stderr.write(f"Mehrere Sorten für '{name}' gefunden. Nehme die erste.")
+            self.mehrdeutig.discard(key)  # only warn once per name
+        return self.ids.get(key)
+
 class Command(BaseCommand):
-    help = "Importiert Pflanzplan_2025.json"
+    help = "Importiert einen Pflanzplan-Export (CSV, JSON Lines oder JSON) aus einer Datei oder von stdin"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?",
+            default=os.path.join(settings.BASE_DIR, "garten", "management", "commands", "Pflanzplan_2025.csv"),
+            help="Export-Datei oder '-' für stdin (Standard: Pflanzplan_2025.csv neben diesem Kommando)",
+        )
+        parser.add_argument(
+            "--format", choices=["csv", "jsonl", "json"],
+            help="Eingabeformat; Standard ist die Dateiendung bzw. csv für stdin",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Einträge pro Transaktion")
 
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, "garten", "management", "commands", "Pflanzplan_2025.json")
-        
-        if not os.path.exists(path):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path == "-" else guess_format(path))
+
+        if path == "-":
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+        elif not os.path.exists(path):
             self.stderr.write(f"Datei nicht gefunden: {path}")
             return
+        else:
+            stream = open(path, "r", encoding="utf-8-sig", newline="")
+
+        self.counts = {"created": 0, "existing": 0, "skipped": 0}
+        self.sorten = SortenResolver(self.stderr)
+        with stream:
+            batch = []
+            for item in iter_rows(stream, fmt):
+                batch.append(item)
+                if len(batch) >= options["batch_size"]:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pflanzplan Import fertig: {self.counts['created']} Einträge erstellt, "
+            f"{self.counts['existing']} bereits vorhanden, {self.counts['skipped']} übersprungen."
+        ))
+
+    def import_batch(self, items):
+        """Resolves, deduplicates, inserts and books one batch with a fixed number of queries."""
+        neue = {}
+        for item in items:
+            eintrag = self.build_eintrag(item)
+            if eintrag is None:
+                self.counts["skipped"] += 1
+            elif (eintrag.sorte_id, eintrag.aussaatdatum) in neue:
+                self.counts["existing"] += 1
+            else:
+                neue[(eintrag.sorte_id, eintrag.aussaatdatum)] = eintrag
+
+        if not neue:
+            return
+        vorhanden = set(PflanzplanEintrag.objects.filter(
+            sorte_id__in={sorte_id for sorte_id, _ in neue},
+            aussaatdatum__in={datum for _, datum in neue},
+        ).values_list("sorte_id", "aussaatdatum"))
+
+        to_create = [eintrag for key, eintrag in neue.items() if key not in vorhanden]
+        with transaction.atomic():
+            # The unique constraint catches rows inserted concurrently since the lookup above
+            PflanzplanEintrag.objects.bulk_create(to_create, ignore_conflicts=True)
+            angelegt = self.angelegt(to_create)
+            # bulk_create() skips post_save, so the sowings are booked here
+            bestand.aussaaten_buchen(angelegt, neu=True)
+        # Rows dropped by ignore_conflicts count as existing
+        self.counts["created"] += len(angelegt)
+        self.counts["existing"] += len(neue) - len(angelegt)
+        if angelegt:
+            # bulk_create does not send post_save
+            filter_options.invalidate(PflanzplanEintrag)
+            statistik.aktualisiere({(eintrag.sorte_id, eintrag.jahr) for eintrag in angelegt})
+
+    @staticmethod
+    def angelegt(eintraege):
+        """
+        The rows of `eintraege` that bulk_create(ignore_conflicts=True) actually
+        inserted, with their pks (which it leaves unset on PostgreSQL). Rows
+        saved concurrently in their place are not ours; they have either
+        different fields or their bookings already.
+        """
+        if not eintraege:
+            return []
+        erwartet = {(e.sorte_id, e.aussaatdatum): e.beschreibung for e in eintraege}
+        kandidaten = PflanzplanEintrag.objects.filter(
+            sorte_id__in={sorte_id for sorte_id, _ in erwartet},
+            aussaatdatum__in={datum for _, datum in erwartet},
+            bewegungen__isnull=True,
+        )
+        return [e for e in kandidaten if erwartet.get((e.sorte_id, e.aussaatdatum)) == e.beschreibung]
+
+    def build_eintrag(self, item):
+        # Sorte finden
+        sorte_raw = item.get("Sorten") or ""
+        if not sorte_raw:
+            self.stderr.write("Eintrag ohne Sorte übersprungen.")
+            return None
+        
+        sorte_name = extract_sorte_name(sorte_raw)
+        sorte_id = self.sorten.resolve(sorte_name)
+        if sorte_id is None:
+            self.stderr.write(f"Sorte nicht gefunden: '{sorte_name}' (Raw: {sorte_raw})")
+            return None
+
+        # Daten parsen
+        aussaatdatum = parse_german_date(item.get("Aussaat"))
+        # Aussaatdatum ist Pflichtfeld -> überspringen
+        if not aussaatdatum:
+            self.stderr.write(f"Kein gültiges Aussaatdatum bei {sorte_name}. Überspringe.")
+            return None
 
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        count_created = 0
-        count_skipped = 0
-
-        for item in data:
-            # Sorte finden
-            sorte_raw = item.get("Sorten", "")
-            if not sorte_raw:
-                self.stderr.write("Eintrag ohne Sorte übersprungen.")
-                count_skipped += 1
-                continue
-            
-            sorte_name = extract_sorte_name(sorte_raw)
-            try:
-                # Versuche exakten Match
-                sorte = Sorte.objects.get(name__iexact=sorte_name)
-            except Sorte.DoesNotExist:
-                # Fallback: Vielleicht ist der Name Teil eines längeren Namens?
-                # Oder wir loggen es nur
-                self.stderr.write(f"Sorte nicht gefunden: '{sorte_name}' (Raw: {sorte_raw})")
-                count_skipped += 1
-                continue
-            except Sorte.MultipleObjectsReturned:
-                self.stderr.write(f"Mehrere Sorten für '{sorte_name}' gefunden. Nehme die erste.")
-                sorte = Sorte.objects.filter(name__iexact=sorte_name).first()
-
-            # Daten parsen
-            aussaatdatum = parse_german_date(item.get("Aussaat"))
-            # Fallback für Aussaatdatum: Wenn leer, Pflichtfeld -> überspringen?
-            if not aussaatdatum:
-                 self.stderr.write(f"Kein gültiges Aussaatdatum bei {sorte_name}. Überspringe.")
-                 count_skipped += 1
-                 continue
-
-            jahr = aussaatdatum.year
-            
-            # Anzucht vs Freiland
-            wie = item.get("wie?", "").lower()
-            art_der_aussaat = 'ANZUCHT' # Default
-            if 'freiland' in wie:
-                art_der_aussaat = 'FREILAND'
-
-            # Anzahl
-            anz_str = str(item.get("Anzahl", "0")).strip()
-            if not anz_str: anz_str = "0"
-            try:
-                anzahl = int(anz_str)
-            except ValueError:
-                anzahl = 0
-            
-            pikierdatum = parse_german_date(item.get("pikiert"))
-            
-            # Pflanzdatum haben wir im JSON nicht direkt, oder? 
-            # Im JSON sehe ich kein 'gepflanzt' Feld im User snippet, nur 'pikiert'.
-            # Wir lassen pflanzdatum None.
-
-            # Create
-            PflanzplanEintrag.objects.get_or_create(
-                sorte=sorte,
-                jahr=jahr,
-                aussaatdatum=aussaatdatum,
-                defaults={
-                    'anzahl_samen': anzahl,
-                    'art_der_aussaat': art_der_aussaat,
-                    'anzuchtgefaess': item.get("wo?", "")[:100],
-                    'pikierdatum': pikierdatum,
-                    'beschreibung': f"Importiert aus JSON. ID: {item.get('ID')}"
-                }
-            )
-            count_created += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Pflanzplan Import fertig: {count_created} Einträge erstellt. {count_skipped} übersprungen."))
+        # bulk_create() bypasses save(), so jahr is derived here
+        return PflanzplanEintrag(
+            sorte_id=sorte_id,
+            jahr=aussaatdatum.year,
+            aussaatdatum=aussaatdatum,
+            **parse_eintrag_felder(item),
+        )
@@ -2,9 +2,13 @@ import os
 import json
 import datetime
 import locale
+from decimal import Decimal
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from garten.models import Sorte, Kategorie, Art
+from django.db import transaction
+from django.utils import timezone
+from garten import bestand, filter_options
+from garten.models import Bestandsbewegung, Sorte, Kategorie, Art
 
 # Versuche Locale zu setzen, Fallback auf Dictionary falls nicht vorhanden
 try:
@@ -80,70 +84,170 @@ def parse_einheit(einheit_str):
         return s
     return 'ANZ'
 
+SORTE_FELDER = (
+    'kategorie_id', 'art_id', 'aussaat_start_monat', 'aussaat_end_monat', 'info_url', 'bestand', 'einheit',
+)
+
+def parse_item(item):
+    """
+    Maps one JSON item to (name, kategorie_name, art_name, fields).
+    Returns None for items that cannot be imported.
+    """
+    name = (item.get("Name") or "").strip()
+    kat_name = (item.get("Kategorie") or "").strip()
+    # Kategorie ist für den Import Pflicht
+    if not name or not kat_name:
+        return None
+
+    start_mon, end_mon = extract_months(item.get("Anzucht", ""))
+    fields = {
+        'aussaat_start_monat': start_mon,
+        'aussaat_end_monat': end_mon,
+        'info_url': (item.get("URL") or "")[:200], # Truncate if too long
+        'bestand': Decimal(str(parse_bestand(item.get("Bestand", 0)))).quantize(Decimal("0.01")),
+        'einheit': parse_einheit(item.get("Einheit") or "ANZ"),
+    }
+    return name, kat_name, (item.get("Art") or "").strip(), fields
+
 class Command(BaseCommand):
     help = "Importiert Sorte.json in die DB (Erstellt Kategorien und Arten automatisch)"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?",
+            default=os.path.join(settings.BASE_DIR, "garten", "management", "commands", "Sorte.json"),
+            help="JSON-Datei mit Sorten (Standard: Sorte.json neben diesem Kommando)",
+        )
+        parser.add_argument(
+            "--bulk", action="store_true",
+            help="Mengenbasierter Import in einer Transaktion statt einzelner Abfragen pro Sorte",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Zeilen pro INSERT/UPDATE im Bulk-Modus")
+
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, "garten", "management", "commands", "Sorte.json")
+        path = options["path"]
         
         if not os.path.exists(path):
             self.stderr.write(f"Datei nicht gefunden: {path}")
             return
 
-        with open(path, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8-sig") as f:
             data = json.load(f)
 
+        if options["bulk"]:
+            created, updated, skipped, unchanged, duplicates = self.import_bulk(data, options["batch_size"])
+            # The single mode counts both as "aktualisiert"; report them so the totals still add up
+            extra = f", {unchanged} unverändert, {duplicates} doppelt in der Datei"
+        else:
+            created, updated, skipped = self.import_einzeln(data)
+            extra = ""
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Import fertig: {created} erstellt, {updated} aktualisiert, {skipped} übersprungen{extra}."
+        ))
+
+    def import_einzeln(self, data):
         count_created = 0
         count_updated = 0
+        count_skipped = 0
 
         for item in data:
-            name = item.get("Name")
-            if not name:
+            parsed = parse_item(item)
+            if parsed is None:
+                self.stderr.write(f"Überspringe '{item.get('Name')}': Kein Name oder keine Kategorie angegeben.")
+                count_skipped += 1
                 continue
+            name, kat_name, art_name, fields = parsed
 
-            # 1. Kategorie behandeln
-            kat_name = item.get("Kategorie", "").strip()
-            kategorie = None
-            if kat_name:
-                kategorie, _ = Kategorie.objects.get_or_create(name=kat_name)
-
-            # 2. Art behandeln
-            art_name = item.get("Art", "").strip()
+            kategorie, _ = Kategorie.objects.get_or_create(name=kat_name)
             art = None
             if art_name:
                 art, _ = Art.objects.get_or_create(name=art_name)
 
-            # 3. Restliche Daten parsen
-            start_mon, end_mon = extract_months(item.get("Anzucht", ""))
-            
-            # Sorte erstellen oder aktualisieren
-            # Wir nutzen Kategorie als Teil der Identität, falls Namen doppelt sind in versch. Kategorien?
-            # Model Sorte: name is NOT unique. But usually name should be unique identifier.
-            # We assume Name is unique enough for update lookup.
-            
-            # Falls Kategorie zwingend ist (Model: on_delete=PROTECT, null=False - laut models.py von user)
-            if not kategorie:
-                self.stderr.write(f"Überspringe '{name}': Keine Kategorie angegeben.")
-                continue
-
-            defaults = {
-                'kategorie': kategorie,
-                'art': art,
-                'aussaat_start_monat': start_mon,
-                'aussaat_end_monat': end_mon,
-                'info_url': item.get("URL", "")[:200], # Truncate if too long
-                'bestand': parse_bestand(item.get("Bestand", 0)),
-                'einheit': parse_einheit(item.get("Einheit", "ANZ")),
-            }
-
+            # Model Sorte: name is NOT unique. We assume Name is unique enough for update lookup.
             obj, created = Sorte.objects.update_or_create(
                 name=name,
-                defaults=defaults
+                defaults={'kategorie': kategorie, 'art': art, **fields}
             )
 
             if created:
                 count_created += 1
             else:
                 count_updated += 1
-                
-        self.stdout.write(self.style.SUCCESS(f"Import fertig: {count_created} erstellt, {count_updated} aktualisiert."))
+
+        return count_created, count_updated, count_skipped
+
+    def import_bulk(self, data, batch_size):
+        """
+        Set-based variant: a handful of queries for the whole file instead
+        of three or more per item. Unchanged Sorten are not written again.
+        Returns (created, updated, skipped, unchanged, duplicates).
+        """
+        rows = {}
+        count_skipped = 0
+        count_duplicates = 0
+        for item in data:
+            parsed = parse_item(item)
+            if parsed is None:
+                self.stderr.write(f"Überspringe '{item.get('Name')}': Kein Name oder keine Kategorie angegeben.")
+                count_skipped += 1
+                continue
+            # Doppelte Namen in der Datei: der letzte Eintrag gewinnt
+            if parsed[0] in rows:
+                count_duplicates += 1
+            rows[parsed[0]] = parsed
+
+        with transaction.atomic():
+            kategorien = self._lookup_map(Kategorie, {kat for _, kat, _, _ in rows.values()}, batch_size)
+            arten = self._lookup_map(Art, {art for _, _, art, _ in rows.values() if art}, batch_size)
+
+            existing = {}
+            for sorte in Sorte.objects.order_by('-id'):
+                existing[sorte.name] = sorte  # lowest id wins for duplicate names
+
+            to_create = []
+            to_update = []
+            korrekturen = []
+            count_unchanged = 0
+            jetzt = timezone.now()
+            for name, kat_name, art_name, fields in rows.values():
+                values = {'kategorie_id': kategorien[kat_name], 'art_id': arten.get(art_name), **fields}
+                sorte = existing.get(name)
+                if sorte is None:
+                    sorte = Sorte(name=name, **values)
+                    sorte.ableiten()  # bulk_create() skips save()
+                    to_create.append(sorte)
+                elif any(getattr(sorte, field) != value for field, value in values.items()):
+                    # bestand goes through the ledger instead of bulk_update()
+                    korrekturen.append(Bestandsbewegung(
+                        sorte=sorte, menge=values['bestand'] - sorte.bestand, grund=Bestandsbewegung.KORREKTUR,
+                    ))
+                    for field, value in values.items():
+                        setattr(sorte, field, value)
+                    sorte.ableiten()
+                    sorte.updated_at = jetzt  # bulk_update() skips auto_now
+                    sorte.version += 1  # forms and API clients holding the old version get a conflict (models.Versioniert)
+                    to_update.append(sorte)
+                else:
+                    count_unchanged += 1
+
+            Sorte.objects.bulk_create(to_create, batch_size=batch_size)
+            felder = [f for f in (*SORTE_FELDER, *Sorte.ABGELEITETE_FELDER, 'updated_at', 'version') if f not in Sorte.GEBUCHTE_FELDER]
+            Sorte.objects.bulk_update(to_update, felder, batch_size=batch_size)
+            bestand.eroeffnen(to_create)
+            bestand.bewegungen_anlegen(korrekturen)
+
+        # bulk_create/bulk_update do not send post_save
+        filter_options.invalidate(Kategorie, Art, Sorte)
+
+        return len(to_create), len(to_update), count_skipped, count_unchanged, count_duplicates
+
+    @staticmethod
+    def _lookup_map(model, names, batch_size):
+        """name -> id for Kategorie/Art, creating the missing ones in bulk."""
+        mapping = dict(model.objects.values_list('name', 'id'))
+        missing = names - mapping.keys()
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in sorted(missing)], batch_size=batch_size)
+            mapping.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+        return mapping
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from garten import sync
+
+
+class Command(BaseCommand):
+    help = "Löscht die Löschvermerke des Delta-Syncs, die älter als SYNC_TOMBSTONE_DAYS sind"
+
+    def handle(self, *args, **options):
+        anzahl = sync.aufraeumen()
+        self.stdout.write(self.style.SUCCESS(f"{anzahl} Löschvermerke entfernt."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from garten import statistik
+
+
+class Command(BaseCommand):
+    help = "Baut die Sorten-Jahresstatistik komplett neu aus den Pflanzplan-Einträgen auf"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Zeilen pro Lese-/Schreib-Batch")
+
+    def handle(self, *args, **options):
+        anzahl = statistik.neu_aufbauen(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Statistik neu aufgebaut: {anzahl} Sorte/Jahr-Einträge."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from garten import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Schreibt alle seit --seit geänderten Zeilen der Garten-Tabellen als JSON Lines nach stdout "
+        "(ohne --seit: alle Zeilen). Das Token für den nächsten Lauf steht auf stderr."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seit", type=int, help="Token des vorherigen Snapshots oder Vollbackups")
+
+    def handle(self, *args, **options):
+        try:
+            token = snapshot.exportiere(lambda text: self.stdout.write(text, ending=""), seit=options["seit"])
+        except snapshot.SnapshotError as e:
+            raise CommandError(str(e))
+        if token is not None:
+            self.stderr.write(f"Token: {token}")
@@ -0,0 +1,31 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from garten import snapshot
+
+
+class Command(BaseCommand):
+    help = "Spielt einen Snapshot von snapshot_export auf den aktuellen Datenstand ein (Upsert + Löschungen)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot-Datei (.jsonl) oder '-' für stdin")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path == "-":
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        else:
+            stream = open(path, "r", encoding="utf-8")
+
+        try:
+            with stream:
+                header = snapshot.importiere(stream)
+        except snapshot.SnapshotError as e:
+            raise CommandError(str(e))
+
+        seit = f"seit Token {header['seit']}" if header["seit"] is not None else "vollständig"
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot vom {header['erstellt']} ({seit}) eingespielt: {header['zeilen']} Zeilen."
+        ))
@@ -0,0 +1,241 @@
+"""
+Per-view request metrics: DB query count and time, template render time,
+response size and total duration.
+
+MetricsMiddleware starts a Messung for every request in a context variable.
+SQL is timed by an execute wrapper that signals.py installs on every new
+database connection; template rendering by the DjangoTemplates backend below
+(only the outermost render, includes and {% extends %} are part of it).
+
+The results go out as a Server-Timing header (METRICS_SERVER_TIMING; off
+outside DEBUG, because it shows every visitor the query counts) and are summed
+per view name for the Prometheus endpoint /metrics. The sums live in the
+worker process, so every Gunicorn worker reports its own numbers, labelled
+with its pid.
+
+QUERY_BUDGETS maps view names to a query ceiling for GET/HEAD requests. A
+request above its ceiling is logged, or fails with QueryBudgetExceeded when
+QUERY_BUDGET_STRICT is set. Writes are not budgeted: the ceilings are
+measured for reads, and failing a write that has already committed would
+only make clients retry it.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+DAUER_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_aktuell = contextvars.ContextVar('garten_messung', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Messung:
+    """What one request has used so far; may be fed from several threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.sql_zeit = 0.0
+        self.template_zeit = 0.0
+        self._template_tiefe = 0
+
+    def sql(self, dauer):
+        with self._lock:
+            self.queries += 1
+            self.sql_zeit += dauer
+
+
+def aktuell():
+    return _aktuell.get()
+
+
+@contextmanager
+def aktiv(messung):
+    """Makes `messung` the current one, e.g. on a thread outside the request context."""
+    token = _aktuell.set(messung)
+    try:
+        yield messung
+    finally:
+        _aktuell.reset(token)
+
+
+def sql_messen(execute, sql, params, many, context):
+    """Execute wrapper, see connection.execute_wrappers."""
+    messung = _aktuell.get()
+    if messung is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        messung.sql(time.perf_counter() - start)
+
+
+def installiere(connection):
+    # connection_created fires again after every reconnect of the same wrapper
+    if sql_messen not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_messen)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The stock backend, with the render time of top-level templates recorded."""
+
+    def from_string(self, template_code):
+        return GemesseneTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return GemesseneTemplate(super().get_template(template_name))
+
+
+class GemesseneTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        messung = _aktuell.get()
+        if messung is None or messung._template_tiefe:
+            return self.template.render(context, request)
+        messung._template_tiefe += 1
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            messung.template_zeit += time.perf_counter() - start
+            messung._template_tiefe -= 1
+
+
+class _Registry:
+    """Per-process sums per view name, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(lambda: {
+            'requests': 0,
+            'dauer': 0.0,
+            'buckets': [0] * len(DAUER_BUCKETS),
+            'queries': 0,
+            'sql_zeit': 0.0,
+            'template_zeit': 0.0,
+            'bytes': 0,
+            'ueber_budget': 0,
+        })
+
+    def erfassen(self, view, dauer, messung, groesse, ueber_budget):
+        with self._lock:
+            werte = self._views[view]
+            werte['requests'] += 1
+            werte['dauer'] += dauer
+            for i, grenze in enumerate(DAUER_BUCKETS):
+                if dauer <= grenze:
+                    werte['buckets'][i] += 1
+            werte['queries'] += messung.queries
+            werte['sql_zeit'] += messung.sql_zeit
+            werte['template_zeit'] += messung.template_zeit
+            werte['bytes'] += groesse
+            werte['ueber_budget'] += ueber_budget
+
+    def leeren(self):
+        with self._lock:
+            self._views.clear()
+
+    def prometheus_text(self):
+        with self._lock:
+            views = {view: dict(werte, buckets=list(werte['buckets'])) for view, werte in self._views.items()}
+        pid = os.getpid()
+        zeilen = []
+
+        def metrik(name, typ, hilfe, werte):
+            zeilen.append(f'# HELP {name} {hilfe}')
+            zeilen.append(f'# TYPE {name} {typ}')
+            for view, w in sorted(views.items()):
+                labels = f'view="{_label(view)}",pid="{pid}"'
+                for suffix, extra, wert in werte(w):
+                    zeilen.append(f'{name}{suffix}{{{labels}{extra}}} {wert}')
+
+        metrik('shg_requests_total', 'counter', 'Requests per view.',
+               lambda w: [('', '', w['requests'])])
+        metrik('shg_request_duration_seconds', 'histogram', 'Time from the first to the last middleware.',
+               lambda w: [('_bucket', f',le="{grenze}"', anzahl) for grenze, anzahl in zip(DAUER_BUCKETS, w['buckets'])]
+               + [('_bucket', ',le="+Inf"', w['requests']), ('_sum', '', w['dauer']), ('_count', '', w['requests'])])
+        metrik('shg_db_queries_total', 'counter', 'SQL statements executed.',
+               lambda w: [('', '', w['queries'])])
+        metrik('shg_db_duration_seconds_total', 'counter', 'Time spent executing SQL.',
+               lambda w: [('', '', w['sql_zeit'])])
+        metrik('shg_template_duration_seconds_total', 'counter', 'Time spent rendering templates.',
+               lambda w: [('', '', w['template_zeit'])])
+        metrik('shg_response_bytes_total', 'counter', 'Response body bytes (streaming responses count as 0).',
+               lambda w: [('', '', w['bytes'])])
+        metrik('shg_query_budget_exceeded_total', 'counter', 'Requests above their QUERY_BUDGETS ceiling.',
+               lambda w: [('', '', w['ueber_budget'])])
+        return '\n'.join(zeilen) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = _Registry()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with aktiv(Messung()) as messung:
+            response = self.get_response(request)
+        return self.auswerten(request, response, messung, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with aktiv(Messung()) as messung:
+            response = await self.get_response(request)
+        return self.auswerten(request, response, messung, time.perf_counter() - start)
+
+    def auswerten(self, request, response, messung, dauer):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '-'
+        groesse = 0 if response.streaming else len(response.content)
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view) if request.method in ('GET', 'HEAD') else None
+        ueber_budget = budget is not None and messung.queries > budget
+        registry.erfassen(view, dauer, messung, groesse, ueber_budget)
+
+        if getattr(settings, 'METRICS_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = (
+                f'db;dur={messung.sql_zeit * 1000:.1f};desc="{messung.queries} queries", '
+                f'tpl;dur={messung.template_zeit * 1000:.1f}, '
+                f'total;dur={dauer * 1000:.1f}'
+            )
+
+        if ueber_budget:
+            meldung = f"{view}: {messung.queries} queries, budget is {budget} ({request.method} {request.path})"
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(meldung)
+            logger.warning("Query budget exceeded: %s", meldung)
+        return response
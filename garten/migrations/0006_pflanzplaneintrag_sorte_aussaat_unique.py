@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:09
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def doppelte_zusammenfuehren(apps, schema_editor):
+    # The forms and the API used to accept several entries for one Sorte and
+    # date. The oldest one is kept with the seeds of the others added, their
+    # empty fields filled in and a note per merged entry; the others go.
+    PflanzplanEintrag = apps.get_model('garten', 'PflanzplanEintrag')
+    doppelt = list(PflanzplanEintrag.objects.order_by().values_list('sorte_id', 'aussaatdatum')
+                   .annotate(anzahl=Count('id')).filter(anzahl__gt=1))
+    for sorte_id, aussaatdatum, _ in doppelt:
+        behalten, *rest = PflanzplanEintrag.objects.filter(sorte_id=sorte_id, aussaatdatum=aussaatdatum).order_by('pk')
+        notizen = [behalten.beschreibung] if behalten.beschreibung else []
+        for eintrag in rest:
+            behalten.anzahl_samen += eintrag.anzahl_samen
+            for feld in ('anzuchtgefaess', 'pikierdatum', 'pflanzdatum'):
+                if not getattr(behalten, feld):
+                    setattr(behalten, feld, getattr(eintrag, feld))
+            notizen.append(f"Zusammengeführt: Eintrag {eintrag.pk}, {eintrag.anzahl_samen} Samen, "
+                           f"{eintrag.art_der_aussaat}" + (f", {eintrag.beschreibung}" if eintrag.beschreibung else ""))
+        behalten.beschreibung = "\n".join(notizen)
+        behalten.save(update_fields=['anzahl_samen', 'anzuchtgefaess', 'pikierdatum', 'pflanzdatum', 'beschreibung'])
+        PflanzplanEintrag.objects.filter(pk__in=[eintrag.pk for eintrag in rest]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0005_alter_pflanzplaneintrag_jahr'),
+    ]
+
+    operations = [
+        migrations.RunPython(doppelte_zusammenfuehren, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pflanzplaneintrag',
+            constraint=models.UniqueConstraint(fields=('sorte', 'aussaatdatum'), name='pflanzplan_sorte_aussaat_unique'),
+        ),
+    ]
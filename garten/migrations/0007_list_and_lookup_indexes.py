@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:09
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0006_pflanzplaneintrag_sorte_aussaat_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pflanzplaneintrag',
+            index=models.Index(fields=['-jahr', 'aussaatdatum', 'id'], name='pflanzplan_jahr_aussaat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pflanzplaneintrag',
+            index=models.Index(fields=['sorte', 'jahr'], name='pflanzplan_sorte_jahr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sorte',
+            index=models.Index(fields=['kategorie', 'name'], name='sorte_kategorie_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sorte',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='sorte_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:12
+
+from itertools import groupby
+from statistics import median
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of garten.statistik.FELDER/berechne() as of this migration
+FELDER = ('sorte_id', 'jahr', 'aussaatdatum', 'anzahl_samen', 'art_der_aussaat', 'pikierdatum', 'pflanzdatum')
+
+
+def berechne(sorte_id, jahr, zeilen):
+    zeilen = list(zeilen)
+    tage_pikiert = [(z[5] - z[2]).days for z in zeilen if z[5]]
+    tage_gepflanzt = [(z[6] - z[2]).days for z in zeilen if z[6]]
+    return {
+        'sorte_id': sorte_id,
+        'jahr': jahr,
+        'anzahl_aussaaten': len(zeilen),
+        'samen_gesamt': sum(z[3] for z in zeilen),
+        'anzahl_anzucht': sum(1 for z in zeilen if z[4] == 'ANZUCHT'),
+        'anzahl_freiland': sum(1 for z in zeilen if z[4] == 'FREILAND'),
+        'median_tage_pikiert': median(tage_pikiert) if tage_pikiert else None,
+        'median_tage_gepflanzt': median(tage_gepflanzt) if tage_gepflanzt else None,
+    }
+
+
+def fill_statistik(apps, schema_editor):
+    PflanzplanEintrag = apps.get_model('garten', 'PflanzplanEintrag')
+    SorteJahresStatistik = apps.get_model('garten', 'SorteJahresStatistik')
+    zeilen = PflanzplanEintrag.objects.order_by('sorte_id', 'jahr').values_list(*FELDER).iterator()
+    SorteJahresStatistik.objects.bulk_create(
+        [SorteJahresStatistik(**berechne(sorte_id, jahr, gruppe))
+         for (sorte_id, jahr), gruppe in groupby(zeilen, key=lambda z: (z[0], z[1]))],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0008_sorte_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SorteJahresStatistik',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jahr', models.PositiveSmallIntegerField()),
+                ('anzahl_aussaaten', models.PositiveIntegerField(default=0)),
+                ('samen_gesamt', models.PositiveIntegerField(default=0)),
+                ('anzahl_anzucht', models.PositiveIntegerField(default=0)),
+                ('anzahl_freiland', models.PositiveIntegerField(default=0)),
+                ('median_tage_pikiert', models.FloatField(blank=True, null=True)),
+                ('median_tage_gepflanzt', models.FloatField(blank=True, null=True)),
+                ('sorte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistiken', to='garten.sorte')),
+            ],
+            options={
+                'verbose_name': 'Sorten-Jahresstatistik',
+                'verbose_name_plural': 'Sorten-Jahresstatistiken',
+                'ordering': ['sorte', '-jahr'],
+                'constraints': [models.UniqueConstraint(fields=('sorte', 'jahr'), name='statistik_sorte_jahr_unique')],
+            },
+        ),
+        migrations.RunPython(fill_statistik, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Loeschung',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modell', models.CharField(max_length=50)),
+                ('objekt_id', models.BigIntegerField()),
+                ('geloescht_am', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Löschung',
+                'verbose_name_plural': 'Löschungen',
+            },
+        ),
+    ]
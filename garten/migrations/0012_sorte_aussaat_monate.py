@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+def monatsmaske(start, ende):
+    # Frozen copy of garten.kalender.monatsmaske() as of this migration
+    start = start or ende
+    ende = ende or start
+    if not start or not 1 <= start <= 12 or not 1 <= ende <= 12:
+        return 0
+    maske = 0
+    monat = start
+    while True:
+        maske |= 1 << (monat - 1)
+        if monat == ende:
+            return maske
+        monat = monat % 12 + 1
+
+
+def fill_aussaat_monate(apps, schema_editor):
+    Sorte = apps.get_model('garten', 'Sorte')
+    # One UPDATE per distinct window; updated_at stays, the mask only restates
+    # aussaat_start_monat/aussaat_end_monat that clients already have
+    fenster = Sorte.objects.order_by().values_list('aussaat_start_monat', 'aussaat_end_monat').distinct()
+    for start, ende in fenster:
+        maske = monatsmaske(start, ende)
+        if maske:
+            Sorte.objects.filter(aussaat_start_monat=start, aussaat_end_monat=ende).update(aussaat_monate=maske)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0011_loeschung'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sorte',
+            name='aussaat_monate',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_aussaat_monate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def eroeffnungsbestand(apps, schema_editor):
+    # The current bestand becomes the opening INVENTUR row of each Sorte
+    Sorte = apps.get_model('garten', 'Sorte')
+    Bestandsbewegung = apps.get_model('garten', 'Bestandsbewegung')
+    zeilen = Sorte.objects.exclude(bestand=0).order_by('pk').values_list('pk', 'bestand').iterator(chunk_size=1000)
+    Bestandsbewegung.objects.bulk_create(
+        (Bestandsbewegung(sorte_id=pk, menge=bestand, grund='INVENTUR') for pk, bestand in zeilen),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0012_sorte_aussaat_monate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Bestandsbewegung',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('menge', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('grund', models.CharField(choices=[('INVENTUR', 'Inventur'), ('KORREKTUR', 'Korrektur'), ('AUSSAAT', 'Aussaat'), ('STORNO', 'Storno')], max_length=20)),
+                ('erstellt_am', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pflanzplan_eintrag', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='bewegungen', to='garten.pflanzplaneintrag')),
+                ('sorte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bewegungen', to='garten.sorte')),
+            ],
+            options={
+                'verbose_name': 'Bestandsbewegung',
+                'verbose_name_plural': 'Bestandsbewegungen',
+                'ordering': ['-erstellt_am', '-id'],
+                'indexes': [models.Index(fields=['sorte', 'erstellt_am'], name='bewegung_sorte_zeit_idx')],
+            },
+        ),
+        migrations.RunPython(eroeffnungsbestand, migrations.RunPython.noop),
+    ]
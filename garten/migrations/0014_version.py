@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garten', '0013_bestandsbewegung'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='art',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='kategorie',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pflanzplaneintrag',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sorte',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -1,10 +1,53 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 # Create your models here.
 # Datei: garten/models.py
 
-class Kategorie(models.Model):
+class VersionConflict(Exception):
+    """The row was changed or deleted by someone else since it was loaded."""
+
+
+class Versioniert(models.Model):
+    """
+    Optimistic locking: save() of a loaded row runs
+    UPDATE ... SET version = version + 1 WHERE id = %s AND version = <self.version>
+    and raises VersionConflict if no row matched, instead of overwriting a
+    change saved in the meantime. Nothing is locked between loading and
+    saving. Forms and API clients send back the version they were shown.
+
+    QuerySet.update()/bulk_update() skip the check; the stock bookings of
+    garten.bestand do so on purpose, because they add up instead of
+    overwriting.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A VersionConflict rolls back this save only, not the caller's transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update, *args, **kwargs):
+        if self._state.adding:
+            # New or deserialized instances (snapshots, fixtures) upsert as usual
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update, *args, **kwargs)
+        feld = self._meta.get_field('version')
+        values = [wert for wert in values if wert[0] is not feld] + [(feld, None, F('version') + 1)]
+        if not super()._do_update(base_qs.filter(version=self.version), using, pk_val, values,
+                                  update_fields, forced_update, *args, **kwargs):
+            raise VersionConflict(f"{self._meta.verbose_name} {pk_val} wurde inzwischen geändert oder gelöscht.")
+        self.version += 1
+        return True
+
+
+class Kategorie(Versioniert):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Kategorie'
@@ -15,8 +58,9 @@ class Kategorie(models.Model):
         return self.name
 
 
-class Art(models.Model):
+class Art(Versioniert):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Art'
@@ -27,7 +71,7 @@ class Art(models.Model):
         return self.name
 
 
-class Sorte(models.Model):
+class Sorte(Versioniert):
     EINHEITEN = [
         ('ANZ', 'Anzahl'),
         ('G', 'g'),
@@ -41,17 +85,56 @@ class Sorte(models.Model):
     info_url = models.URLField(blank=True)
     bestand = models.DecimalField(max_digits=9, decimal_places=2, default=0)
     einheit = models.CharField(max_length=10, choices=EINHEITEN, default='ANZ')
+    # Sowing window as a 12-bit month mask, see garten.kalender
+    aussaat_monate = models.PositiveSmallIntegerField(default=0, editable=False, db_index=True)
+    # auto_now covers save(); bulk_update()/update() have to set it themselves
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Sorte'
         verbose_name_plural = 'Sorten'
         ordering = ['kategorie', 'name']
+        indexes = [
+            models.Index(fields=['kategorie', 'name'], name='sorte_kategorie_name_idx'),
+            # Django compiles name__iexact/istartswith to UPPER(name) on PostgreSQL
+            models.Index(Upper('name'), name='sorte_name_upper_idx'),
+        ]
+
+    # Computed by ableiten(); bulk_create()/bulk_update() callers call it themselves
+    ABGELEITETE_FELDER = ('aussaat_monate',)
+    # Changed through the stock ledger (garten.bestand), never written directly
+    GEBUCHTE_FELDER = ('bestand',)
+
+    def ableiten(self):
+        from .kalender import monatsmaske
+        self.aussaat_monate = monatsmaske(self.aussaat_start_monat, self.aussaat_end_monat)
+
+    def save(self, *args, **kwargs):
+        self.ableiten()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'aussaat_start_monat', 'aussaat_end_monat'} & set(update_fields):
+            # e.g. update_or_create() only lists the fields it was given
+            kwargs['update_fields'] = {*update_fields, *self.ABGELEITETE_FELDER}
+        # bestand edits are booked in the ledger, see garten.bestand
+        from .bestand import sorte_speichern
+        sorte_speichern(self, super().save, *args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        sorte = super().from_db(db, field_names, values)
+        # save() books the difference to this value instead of overwriting bestand
+        sorte._bestand_geladen = sorte.__dict__.get('bestand')
+        return sorte
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._bestand_geladen = self.__dict__.get('bestand')
 
     def __str__(self):
         return f"{self.name} ({self.kategorie})"
 
 
-class PflanzplanEintrag(models.Model):
+class PflanzplanEintrag(Versioniert):
     AUSSAAT_ART = [
         ('ANZUCHT', 'Anzucht'),
         ('FREILAND', 'Freiland'),
@@ -66,17 +149,137 @@ class PflanzplanEintrag(models.Model):
     pikierdatum = models.DateField(null=True, blank=True)
     pflanzdatum = models.DateField(null=True, blank=True)
     beschreibung = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Pflanzplan-Eintrag'
         verbose_name_plural = 'Pflanzplan-Einträge'
         ordering = ['-jahr', 'aussaatdatum']
+        indexes = [
+            # default list ordering / keyset and the jahr filter
+            models.Index(fields=['-jahr', 'aussaatdatum', 'id'], name='pflanzplan_jahr_aussaat_idx'),
+            # sorte filter and sorte_analyse
+            models.Index(fields=['sorte', 'jahr'], name='pflanzplan_sorte_jahr_idx'),
+        ]
+        constraints = [
+            # jahr is derived from aussaatdatum, so this also covers (sorte, jahr, aussaatdatum)
+            models.UniqueConstraint(fields=['sorte', 'aussaatdatum'], name='pflanzplan_sorte_aussaat_unique'),
+        ]
 
-    def save(self, *args, **kwargs):
+    # Computed by ableiten(); bulk_create()/bulk_update() callers call it themselves
+    ABGELEITETE_FELDER = ('jahr',)
+
+    def ableiten(self):
         if self.aussaatdatum:
             self.jahr = self.aussaatdatum.year
+
+    def save(self, *args, **kwargs):
+        self.ableiten()
+        # Versioniert.save() is atomic, so the stock deduction (signals.py) shares its transaction
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sorte.name} — {self.jahr} ({self.aussaatdatum})"
-    
\ No newline at end of file
+    
+
+class SorteJahresStatistik(models.Model):
+    """
+    Precomputed per-Sorte/per-year figures for sorte_analyse. Maintained by
+    garten.statistik: incrementally on entry save/delete, fully via
+    `manage.py rebuild_statistik`.
+    """
+    sorte = models.ForeignKey(Sorte, on_delete=models.CASCADE, related_name='statistiken')
+    jahr = models.PositiveSmallIntegerField()
+    anzahl_aussaaten = models.PositiveIntegerField(default=0)
+    samen_gesamt = models.PositiveIntegerField(default=0)
+    anzahl_anzucht = models.PositiveIntegerField(default=0)
+    anzahl_freiland = models.PositiveIntegerField(default=0)
+    median_tage_pikiert = models.FloatField(null=True, blank=True)
+    median_tage_gepflanzt = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Sorten-Jahresstatistik'
+        verbose_name_plural = 'Sorten-Jahresstatistiken'
+        ordering = ['sorte', '-jahr']
+        constraints = [
+            models.UniqueConstraint(fields=['sorte', 'jahr'], name='statistik_sorte_jahr_unique'),
+        ]
+
+    @property
+    def anteil_anzucht(self):
+        if not self.anzahl_aussaaten:
+            return None
+        return round(100 * self.anzahl_anzucht / self.anzahl_aussaaten)
+
+    @property
+    def anteil_freiland(self):
+        if not self.anzahl_aussaaten:
+            return None
+        return round(100 * self.anzahl_freiland / self.anzahl_aussaaten)
+
+    def __str__(self):
+        return f"{self.sorte.name} — {self.jahr}"
+
+
+class Loeschung(models.Model):
+    """
+    Tombstone of a deleted Kategorie/Art/Sorte/PflanzplanEintrag, so the delta
+    sync (garten.sync) can tell offline clients about deletions. Written by
+    signals.py, pruned by `manage.py loeschungen_aufraeumen`.
+    """
+    modell = models.CharField(max_length=50)
+    objekt_id = models.BigIntegerField()
+    geloescht_am = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Löschung'
+        verbose_name_plural = 'Löschungen'
+
+    def __str__(self):
+        return f"{self.modell} {self.objekt_id} ({self.geloescht_am:%Y-%m-%d %H:%M})"
+
+
+class Bestandsbewegung(models.Model):
+    """
+    Append-only stock ledger: every change of Sorte.bestand is one signed
+    row, and Sorte.bestand is the sum of a Sorte's rows. Written through
+    garten.bestand, which applies the movement to bestand in the same
+    transaction.
+    """
+    INVENTUR = 'INVENTUR'
+    KORREKTUR = 'KORREKTUR'
+    AUSSAAT = 'AUSSAAT'
+    STORNO = 'STORNO'
+    GRUENDE = [
+        (INVENTUR, 'Inventur'),
+        (KORREKTUR, 'Korrektur'),
+        (AUSSAAT, 'Aussaat'),
+        (STORNO, 'Storno'),
+    ]
+
+    sorte = models.ForeignKey(Sorte, on_delete=models.CASCADE, related_name='bewegungen')
+    menge = models.DecimalField(max_digits=9, decimal_places=2)
+    grund = models.CharField(max_length=20, choices=GRUENDE)
+    # Kept after the entry is deleted, so the ledger rows are never rewritten
+    pflanzplan_eintrag = models.ForeignKey(
+        PflanzplanEintrag, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='bewegungen',
+    )
+    erstellt_am = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Bestandsbewegung'
+        verbose_name_plural = 'Bestandsbewegungen'
+        ordering = ['-erstellt_am', '-id']
+        indexes = [
+            # per-Sorte history and the consumption sum of the low-stock report
+            models.Index(fields=['sorte', 'erstellt_am'], name='bewegung_sorte_zeit_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Bestandsbewegungen werden nicht geändert, sondern durch eine Gegenbuchung ausgeglichen.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.sorte.name}: {self.menge:+} ({self.get_grund_display()})"
@@ -0,0 +1,162 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+PAGE_SIZE = 50
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Pages through a queryset by seeking past the ordering values of the last
+    (or first) row instead of using OFFSET, so every page costs the same
+    regardless of how deep the user has scrolled.
+
+    `ordering` must end in a unique field (usually 'id') and none of its
+    fields may be NULL; annotate a Coalesce() first for nullable columns.
+    """
+
+    def __init__(self, queryset, ordering, page_size=PAGE_SIZE):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.page_size = page_size
+
+    def page(self, cursor=None):
+        queryset, direction, seeking = self._page_queryset(cursor)
+        return self._build_page(list(queryset), direction, seeking)
+
+    def _page_queryset(self, cursor):
+        direction, values = self._decode(cursor)
+        backwards = direction == 'p'
+
+        queryset = self.queryset.annotate(**{
+            self._key(i): F(field.lstrip('-')) for i, field in enumerate(self.ordering)
+        })
+        if values is not None:
+            try:
+                queryset = queryset.filter(self._seek(values, backwards))
+            except (ValidationError, ValueError, TypeError):
+                # Tampered cursor values that do not fit the key columns.
+                return self._page_queryset(None)
+
+        order_by = []
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-') != backwards
+            order_by.append(('-' if descending else '') + self._key(i))
+        return queryset.order_by(*order_by)[:self.page_size + 1], direction, values is not None
+
+    def _build_page(self, rows, direction, seeking):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, seeking
+
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=self._encode('n', rows[-1]) if has_next else None,
+            previous_cursor=self._encode('p', rows[0]) if has_previous else None,
+        )
+
+    def _seek(self, values, backwards):
+        # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR ...
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-') != backwards
+            step = Q(**{f"{self._key(i)}__{'lt' if descending else 'gt'}": values[i]})
+            for j in range(i):
+                step &= Q(**{self._key(j): values[j]})
+            condition |= step
+        return condition
+
+    def _encode(self, direction, row):
+        values = [getattr(row, self._key(i)) for i in range(len(self.ordering))]
+        payload = json.dumps({'d': direction, 'v': values}, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        """Returns (direction, values); broken or stale cursors start over."""
+        if not cursor:
+            return 'n', None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, values = payload['d'], payload['v']
+        except (ValueError, TypeError, KeyError):
+            return 'n', None
+        if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != len(self.ordering):
+            return 'n', None
+        return direction, values
+
+    @staticmethod
+    def _key(i):
+        return f'keyset_{i}'
+
+
+class GeschaetzterPaginator(Paginator):
+    """
+    For the admin changelists of large tables: the count of an unfiltered
+    list comes from PostgreSQL's planner statistics (pg_class.reltuples,
+    kept current by autovacuum) instead of a COUNT(*) over the whole table.
+    Filtered lists, small tables and other databases are counted exactly.
+    """
+    SCHAETZUNG_AB = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                                   [queryset.model._meta.db_table])
+                    zeile = cursor.fetchone()
+                # -1: never analyzed
+                if zeile and zeile[0] >= self.SCHAETZUNG_AB:
+                    return zeile[0]
+        return super().count
+
+
+class ApiCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the REST API. The default page size comes from
+    REST_FRAMEWORK['PAGE_SIZE'], clients may ask for ?page_size= up to
+    API_MAX_PAGE_SIZE.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
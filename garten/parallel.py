@@ -0,0 +1,71 @@
+"""
+Concurrent ORM calls for the async views.
+
+Django's async ORM (acount(), aiterator(), ...) hands every query to the one
+thread that owns the request's connection, so asyncio.gather() over several
+of them still runs the queries one after another. gather_queries() runs each
+call on its own thread from a small, fixed pool instead. Every pool thread
+keeps its own connection, which bounds the extra connections per worker
+process to DB_PARALLEL_QUERY_THREADS; settings.py adds them to the default
+DB_POOL_MAX_SIZE.
+
+DB_PARALLEL_QUERIES is on by default with DB_POOL. Without it, or inside a
+transaction whose uncommitted rows other connections could not see, the
+calls run one after another on the request's connection, exactly like the
+async ORM would.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from . import metrics
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'DB_PARALLEL_QUERY_THREADS', 4),
+            thread_name_prefix='garten-query',
+        )
+    return _executor
+
+
+def _run(query, messung):
+    # Same connection bookkeeping as the request_started/request_finished
+    # handlers, which never run on the pool threads.
+    close_old_connections()
+    try:
+        with metrics.aktiv(messung):
+            return query()
+    finally:
+        close_old_connections()
+
+
+@sync_to_async
+def _in_transaction():
+    # Checked on the thread that owns the request's connection
+    return connection.in_atomic_block
+
+
+async def gather_queries(*queries):
+    """
+    Runs the given zero-argument callables, each of which evaluates one
+    independent query, and returns their results in order.
+    """
+    if not getattr(settings, 'DB_PARALLEL_QUERIES', False) or await _in_transaction():
+        return [await sync_to_async(query)() for query in queries]
+
+    # run_in_executor() does not copy the caller's context, so the pool thread
+    # gets its own connection instead of sharing the request's one. Only the
+    # request's metrics are handed over explicitly.
+    loop = asyncio.get_running_loop()
+    messung = metrics.aktuell()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_get_executor(), _run, query, messung) for query in queries
+    ))
@@ -1,25 +1,96 @@
-from rest_framework import serializers
-from .models import Sorte, Kategorie, Art, PflanzplanEintrag
+from rest_framework import exceptions, serializers, status
+from .models import Sorte, Kategorie, Art, PflanzplanEintrag, VersionConflict
 
-class KategorieSerializer(serializers.ModelSerializer):
+
+class VorgeladenerPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks the pk up in context['vorgeladen'][model] when the bulk actions
+    (garten.bulk) have loaded all referenced rows in advance, instead of one
+    query per item.
+    """
+
+    def to_internal_value(self, data):
+        vorgeladen = self.context.get('vorgeladen', {}).get(self.get_queryset().model)
+        if vorgeladen is None:
+            return super().to_internal_value(data)
+        try:
+            if isinstance(data, bool) or not isinstance(data, (int, str)):
+                raise TypeError
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in vorgeladen:
+            self.fail('does_not_exist', pk_value=data)
+        return vorgeladen[pk]
+
+
+class BulkFaehigMixin:
+    serializer_related_field = VorgeladenerPrimaryKeyRelatedField
+
+    def get_validators(self):
+        # The bulk actions check unique constraints for the whole list in one query
+        if self.context.get('bulk'):
+            return []
+        return super().get_validators()
+
+
+class VersionKonflikt(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Der Eintrag wurde inzwischen geändert. Bitte neu laden und erneut speichern.'
+    default_code = 'version_conflict'
+
+
+class VersionsMixin(serializers.Serializer):
+    """
+    Optimistic locking (models.Versioniert): clients send back the `version`
+    they read and get a 409 if the row was saved since. Without a version
+    the one loaded by this request is checked.
+    """
+    version = serializers.IntegerField(required=False, min_value=1)
+
+    def create(self, validated_data):
+        validated_data.pop('version', None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'version' in validated_data:
+            instance.version = validated_data.pop('version')
+        try:
+            return super().update(instance, validated_data)
+        except VersionConflict:
+            raise VersionKonflikt()
+
+
+class KategorieSerializer(VersionsMixin, serializers.ModelSerializer):
     class Meta:
         model = Kategorie
         fields = '__all__'
 
-class ArtSerializer(serializers.ModelSerializer):
+class ArtSerializer(VersionsMixin, serializers.ModelSerializer):
     class Meta:
         model = Art
         fields = '__all__'
 
-class SorteSerializer(serializers.ModelSerializer):
+class SorteSerializer(BulkFaehigMixin, VersionsMixin, serializers.ModelSerializer):
     kategorie_name = serializers.ReadOnlyField(source='kategorie.name')
     art_name = serializers.ReadOnlyField(source='art.name')
+    # The bestand the client read: a changed bestand books the difference to
+    # it, so sowings booked since then are kept (garten.bestand)
+    bestand_gelesen = serializers.DecimalField(max_digits=9, decimal_places=2, required=False, write_only=True)
 
     class Meta:
         model = Sorte
         fields = '__all__'
 
-class PflanzplanEintragSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        gelesen = attrs.pop('bestand_gelesen', None)
+        if gelesen is not None and 'bestand' in attrs and self.instance is not None:
+            # Read when the row is saved, also by the bulk PATCH
+            self.instance._bestand_gelesen = gelesen
+        return attrs
+
+class PflanzplanEintragSerializer(BulkFaehigMixin, VersionsMixin, serializers.ModelSerializer):
     sorte_name = serializers.ReadOnlyField(source='sorte.name')
 
     class Meta:
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import bestand, filter_options, metrics, statistik
+from .models import Art, Kategorie, Loeschung, PflanzplanEintrag, Sorte
+
+
+@receiver([post_save, post_delete], sender=Kategorie)
+@receiver([post_save, post_delete], sender=Art)
+@receiver([post_save, post_delete], sender=Sorte)
+@receiver([post_save, post_delete], sender=PflanzplanEintrag)
+def invalidate_filter_options(sender, **kwargs):
+    # After the commit: a reader in between would cache the old rows under the new version
+    transaction.on_commit(lambda: filter_options.invalidate(sender))
+
+
+@receiver(post_delete, sender=Kategorie)
+@receiver(post_delete, sender=Art)
+@receiver(post_delete, sender=Sorte)
+@receiver(post_delete, sender=PflanzplanEintrag)
+def record_loeschung(sender, instance, **kwargs):
+    # Tombstone for the delta sync (garten.sync)
+    Loeschung.objects.create(modell=sender._meta.model_name, objekt_id=instance.pk)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    metrics.installiere(connection)
+
+
+@receiver(pre_save, sender=PflanzplanEintrag)
+def remember_statistik_bucket(sender, instance, raw=False, **kwargs):
+    # An edit may move the entry to another sorte/jahr; the old bucket needs a refresh too
+    instance._statistik_bucket = None
+    if instance.pk and not raw:
+        instance._statistik_bucket = sender.objects.filter(pk=instance.pk).values_list('sorte_id', 'jahr').first()
+
+
+@receiver(post_save, sender=PflanzplanEintrag)
+def refresh_statistik_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    buckets = {(instance.sorte_id, instance.jahr)}
+    if getattr(instance, '_statistik_bucket', None):
+        buckets.add(instance._statistik_bucket)
+    statistik.aktualisiere(buckets)
+
+
+@receiver(post_save, sender=PflanzplanEintrag)
+def book_aussaat(sender, instance, created, raw=False, **kwargs):
+    # Inside PflanzplanEintrag.save()'s transaction
+    if not raw:
+        bestand.aussaaten_buchen([instance], neu=created)
+
+
+@receiver(post_delete, sender=PflanzplanEintrag)
+def refresh_statistik_on_delete(sender, instance, **kwargs):
+    statistik.aktualisiere({(instance.sorte_id, instance.jahr)})
+
+
+@receiver(post_delete, sender=PflanzplanEintrag)
+def cancel_aussaat(sender, instance, **kwargs):
+    bestand.aussaat_stornieren(instance)
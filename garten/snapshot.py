@@ -0,0 +1,153 @@
+"""
+Logical "changed since" snapshots of the garten tables, the lightweight
+complement to the full pg_dump backups of backup_db.sh/snapshot_db.sh.
+
+A snapshot is a JSON Lines file:
+- a header line {"snapshot": {"token": ..., "seit": ..., "erstellt": ...}},
+- one {"ids": <model>, "pks": [...]} line per table with all primary keys
+  that still exist, so deletions can be replayed as well,
+- every row inserted or updated since the token of the previous snapshot
+  (or full backup), in Django's jsonl serialization.
+
+Importing deletes before it upserts, so a row that was deleted and then
+re-created under a new primary key does not collide with the stale one on a
+unique constraint. The deletes go through the ORM and leave the usual
+Loeschung tombstones for sync clients (sync.py).
+
+On PostgreSQL "changed since" compares the row's xmin with the transaction
+horizon (pg_snapshot_xmin) recorded by the previous run. age(xmin) keeps the
+comparison correct across xid wraparound as long as two snapshots are less
+than 2^31 transactions apart. Other databases always get a full snapshot.
+SorteJahresStatistik is derived data and is rebuilt after importing. The
+stock ledger is restored row by row like the other tables, so Sorte.bestand
+keeps matching it.
+"""
+import datetime
+import json
+import tempfile
+from itertools import islice
+
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import IntegerField
+from django.db.models.expressions import RawSQL
+
+from . import filter_options, statistik
+from .models import Art, Bestandsbewegung, Kategorie, PflanzplanEintrag, Sorte
+
+# Parents before children; deletions run in reverse order
+MODELLE = (Kategorie, Art, Sorte, PflanzplanEintrag, Bestandsbewegung)
+
+CHUNK_SIZE = 2000
+MAX_XID_ABSTAND = 2 ** 31
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def exportiere(write, seit=None):
+    """
+    Writes one snapshot through write(text) and returns the token for the
+    next run (None on databases without xmin).
+    """
+    postgres = connection.vendor == 'postgresql'
+    if seit is not None and not postgres:
+        raise SnapshotError("Änderungs-Snapshots seit einem Token gibt es nur mit PostgreSQL.")
+
+    with transaction.atomic():
+        token = aktuell = None
+        if postgres:
+            with connection.cursor() as cursor:
+                # One consistent view of all tables for the whole export
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, txid_current()")
+                token, aktuell = cursor.fetchone()
+            if seit is not None and not 0 <= aktuell - seit < MAX_XID_ABSTAND:
+                raise SnapshotError(f"Token {seit} passt nicht zur Datenbank, bitte ein Vollbackup erstellen.")
+
+        write(json.dumps({'snapshot': {
+            'token': token,
+            'seit': seit,
+            'erstellt': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }}) + '\n')
+
+        for model in MODELLE:
+            pks = list(model.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=CHUNK_SIZE))
+            write(json.dumps({'ids': model._meta.label_lower, 'pks': pks}) + '\n')
+
+        for model in MODELLE:
+            queryset = model.objects.order_by('pk')
+            if seit is not None:
+                # age() counts from our own xid (txid_current above)
+                queryset = queryset.alias(
+                    xmin_alter=RawSQL(
+                        f'age({connection.ops.quote_name(model._meta.db_table)}.xmin)', (), output_field=IntegerField(),
+                    ),
+                ).filter(xmin_alter__lte=aktuell - seit)
+            rows = queryset.iterator(chunk_size=CHUNK_SIZE)
+            while chunk := list(islice(rows, CHUNK_SIZE)):
+                write(serializers.serialize('jsonl', chunk))
+
+    return token
+
+
+def importiere(lines):
+    """
+    Applies one snapshot on top of the current data: deletes rows whose
+    primary key it does not list, then upserts its rows. Returns the header.
+    Rows that come before the ids lines (snapshots written by older versions
+    list the ids last) wait in a temporary file until the deletes are done.
+    """
+    modelle = {model._meta.label_lower: model for model in MODELLE}
+    header, ids, anzahl = None, {}, 0
+    geloescht = False
+
+    def loeschen():
+        # Children first. The ledger rows left for an entry the snapshot does
+        # not have add up to zero, so deleting it books no cancellation.
+        for model in reversed(MODELLE):
+            model.objects.exclude(pk__in=ids[model._meta.label_lower]).delete()
+
+    def einspielen(line):
+        nonlocal anzahl
+        for obj in serializers.deserialize('jsonl', line):
+            obj.save()
+            anzahl += 1
+
+    with transaction.atomic(), tempfile.TemporaryFile('w+', encoding='utf-8') as zurueckgestellt:
+        for line in lines:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if 'snapshot' in data:
+                header = data['snapshot']
+            elif 'ids' in data:
+                ids[data['ids']] = data['pks']
+            elif header is not None and set(ids) == set(modelle):
+                if not geloescht:
+                    loeschen()
+                    geloescht = True
+                einspielen(line)
+            else:
+                zurueckgestellt.write(line if line.endswith('\n') else line + '\n')
+
+        if header is None or set(ids) != set(modelle):
+            raise SnapshotError("Unvollständiger Snapshot, nichts eingespielt.")
+
+        if not geloescht:
+            loeschen()
+        zurueckgestellt.seek(0)
+        for line in zurueckgestellt:
+            einspielen(line)
+
+        # Rows were inserted with explicit primary keys
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), MODELLE):
+                cursor.execute(sql)
+
+    filter_options.invalidate(*MODELLE)
+    statistik.neu_aufbauen()
+    header['zeilen'] = anzahl
+    return header
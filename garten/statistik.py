@@ -0,0 +1,85 @@
+"""
+Maintenance of the SorteJahresStatistik summary table.
+
+aktualisiere() recomputes only the (sorte, jahr) buckets it is given and is
+called from the PflanzplanEintrag signals and after bulk writes;
+neu_aufbauen() rebuilds the whole table in one streaming pass.
+"""
+from itertools import groupby
+from statistics import median
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import PflanzplanEintrag, SorteJahresStatistik
+
+FELDER = ('sorte_id', 'jahr', 'aussaatdatum', 'anzahl_samen', 'art_der_aussaat', 'pikierdatum', 'pflanzdatum')
+# What berechne() computes besides the key
+STATISTIK_FELDER = ('anzahl_aussaaten', 'samen_gesamt', 'anzahl_anzucht', 'anzahl_freiland',
+                    'median_tage_pikiert', 'median_tage_gepflanzt')
+
+
+def berechne(sorte_id, jahr, zeilen):
+    """
+    Field values of one bucket from rows shaped like FELDER.
+    Pure function; migration 0009 has a frozen copy.
+    """
+    zeilen = list(zeilen)
+    tage_pikiert = [(z[5] - z[2]).days for z in zeilen if z[5]]
+    tage_gepflanzt = [(z[6] - z[2]).days for z in zeilen if z[6]]
+    return {
+        'sorte_id': sorte_id,
+        'jahr': jahr,
+        'anzahl_aussaaten': len(zeilen),
+        'samen_gesamt': sum(z[3] for z in zeilen),
+        'anzahl_anzucht': sum(1 for z in zeilen if z[4] == 'ANZUCHT'),
+        'anzahl_freiland': sum(1 for z in zeilen if z[4] == 'FREILAND'),
+        'median_tage_pikiert': median(tage_pikiert) if tage_pikiert else None,
+        'median_tage_gepflanzt': median(tage_gepflanzt) if tage_gepflanzt else None,
+    }
+
+
+def _bucket_filter(keys):
+    condition = Q()
+    for sorte_id, jahr in keys:
+        condition |= Q(sorte_id=sorte_id, jahr=jahr)
+    return condition
+
+
+def aktualisiere(keys):
+    """Recomputes the given (sorte_id, jahr) buckets."""
+    keys = {key for key in keys if None not in key}
+    if not keys:
+        return
+    zeilen = PflanzplanEintrag.objects.filter(_bucket_filter(keys)).order_by('sorte_id', 'jahr').values_list(*FELDER)
+    neu = [
+        SorteJahresStatistik(**berechne(sorte_id, jahr, gruppe))
+        for (sorte_id, jahr), gruppe in groupby(zeilen, key=lambda z: (z[0], z[1]))
+    ]
+    leer = keys - {(bucket.sorte_id, bucket.jahr) for bucket in neu}
+    with transaction.atomic():
+        if leer:
+            SorteJahresStatistik.objects.filter(_bucket_filter(leer)).delete()
+        # An upsert: two first sowings of a bucket saved at the same time would
+        # both find nothing to replace and collide on statistik_sorte_jahr_unique
+        SorteJahresStatistik.objects.bulk_create(
+            neu, update_conflicts=True, unique_fields=['sorte', 'jahr'], update_fields=STATISTIK_FELDER,
+        )
+
+
+def neu_aufbauen(batch_size=1000):
+    """Rebuilds the whole table; returns the number of buckets."""
+    zeilen = PflanzplanEintrag.objects.order_by('sorte_id', 'jahr').values_list(*FELDER).iterator(chunk_size=batch_size)
+    anzahl = 0
+    with transaction.atomic():
+        SorteJahresStatistik.objects.all().delete()
+        batch = []
+        for (sorte_id, jahr), gruppe in groupby(zeilen, key=lambda z: (z[0], z[1])):
+            batch.append(SorteJahresStatistik(**berechne(sorte_id, jahr, gruppe)))
+            if len(batch) >= batch_size:
+                SorteJahresStatistik.objects.bulk_create(batch)
+                anzahl += len(batch)
+                batch = []
+        SorteJahresStatistik.objects.bulk_create(batch)
+        anzahl += len(batch)
+    return anzahl
@@ -0,0 +1,113 @@
+"""
+Delta sync for offline clients: GET /api/sync/?since=<token>.
+
+The response is one JSON object:
+- "token": pass it as ?since= next time,
+- "vollstaendig": true if this is a full sync (no or expired token) and the
+  client should replace its data instead of merging,
+- "geloescht": {"sorten": [ids], ...} rows deleted since the token,
+- "kategorien", "arten", "sorten", "pflanzplan": rows created or updated
+  since the token, serialized like the regular API endpoints.
+
+Clients apply "geloescht" first, then upsert the rows.
+
+Changes are found through the updated_at index; deletions through the
+Loeschung tombstones that signals.py writes. updated_at is set when a row is
+saved, not when its transaction commits, so every sync reaches back
+SYNC_OVERLAP_SECONDS before the token and may repeat a few rows. The
+tombstones are read before the rows: a row deleted in between shows up in
+the next sync instead of being resurrected on the client.
+
+The rows are streamed in chunks like the exports, so an initial sync of the
+whole catalogue never sits in memory. After restoring a backup the restored
+rows keep their old updated_at, so clients need a full sync (drop the token).
+"""
+import datetime
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Art, Kategorie, Loeschung, PflanzplanEintrag, Sorte
+from .serializers import ArtSerializer, KategorieSerializer, PflanzplanEintragSerializer, SorteSerializer
+
+CHUNK_SIZE = 500
+
+# Response key, model, queryset (as in the API viewsets), serializer
+MODELLE = (
+    ('kategorien', Kategorie, Kategorie.objects.all(), KategorieSerializer),
+    ('arten', Art, Art.objects.all(), ArtSerializer),
+    ('sorten', Sorte, Sorte.objects.select_related('kategorie', 'art'), SorteSerializer),
+    ('pflanzplan', PflanzplanEintrag, PflanzplanEintrag.objects.select_related('sorte'), PflanzplanEintragSerializer),
+)
+
+_EPOCHE = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class UngueltigerToken(ValueError):
+    pass
+
+
+def token(zeitpunkt):
+    return str((zeitpunkt - _EPOCHE) // datetime.timedelta(microseconds=1))
+
+
+def zeitpunkt(token):
+    try:
+        return _EPOCHE + datetime.timedelta(microseconds=int(token))
+    except (TypeError, ValueError, OverflowError):
+        raise UngueltigerToken(token)
+
+
+def aenderungen(since=None):
+    """
+    Returns (kopf, ab): the response fields before the rows, and the time
+    from which rows are sent (None for a full sync).
+    """
+    jetzt = timezone.now()
+    ab = None
+    if since:
+        ab = zeitpunkt(since) - datetime.timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        if ab < jetzt - datetime.timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+            # Older tombstones may already be pruned
+            ab = None
+
+    geloescht = {name: [] for name, *_ in MODELLE}
+    if ab is not None:
+        namen = {model._meta.model_name: name for name, model, *_ in MODELLE}
+        for modell, objekt_id in Loeschung.objects.filter(geloescht_am__gte=ab).values_list('modell', 'objekt_id'):
+            if modell in namen:
+                geloescht[namen[modell]].append(objekt_id)
+        for name, model, *_ in MODELLE:
+            if geloescht[name]:
+                # Rows restored with their old primary key since then
+                wieder_da = set(model.objects.filter(pk__in=geloescht[name]).values_list('pk', flat=True))
+                geloescht[name] = sorted(set(geloescht[name]) - wieder_da)
+
+    return {'token': token(jetzt), 'vollstaendig': ab is None, 'geloescht': geloescht}, ab
+
+
+def json_chunks(kopf, ab):
+    """Yields the response as text chunks, the rows of each model in CHUNK_SIZE batches."""
+    # The header fields, without the closing brace
+    yield json.dumps(kopf)[:-1]
+    for name, _, queryset, serializer in MODELLE:
+        if ab is not None:
+            queryset = queryset.filter(updated_at__gte=ab)
+        rows = queryset.order_by('updated_at', 'id').iterator(chunk_size=CHUNK_SIZE)
+        yield f', "{name}": ['
+        trenner = ''
+        while chunk := list(islice(rows, CHUNK_SIZE)):
+            yield trenner + json.dumps(serializer(chunk, many=True).data, cls=JSONEncoder)[1:-1]
+            trenner = ', '
+        yield ']'
+    yield '}'
+
+
+def aufraeumen():
+    """Deletes tombstones older than SYNC_TOMBSTONE_DAYS; returns how many."""
+    grenze = timezone.now() - datetime.timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    anzahl, _ = Loeschung.objects.filter(geloescht_am__lt=grenze).delete()
+    return anzahl
@@ -0,0 +1,28 @@
+from django import template
+from django.urls import reverse
+
+register = template.Library()
+
+# Stands in for the primary key in url_muster() and is swapped by url_pk
+PK_PLATZHALTER = 918273645
+
+
+@register.simple_tag
+def url_muster(view_name):
+    """
+    Reverses a URL with a `pk` argument once per page, e.g.
+    {% url_muster 'sorte_update' as bearbeiten_url %} ... {{ bearbeiten_url|url_pk:sorte.pk }}
+    instead of a {% url %} resolution per table row.
+    """
+    return reverse(view_name, args=[PK_PLATZHALTER])
+
+
+@register.filter
+def hat_monat(maske, monat):
+    """Whether month `monat` (1-12) is set in a garten.kalender month mask."""
+    return bool(maske & (1 << (monat - 1)))
+
+
+@register.filter
+def url_pk(muster, pk):
+    return muster.replace(str(PK_PLATZHALTER), str(pk), 1)
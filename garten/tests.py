@@ -1,7 +1,7 @@
-from django.test import TestCase, Client
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from .models import Sorte, Kategorie, Art, PflanzplanEintrag
-from datetime import date
+from datetime import date, timedelta
 
 class ModelTests(TestCase):
 
@@ -299,3 +299,1555 @@ class ManagementTests(TestCase):
         response = self.client.get('/')
         self.assertContains(response, 'href="/kategorien/"')
         self.assertContains(response, 'href="/arten/"')
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='gaertner', password='geheim')
+        self.client.force_login(self.user)
+
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie)
+        self.andere_sorte = Sorte.objects.create(name="Amabile")
+        for tag in range(1, 61):
+            PflanzplanEintrag.objects.create(
+                sorte=self.sorte, aussaatdatum=date(2024 + tag % 2, 1, 1) + timedelta(days=tag),
+                anzahl_samen=tag, art_der_aussaat='ANZUCHT'
+            )
+        PflanzplanEintrag.objects.create(sorte=self.andere_sorte, aussaatdatum=date(2025, 5, 1), anzahl_samen=1, art_der_aussaat='FREILAND')
+
+    def _alle_seiten(self, url):
+        eintraege = []
+        response = self.client.get(url)
+        while True:
+            eintraege.extend(response.context['pflanzplaene'])
+            page = response.context['page']
+            if not page.has_next:
+                return eintraege, response
+            separator = '&' if '?' in url else '?'
+            response = self.client.get(f'{url}{separator}cursor={page.next_cursor}')
+
+    def test_pflanzplan_pages_cover_all_rows_in_order(self):
+        eintraege, _ = self._alle_seiten('/pflanzplan/')
+        self.assertEqual(len(eintraege), 61)
+        self.assertEqual(len({e.pk for e in eintraege}), 61)
+        erwartet = list(PflanzplanEintrag.objects.order_by('-jahr', 'aussaatdatum', 'id'))
+        self.assertEqual(eintraege, erwartet)
+
+    def test_first_page_is_limited(self):
+        response = self.client.get('/pflanzplan/')
+        self.assertEqual(len(response.context['pflanzplaene']), 50)
+        self.assertFalse(response.context['page'].has_previous)
+        self.assertTrue(response.context['page'].has_next)
+
+    def test_previous_cursor_returns_previous_page(self):
+        first = self.client.get('/pflanzplan/?sort=aussaatdatum')
+        second = self.client.get('/pflanzplan/', {'sort': 'aussaatdatum', 'cursor': first.context['page'].next_cursor})
+        back = self.client.get('/pflanzplan/', {'sort': 'aussaatdatum', 'cursor': second.context['page'].previous_cursor})
+        self.assertEqual(back.context['pflanzplaene'], first.context['pflanzplaene'])
+        self.assertFalse(back.context['page'].has_previous)
+
+    def test_sort_and_filters_are_kept(self):
+        eintraege, _ = self._alle_seiten(f'/pflanzplan/?sort=-sorte__kategorie__name&sorte={self.sorte.id}&jahr=2025')
+        self.assertEqual(len(eintraege), 30)
+        self.assertTrue(all(e.sorte_id == self.sorte.id and e.jahr == 2025 for e in eintraege))
+
+    def test_sort_by_nullable_kategorie(self):
+        eintraege, _ = self._alle_seiten('/pflanzplan/?sort=sorte__kategorie__name')
+        self.assertEqual(len(eintraege), 61)
+        self.assertEqual(eintraege[0].sorte, self.andere_sorte)
+
+    def test_invalid_cursor_starts_over(self):
+        response = self.client.get('/pflanzplan/?cursor=kaputt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['pflanzplaene']), 50)
+        self.assertFalse(response.context['page'].has_previous)
+
+    def test_sorte_list_pages(self):
+        for i in range(60):
+            Sorte.objects.create(name=f"Sorte {i:02d}", kategorie=self.kategorie)
+        response = self.client.get('/sorten/')
+        self.assertEqual(len(response.context['sorten']), 50)
+        self.assertContains(response, 'Weiter')
+        response = self.client.get('/sorten/', {'cursor': response.context['page'].next_cursor})
+        self.assertEqual(len(response.context['sorten']), 12)
+        self.assertFalse(response.context['page'].has_next)
+
+class APIPaginationTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='gaertner', password='geheim')
+        self.client.force_login(self.user)
+
+        self.art = Art.objects.create(name="Tomate")
+        for i in range(5):
+            kategorie = Kategorie.objects.create(name=f"Kategorie {i}")
+            for j in range(5):
+                sorte = Sorte.objects.create(name=f"Sorte {i}-{j}", kategorie=kategorie, art=self.art)
+                PflanzplanEintrag.objects.create(sorte=sorte, aussaatdatum=date(2025, 3, j + 1), anzahl_samen=j, art_der_aussaat='ANZUCHT')
+
+    def test_query_count_is_constant(self):
+        # session + user + one joined SELECT, independent of the page size
+        for endpoint in ['/api/sorten/', '/api/pflanzplan/', '/api/kategorien/', '/api/arten/']:
+            # the first request also aggregates the ETag (see ConditionalGetTests)
+            self.client.get(endpoint)
+            for page_size in (2, 25):
+                with self.assertNumQueries(3):
+                    response = self.client.get(endpoint, {'page_size': page_size})
+                self.assertEqual(response.status_code, 200)
+
+    def test_related_names_are_serialized(self):
+        response = self.client.get('/api/sorten/', {'page_size': 1})
+        sorte = response.json()['results'][0]
+        self.assertEqual(sorte['kategorie_name'], 'Kategorie 0')
+        self.assertEqual(sorte['art_name'], 'Tomate')
+
+    def test_cursor_walks_all_rows(self):
+        ids = []
+        url = '/api/pflanzplan/?page_size=10'
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(ids, list(PflanzplanEintrag.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_oversized_page_size_is_capped(self):
+        response = self.client.get('/api/sorten/', {'page_size': 100000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 25)
+
+class ImportSortenTests(TestCase):
+    def _write_json(self, items):
+        import json
+        import os
+        import tempfile
+        handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8')
+        with handle:
+            json.dump(items, handle)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def _run(self, path, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('import_sorten', path, *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_bulk_import_creates_updates_and_skips(self):
+        kategorie = Kategorie.objects.create(name="Salat Kopf")
+        Sorte.objects.create(name="Saladin", kategorie=kategorie, bestand=1)
+        Sorte.objects.create(name="Lucinde", kategorie=kategorie, bestand=0.7, einheit='G')
+        path = self._write_json([
+            {"Name": "Saladin", "Anzucht": "15. Januar 2025 → 15. Juli 2025", "Art": "Eis", "Bestand": "0,91", "Einheit": "g", "Kategorie": "Salat Kopf", "URL": ""},
+            {"Name": "Lucinde", "Anzucht": "", "Art": "", "Bestand": "0,7", "Einheit": "g", "Kategorie": "Salat Kopf", "URL": ""},
+            {"Name": "Harzfeuer", "Anzucht": "15. März 2025", "Art": "Tomate", "Bestand": "12", "Einheit": "k", "Kategorie": "Gemüse", "URL": ""},
+            {"Name": "Ohne Kategorie", "Kategorie": ""},
+        ])
+
+        output = self._run(path, '--bulk')
+
+        self.assertIn("1 erstellt, 1 aktualisiert, 1 übersprungen, 1 unverändert, 0 doppelt", output)
+        saladin = Sorte.objects.get(name="Saladin")
+        self.assertEqual(str(saladin.bestand), "0.91")
+        self.assertEqual((saladin.aussaat_start_monat, saladin.aussaat_end_monat), (1, 7))
+        self.assertEqual(saladin.art.name, "Eis")
+        harzfeuer = Sorte.objects.get(name="Harzfeuer")
+        self.assertEqual(harzfeuer.kategorie.name, "Gemüse")
+        self.assertEqual(harzfeuer.einheit, "ANZ")
+
+
+    def test_bulk_import_sets_updated_at(self):
+        from django.utils import timezone
+        kategorie = Kategorie.objects.create(name="Gemüse")
+        sorte = Sorte.objects.create(name="Harzfeuer", kategorie=kategorie, bestand=1)
+        Sorte.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self._run(self._write_json([{"Name": "Harzfeuer", "Bestand": "3", "Einheit": "k", "Kategorie": "Gemüse"}]), '--bulk')
+        sorte.refresh_from_db()
+        self.assertGreater(sorte.updated_at, timezone.now() - timedelta(minutes=1))
+
+    def test_bulk_import_computes_aussaat_monate(self):
+        from .kalender import monate
+        kategorie = Kategorie.objects.create(name="Gemüse")
+        sorte = Sorte.objects.create(name="Winterportulak", kategorie=kategorie)
+        self._run(self._write_json([
+            {"Name": "Winterportulak", "Anzucht": "1. Oktober 2025 → 15. Januar 2026", "Kategorie": "Gemüse"},
+            {"Name": "Feldsalat", "Anzucht": "1. August 2025", "Kategorie": "Gemüse"},
+        ]), '--bulk')
+        sorte.refresh_from_db()
+        self.assertEqual(monate(sorte.aussaat_monate), [1, 10, 11, 12])
+        self.assertEqual(monate(Sorte.objects.get(name="Feldsalat").aussaat_monate), [8])
+
+    def test_bulk_import_query_count_does_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for size in (10, 200):
+            items = [{"Name": f"Sorte {size}-{i}", "Art": f"Art {size}-{i % 7}", "Kategorie": f"Kategorie {size}-{i % 3}", "Bestand": "1"} for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self._run(self._write_json(items), '--bulk', '--batch-size', '500')
+            counts.append(len(queries))
+        # SQLite may split a batch (Sorten, their opening ledger rows) because of its bind parameter limit
+        self.assertLessEqual(counts[1], counts[0] + 3)
+        self.assertEqual(Sorte.objects.count(), 210)
+
+    def test_single_import_matches_bulk_import(self):
+        path = self._write_json([
+            {"Name": "Harzfeuer", "Anzucht": "15. März 2025", "Art": "Tomate", "Bestand": "12", "Einheit": "k", "Kategorie": "Gemüse"},
+        ])
+        self.assertIn("1 erstellt, 0 aktualisiert, 0 übersprungen", self._run(path))
+        self.assertIn("0 erstellt, 0 aktualisiert, 0 übersprungen, 1 unverändert", self._run(path, '--bulk'))
+
+    def test_bulk_totals_add_up_like_the_single_import(self):
+        import re
+        kategorie = Kategorie.objects.create(name="Gemüse")
+        Sorte.objects.create(name="Harzfeuer", kategorie=kategorie, bestand=12)
+        items = [
+            {"Name": "Harzfeuer", "Bestand": "12", "Kategorie": "Gemüse"},
+            {"Name": "Habanero", "Bestand": "1", "Kategorie": "Gemüse"},
+            {"Name": "Habanero", "Bestand": "2", "Kategorie": "Gemüse"},
+            {"Name": "Ohne Kategorie"},
+        ]
+        output = self._run(self._write_json(items), '--bulk')
+        self.assertIn("1 erstellt, 0 aktualisiert, 1 übersprungen, 1 unverändert, 1 doppelt in der Datei", output)
+        self.assertEqual(sum(int(zahl) for zahl in re.findall(r'(\d+) ', output)), len(items))
+
+    def test_bulk_import_bumps_the_version(self):
+        kategorie = Kategorie.objects.create(name="Gemüse")
+        sorte = Sorte.objects.create(name="Harzfeuer", kategorie=kategorie, bestand=1)
+        version = sorte.version
+        self._run(self._write_json([{"Name": "Harzfeuer", "Bestand": "3", "Kategorie": "Gemüse"}]), '--bulk')
+        sorte.refresh_from_db()
+        self.assertEqual(sorte.version, version + 1)
+
+class ImportPflanzplanTests(TestCase):
+    CSV = (
+        "\ufeffName,Anzahl,Aussaat,pikiert,ID,wie?,wo?,🥕 Sorten\n"
+        "9,10,15. Februar 2025,12. März 2025,8,Anzucht,Anzuchtschale,Habanero (https://www.notion.so/Habanero)\n"
+        "12,5,1. April 2025,,6,Freiland,,Violetta di Firenze\n"
+        "13,5,,,7,Freiland,,Violetta di Firenze\n"
+        "14,5,2. April 2025,,9,Freiland,,Unbekannt\n"
+    )
+
+    def setUp(self):
+        kategorie = Kategorie.objects.create(name="Gemüse")
+        self.habanero = Sorte.objects.create(name="Habanero", kategorie=kategorie)
+        self.violetta = Sorte.objects.create(name="Violetta di Firenze", kategorie=kategorie)
+
+    def _run(self, *args, stdin=None):
+        import io
+        import sys
+        from unittest import mock
+        from django.core.management import call_command
+        out = io.StringIO()
+        with mock.patch.object(sys, 'stdin', io.TextIOWrapper(io.BytesIO((stdin or '').encode('utf-8')))):
+            call_command('import_pflanzplan', *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def _write(self, content, suffix):
+        import os
+        import tempfile
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_csv_file_with_bom_and_emoji_header(self):
+        output = self._run(self._write(self.CSV, '.csv'), '--batch-size', '1')
+        self.assertIn("2 Einträge erstellt, 0 bereits vorhanden, 2 übersprungen", output)
+        eintrag = PflanzplanEintrag.objects.get(sorte=self.habanero)
+        self.assertEqual(eintrag.aussaatdatum, date(2025, 2, 15))
+        self.assertEqual(eintrag.pikierdatum, date(2025, 3, 12))
+        self.assertEqual(eintrag.anzahl_samen, 10)
+        self.assertEqual(PflanzplanEintrag.objects.get(sorte=self.violetta).art_der_aussaat, 'FREILAND')
+
+    def test_stdin_csv_is_idempotent(self):
+        self._run('-', stdin=self.CSV)
+        output = self._run('-', stdin=self.CSV)
+        self.assertIn("0 Einträge erstellt, 2 bereits vorhanden", output)
+        self.assertEqual(PflanzplanEintrag.objects.count(), 2)
+
+    def test_json_lines(self):
+        import json
+        lines = "\n".join(json.dumps(row, ensure_ascii=False) for row in [
+            {"Anzahl": "3", "Aussaat": "1. Mai 2024", "wie?": "Anzucht", "🥕 Sorten": "habanero"},
+            {},
+        ])
+        output = self._run('-', '--format', 'jsonl', stdin="\ufeff" + lines + "\n\n")
+        self.assertIn("1 Einträge erstellt", output)
+        self.assertEqual(PflanzplanEintrag.objects.get().jahr, 2024)
+
+    def test_import_runs_a_fixed_number_of_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        zeilen = "".join(
+            f"{i},1,{i % 28 + 1}. {monat} 2025,,{i},Anzucht,,{'HABANERO' if i % 2 else 'Violetta di Firenze (x)'}\n"
+            for i, monat in enumerate(["Februar", "März", "April"] * 40)
+        )
+        csv_text = "Name,Anzahl,Aussaat,pikiert,ID,wie?,wo?,Sorten\n" + zeilen
+        with CaptureQueriesContext(connection) as queries:
+            output = self._run('-', stdin=csv_text)
+        self.assertIn(f"{PflanzplanEintrag.objects.count()} Einträge erstellt", output)
+        self.assertIn("0 übersprungen", output)
+        # index + existing keys + insert + re-select + ledger booking + statistik refresh, not ~3 per row
+        self.assertLessEqual(len(queries), 15)
+
+    def test_rows_lost_to_a_concurrent_save_count_as_existing(self):
+        from unittest import mock
+        from . import filter_options
+        bulk_create = PflanzplanEintrag.objects.bulk_create
+
+        def gleichzeitig(objs, **kwargs):
+            # Saved by someone else between the lookup and the insert
+            PflanzplanEintrag.objects.create(sorte=self.habanero, aussaatdatum=date(2025, 2, 15), anzahl_samen=1,
+                                             art_der_aussaat='ANZUCHT')
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(PflanzplanEintrag.objects, 'bulk_create', side_effect=gleichzeitig):
+            output = self._run(self._write(self.CSV, '.csv'))
+        self.assertIn("1 Einträge erstellt, 1 bereits vorhanden, 2 übersprungen", output)
+        self.assertEqual(PflanzplanEintrag.objects.get(sorte=self.habanero).anzahl_samen, 1)
+
+        version = filter_options.version(PflanzplanEintrag)
+        output = self._run(self._write(self.CSV, '.csv'))
+        self.assertIn("0 Einträge erstellt, 2 bereits vorhanden", output)
+        self.assertEqual(filter_options.version(PflanzplanEintrag), version)
+
+    def test_import_books_the_sowings(self):
+        from .models import Bestandsbewegung
+        Sorte.objects.filter(pk=self.habanero.pk).update(einheit='ANZ', bestand=25)
+        Sorte.objects.filter(pk=self.violetta.pk).update(einheit='G', bestand=3)
+        self._run(self._write(self.CSV, '.csv'))
+        self.habanero.refresh_from_db()
+        self.violetta.refresh_from_db()
+        self.assertEqual((self.habanero.bestand, self.violetta.bestand), (15, 3))
+        eintrag = PflanzplanEintrag.objects.get(sorte=self.habanero)
+        self.assertEqual(list(Bestandsbewegung.objects.filter(grund=Bestandsbewegung.AUSSAAT)
+                              .values_list('sorte_id', 'menge', 'pflanzplan_eintrag_id')),
+                         [(self.habanero.pk, -10, eintrag.pk)])
+        # Importing the file again books nothing twice
+        self._run(self._write(self.CSV, '.csv'))
+        self.habanero.refresh_from_db()
+        self.assertEqual(self.habanero.bestand, 15)
+
+    def test_duplicate_entry_is_rejected_by_the_form(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        PflanzplanEintrag.objects.create(sorte=self.habanero, aussaatdatum=date(2025, 2, 15), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+        response = self.client.post(reverse('pflanzplan_create'), {
+            'sorte': self.habanero.id,
+            'aussaatdatum': '2025-02-15',
+            'anzahl_samen': 3,
+            'art_der_aussaat': 'ANZUCHT',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PflanzplanEintrag.objects.count(), 1)
+
+class IndexUsageTests(TestCase):
+    """EXPLAIN the list and analysis queries and check they hit the composite indexes."""
+
+    def setUp(self):
+        from django.db import connection
+        kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=kategorie)
+        for tag in range(1, 30):
+            PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2024, 1, 1) + timedelta(days=tag * 20), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be scanned sequentially
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def _list_plan(self, **filters):
+        from .pagination import KeysetPaginator
+        from .views import PFLANZPLAN_SORTIERUNGEN
+        queryset = PflanzplanEintrag.objects.filter(**filters).select_related('sorte', 'sorte__kategorie')
+        queryset, _, _ = KeysetPaginator(queryset, PFLANZPLAN_SORTIERUNGEN['-jahr'])._page_queryset(None)
+        return queryset.explain()
+
+    def test_list_uses_jahr_aussaat_index(self):
+        self.assertIn('pflanzplan_jahr_aussaat_idx', self._list_plan())
+        self.assertIn('pflanzplan_jahr_aussaat_idx', self._list_plan(jahr=2025))
+
+    def test_sorte_filter_uses_sorte_index(self):
+        plan = self._list_plan(sorte_id=self.sorte.id)
+        self.assertTrue('pflanzplan_sorte_jahr_idx' in plan or 'pflanzplan_sorte_aussaat_unique' in plan, plan)
+
+    def test_analyse_query_uses_an_index(self):
+        plan = PflanzplanEintrag.objects.filter(sorte=self.sorte, jahr=2025).order_by('-jahr', '-aussaatdatum').explain()
+        self.assertTrue(any(name in plan for name in (
+            'pflanzplan_sorte_jahr_idx', 'pflanzplan_sorte_aussaat_unique', 'pflanzplan_jahr_aussaat_idx',
+        )), plan)
+
+    def test_sorte_name_lookup_uses_functional_index(self):
+        from django.db import connection
+        if connection.vendor != 'postgresql':
+            self.skipTest("SQLite compiles iexact to LIKE, which cannot use expression indexes")
+        self.assertIn('sorte_name_upper_idx', Sorte.objects.filter(name__iexact='harzfeuer').explain())
+
+class FilterOptionCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie)
+        PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+
+    def test_repeated_views_only_query_the_main_table(self):
+        self.client.get('/pflanzplan/')
+        # session + user + the paginated entries
+        with self.assertNumQueries(3):
+            self.client.get('/pflanzplan/')
+        self.client.get('/sorten/')
+        with self.assertNumQueries(3):
+            self.client.get('/sorten/')
+
+    def test_saving_invalidates_the_options(self):
+        self.client.get('/pflanzplan/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Kategorie.objects.create(name="Obst")
+            PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2021, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+        response = self.client.get('/pflanzplan/')
+        self.assertEqual(list(response.context['jahre']), [2025, 2021])
+        self.assertContains(response, 'Obst')
+
+    def test_deleting_invalidates_the_options(self):
+        self.client.get('/sorten/')
+        with self.captureOnCommitCallbacks(execute=True):
+            andere = Kategorie.objects.create(name="Kräuter")
+        self.assertContains(self.client.get('/sorten/'), 'Kräuter')
+        with self.captureOnCommitCallbacks(execute=True):
+            andere.delete()
+        self.assertNotContains(self.client.get('/sorten/'), 'Kräuter')
+
+    def test_invalidated_after_the_commit(self):
+        from . import filter_options
+        vorher = filter_options.version(Kategorie)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Kategorie.objects.create(name="Obst")
+            # A reader before the commit must not cache the old list under a new version
+            self.assertEqual(filter_options.version(Kategorie), vorher)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(filter_options.version(Kategorie), vorher)
+
+class RowFragmentCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie)
+        self.eintrag = PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+
+    def test_url_pk_matches_reverse(self):
+        from django.template import Context, Template
+        html = Template(
+            "{% load garten_tags %}{% url_muster 'sorte_update' as muster %}{{ muster|url_pk:pk }}"
+        ).render(Context({'pk': 42}))
+        self.assertEqual(html, reverse('sorte_update', args=[42]))
+
+    def test_rows_have_their_links(self):
+        response = self.client.get('/pflanzplan/')
+        self.assertContains(response, reverse('pflanzplan_delete', args=[self.eintrag.pk]))
+        response = self.client.get('/sorten/')
+        self.assertContains(response, reverse('sorte_update', args=[self.sorte.pk]))
+        self.assertContains(response, reverse('sorte_delete', args=[self.sorte.pk]))
+
+    def test_changes_reach_cached_rows(self):
+        self.assertContains(self.client.get('/pflanzplan/'), 'Harzfeuer')
+        self.assertContains(self.client.get('/sorten/'), 'Harzfeuer')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sorte.name = "Ochsenherz"
+            self.sorte.save()
+            self.kategorie.name = "Obst"
+            self.kategorie.save()
+        for pfad in ('/pflanzplan/', '/sorten/'):
+            response = self.client.get(pfad)
+            self.assertContains(response, 'Ochsenherz')
+            self.assertContains(response, 'Obst')
+            self.assertNotContains(response, 'Harzfeuer')
+
+    def test_bulk_update_with_updated_at(self):
+        from django.utils import timezone
+        from . import filter_options
+        self.client.get('/pflanzplan/')
+        PflanzplanEintrag.objects.filter(pk=self.eintrag.pk).update(anzahl_samen=77, updated_at=timezone.now())
+        filter_options.invalidate(PflanzplanEintrag)
+        self.assertContains(self.client.get('/pflanzplan/'), '<td data-label="Anzahl">77</td>')
+
+    def test_other_rows_stay_cached(self):
+        anderer = PflanzplanEintrag.objects.create(sorte=Sorte.objects.create(name="Habanero"), aussaatdatum=date(2025, 4, 1), anzahl_samen=2, art_der_aussaat='ANZUCHT')
+        self.client.get('/pflanzplan/')
+        # Not a real change, so this row must come from the cache
+        PflanzplanEintrag.objects.filter(pk=anderer.pk).update(anzahl_samen=55)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.eintrag.anzahl_samen = 77
+            self.eintrag.save()
+            Sorte.objects.create(name="Boskoop")
+        response = self.client.get('/pflanzplan/')
+        self.assertContains(response, '<td data-label="Anzahl">77</td>')
+        self.assertContains(response, '<td data-label="Anzahl">2</td>')
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='gaertner')
+        self.client.force_login(self.user)
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie)
+        self.eintrag = PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+
+    def test_unchanged_lists_answer_304_without_queries(self):
+        for pfad in ('/pflanzplan/', '/sorten/', '/kategorien/', '/arten/', '/api/sorten/', '/api/pflanzplan/'):
+            with self.subTest(pfad):
+                # the first visit also sets the CSRF cookie, which is part of the ETag
+                self.client.get(pfad)
+                response = self.client.get(pfad)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('private', response['Cache-Control'])
+                # session + user only
+                with self.assertNumQueries(2):
+                    response = self.client.get(pfad, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_changes_and_other_users_get_new_etags(self):
+        from django.contrib.auth.models import User
+        self.client.get('/pflanzplan/')
+        etag = self.client.get('/pflanzplan/')['ETag']
+        self.assertEqual(self.client.get('/pflanzplan/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sorte.name = "Ochsenherz"
+            self.sorte.save()
+        response = self.client.get('/pflanzplan/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ochsenherz')
+
+        self.client.force_login(User.objects.create_user(username='andere'))
+        self.assertEqual(self.client.get('/pflanzplan/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_deletion_moves_last_modified(self):
+        from django.utils import timezone
+        from . import filter_options
+        # Last-Modified has a resolution of seconds; move the rows out of this one
+        gestern = timezone.now() - timedelta(days=1)
+        for model in (PflanzplanEintrag, Sorte, Kategorie):
+            model.objects.update(updated_at=gestern)
+        filter_options.invalidate(PflanzplanEintrag, Sorte, Kategorie)
+
+        response = self.client.get('/pflanzplan/')
+        self.assertEqual(self.client.get('/pflanzplan/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.eintrag.delete()
+        response = self.client.get('/pflanzplan/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Keine Einträge gefunden.')
+
+    def test_late_commit_with_older_updated_at_changes_the_validators(self):
+        from django.utils import timezone
+        from . import filter_options
+        gestern = timezone.now() - timedelta(days=1)
+        Kategorie.objects.update(updated_at=gestern)
+        Sorte.objects.update(updated_at=gestern - timedelta(hours=1))
+        PflanzplanEintrag.objects.update(updated_at=gestern)
+        filter_options.invalidate(PflanzplanEintrag, Sorte, Kategorie)
+        response = self.client.get('/pflanzplan/')
+
+        # Saved before the maximum already seen, committed after it
+        Sorte.objects.update(name="Ochsenherz", updated_at=gestern - timedelta(minutes=30))
+        filter_options.invalidate(Sorte)
+        self.assertEqual(self.client.get('/pflanzplan/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/pflanzplan/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class SyncTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie, bestand=2)
+        self.andere = Sorte.objects.create(name="Ochsenherz", kategorie=self.kategorie)
+        self.eintrag = PflanzplanEintrag.objects.create(sorte=self.andere, aussaatdatum=date(2025, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+
+    def _sync(self, since=None):
+        import json
+        response = self.client.get('/api/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_full_sync_without_token(self):
+        daten = self._sync()
+        self.assertTrue(daten['vollstaendig'])
+        self.assertEqual([s['name'] for s in daten['sorten']], ['Harzfeuer', 'Ochsenherz'])
+        self.assertEqual(daten['sorten'][0]['kategorie_name'], 'Gemüse')
+        self.assertEqual(len(daten['pflanzplan']), 1)
+        self.assertEqual(len(daten['kategorien']), 1)
+
+    def test_only_changes_and_deletions_since_the_token(self):
+        from django.utils import timezone
+        for model in (Kategorie, Sorte, PflanzplanEintrag):
+            model.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        token = self._sync()['token']
+
+        self.sorte.bestand = 5
+        self.sorte.save()
+        eintrag_id = self.eintrag.pk
+        self.eintrag.delete()
+
+        daten = self._sync(token)
+        self.assertFalse(daten['vollstaendig'])
+        # Deleting the entry gave its seed back to the other Sorte
+        self.assertEqual([s['id'] for s in daten['sorten']], [self.sorte.pk, self.andere.pk])
+        self.assertEqual(daten['sorten'][0]['bestand'], '5.00')
+        self.assertEqual(daten['kategorien'], [])
+        self.assertEqual(daten['pflanzplan'], [])
+        self.assertEqual(daten['geloescht'], {'kategorien': [], 'arten': [], 'sorten': [], 'pflanzplan': [eintrag_id]})
+        self.assertEqual(self._sync(daten['token'])['geloescht']['pflanzplan'], [])
+
+    def test_expired_and_invalid_tokens(self):
+        from .sync import token
+        from django.utils import timezone
+        alt = token(timezone.now() - timedelta(days=365))
+        self.assertTrue(self._sync(alt)['vollstaendig'])
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'gestern'}).status_code, 400)
+
+    def test_old_tombstones_are_pruned(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import Loeschung
+        self.eintrag.delete()
+        Loeschung.objects.create(modell='sorte', objekt_id=999, geloescht_am=timezone.now() - timedelta(days=400))
+        call_command('loeschungen_aufraeumen', stdout=StringIO())
+        self.assertEqual(list(Loeschung.objects.values_list('modell', flat=True)), ['pflanzplaneintrag'])
+
+class BulkApiTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorten = [Sorte.objects.create(name=f"Sorte {i}", kategorie=self.kategorie) for i in range(3)]
+
+    def _bulk(self, methode, pfad, daten):
+        return getattr(self.client, methode)(pfad, daten, content_type='application/json')
+
+    def _woche(self, tage):
+        return [
+            {'sorte': self.sorten[tag % 3].pk, 'aussaatdatum': f'2025-04-{tag + 1:02d}', 'anzahl_samen': tag + 1, 'art_der_aussaat': 'ANZUCHT'}
+            for tag in range(tage)
+        ]
+
+    def test_bulk_create_derives_jahr_and_updates_statistik(self):
+        from .models import SorteJahresStatistik
+        response = self._bulk('post', '/api/pflanzplan/bulk/', self._woche(7))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 7)
+        self.assertEqual(response.json()[0]['sorte_name'], 'Sorte 0')
+        self.assertEqual(set(PflanzplanEintrag.objects.values_list('jahr', flat=True)), {2025})
+        statistik = SorteJahresStatistik.objects.get(sorte=self.sorten[0], jahr=2025)
+        self.assertEqual(statistik.anzahl_aussaaten, 3)
+
+    def test_query_count_does_not_grow_with_the_list(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as wenige:
+            self._bulk('post', '/api/pflanzplan/bulk/', self._woche(2))
+        PflanzplanEintrag.objects.all().delete()
+        with CaptureQueriesContext(connection) as viele:
+            self._bulk('post', '/api/pflanzplan/bulk/', self._woche(20))
+        self.assertEqual(len(viele), len(wenige))
+
+    def test_invalid_items_write_nothing(self):
+        woche = self._woche(3)
+        woche[1]['sorte'] = 999999
+        woche[2]['aussaatdatum'] = woche[0]['aussaatdatum']
+        woche[2]['sorte'] = woche[0]['sorte']
+        response = self._bulk('post', '/api/pflanzplan/bulk/', woche)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()), ['1'])
+        self.assertIn('sorte', response.json()['1'])
+        self.assertFalse(PflanzplanEintrag.objects.exists())
+
+        # same sorte and date twice in the list, and once already in the table
+        woche[1]['sorte'] = self.sorten[1].pk
+        response = self._bulk('post', '/api/pflanzplan/bulk/', woche)
+        self.assertEqual(list(response.json()), ['2'])
+        self._bulk('post', '/api/pflanzplan/bulk/', self._woche(1))
+        response = self._bulk('post', '/api/pflanzplan/bulk/', self._woche(2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()), ['0'])
+        self.assertIn('non_field_errors', response.json()['0'])
+        self.assertEqual(PflanzplanEintrag.objects.count(), 1)
+
+    def test_bulk_partial_update_and_delete(self):
+        from .models import SorteJahresStatistik
+        ids = [eintrag['id'] for eintrag in self._bulk('post', '/api/pflanzplan/bulk/', self._woche(3)).json()]
+        response = self._bulk('patch', '/api/pflanzplan/bulk/', [
+            {'id': ids[0], 'aussaatdatum': '2024-04-01'},
+            {'id': ids[1], 'anzahl_samen': 50},
+        ])
+        self.assertEqual(response.status_code, 200)
+        eintrag = PflanzplanEintrag.objects.get(pk=ids[0])
+        self.assertEqual((eintrag.jahr, eintrag.anzahl_samen), (2024, 1))
+        self.assertEqual(PflanzplanEintrag.objects.get(pk=ids[1]).anzahl_samen, 50)
+        self.assertFalse(SorteJahresStatistik.objects.filter(sorte=self.sorten[0], jahr=2025).exists())
+        self.assertTrue(SorteJahresStatistik.objects.filter(sorte=self.sorten[0], jahr=2024).exists())
+
+        self.assertEqual(self._bulk('patch', '/api/pflanzplan/bulk/', [{'id': 999999, 'anzahl_samen': 1}]).status_code, 400)
+        self.assertEqual(self._bulk('delete', '/api/pflanzplan/bulk/', [ids[0], 999999]).status_code, 404)
+        self.assertEqual(self._bulk('delete', '/api/pflanzplan/bulk/', ids[:2]).status_code, 204)
+        self.assertEqual(list(PflanzplanEintrag.objects.values_list('pk', flat=True)), ids[2:])
+
+    def test_sorten_bulk(self):
+        response = self._bulk('post', '/api/sorten/bulk/', [
+            {'name': 'Harzfeuer', 'kategorie': self.kategorie.pk},
+            {'name': 'Ochsenherz'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()[0]['kategorie_name'], 'Gemüse')
+        response = self._bulk('patch', '/api/sorten/bulk/', [{'id': self.sorten[0].pk, 'bestand': '7.5'}])
+        self.assertEqual(response.json()[0]['bestand'], '7.50')
+        # Sorten with Pflanzplan entries are protected
+        self._bulk('post', '/api/pflanzplan/bulk/', self._woche(1))
+        self.assertEqual(self._bulk('delete', '/api/sorten/bulk/', [self.sorten[0].pk, self.sorten[1].pk]).status_code, 409)
+        self.assertEqual(Sorte.objects.count(), 5)
+
+class SorteAnalyseSucheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        for name in ["Harzfeuer", "Rote Harzperle", "Habanero", "Hase", "Boskoop"]:
+            Sorte.objects.create(name=name)
+
+    def test_analyse_page_does_not_embed_the_catalogue(self):
+        response = self.client.get(reverse('sorte_analyse'))
+        self.assertNotContains(response, 'Boskoop')
+        self.assertContains(response, reverse('auswahl', args=['sorte']))
+
+    def test_analyse_lookup_is_case_insensitive(self):
+        response = self.client.get(reverse('sorte_analyse'), {'lookup_id': 'boskoop'})
+        self.assertEqual(response.context['selected_sorte'].name, 'Boskoop')
+
+class AuswahlTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.art = Art.objects.create(name="Tomate")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie, art=self.art)
+
+    def _katalog(self, anzahl):
+        Kategorie.objects.bulk_create([Kategorie(name=f"Kategorie {i:03}") for i in range(anzahl)])
+        Art.objects.bulk_create([Art(name=f"Art {i:03}") for i in range(anzahl)])
+        Sorte.objects.bulk_create([Sorte(name=f"Sorte {i:03}") for i in range(anzahl)])
+
+    def test_lookup_pages_through_matches(self):
+        from .views import AUSWAHL_SEITE
+        self._katalog(AUSWAHL_SEITE + 5)
+        url = reverse('auswahl', args=['sorte'])
+        daten = self.client.get(url, {'q': 'sorte'}).json()
+        self.assertEqual(len(daten['results']), AUSWAHL_SEITE)
+        weiter = self.client.get(url, {'q': 'sorte', 'cursor': daten['next']}).json()
+        self.assertEqual([s['name'] for s in weiter['results']], [f"Sorte {i:03}" for i in range(AUSWAHL_SEITE, AUSWAHL_SEITE + 5)])
+        self.assertIsNone(weiter['next'])
+        daten = self.client.get(reverse('auswahl', args=['art']), {'q': 'toma'}).json()
+        self.assertEqual(daten['results'], [{'id': self.art.pk, 'name': 'Tomate'}])
+
+    def test_lookup_rejects_other_models(self):
+        self.assertEqual(self.client.get(reverse('auswahl', args=['pflanzplaneintrag'])).status_code, 404)
+
+    def test_form_pages_do_not_grow_with_the_catalogue(self):
+        seiten = [reverse('pflanzplan_create'), reverse('sorte_create'), reverse('sorte_update', args=[self.sorte.pk]),
+                  reverse('pflanzplan_list') + f'?sorte={self.sorte.pk}']
+        vorher = [len(self.client.get(url).content) for url in seiten]
+        self._katalog(30)
+        nachher = [len(self.client.get(url).content) for url in seiten]
+        self.assertEqual(vorher, nachher)
+        response = self.client.get(reverse('sorte_update', args=[self.sorte.pk]))
+        self.assertContains(response, f'<option value="{self.kategorie.pk}" selected>Gemüse</option>', html=True)
+        self.assertNotContains(response, 'Kategorie 000')
+
+    def test_only_the_submitted_pk_is_validated(self):
+        self._katalog(30)
+        daten = {'aussaatdatum': '2025-03-01', 'anzahl_samen': 5, 'art_der_aussaat': 'ANZUCHT'}
+        response = self.client.post(reverse('pflanzplan_create'), {**daten, 'sorte': Sorte.objects.get(name="Sorte 029").pk})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(reverse('pflanzplan_create'), {**daten, 'sorte': 999999})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['sorte'])
+
+class StatistikTests(TestCase):
+    def setUp(self):
+        self.sorte = Sorte.objects.create(name="Harzfeuer")
+        self.andere = Sorte.objects.create(name="Habanero")
+
+    def _eintrag(self, sorte, aussaat, samen=10, art='ANZUCHT', pikiert=None, gepflanzt=None):
+        return PflanzplanEintrag.objects.create(
+            sorte=sorte, aussaatdatum=aussaat, anzahl_samen=samen, art_der_aussaat=art,
+            pikierdatum=pikiert, pflanzdatum=gepflanzt,
+        )
+
+    def test_aktualisiere_upserts_existing_buckets(self):
+        from django.db import transaction
+        from . import statistik
+        from .models import SorteJahresStatistik
+        eintrag = self._eintrag(self.sorte, date(2025, 3, 1), samen=10)
+        # e.g. inserted by a concurrent first sowing of the same bucket
+        SorteJahresStatistik.objects.filter(sorte=self.sorte, jahr=2025).update(samen_gesamt=99)
+        vorher = SorteJahresStatistik.objects.get(sorte=self.sorte, jahr=2025).pk
+        with transaction.atomic():
+            statistik.aktualisiere({(self.sorte.pk, 2025), (self.andere.pk, 2025)})
+            with transaction.atomic():
+                statistik.aktualisiere({(self.sorte.pk, 2025)})
+        stat = SorteJahresStatistik.objects.get(sorte=self.sorte, jahr=2025)
+        self.assertEqual((stat.pk, stat.samen_gesamt, stat.anzahl_aussaaten), (vorher, 10, 1))
+        self.assertFalse(SorteJahresStatistik.objects.filter(sorte=self.andere).exists())
+        eintrag.delete()
+        self.assertFalse(SorteJahresStatistik.objects.exists())
+
+    def test_statistik_follows_saves_and_deletes(self):
+        from .models import SorteJahresStatistik
+        self._eintrag(self.sorte, date(2025, 3, 1), samen=10, pikiert=date(2025, 3, 11), gepflanzt=date(2025, 5, 1))
+        self._eintrag(self.sorte, date(2025, 3, 5), samen=5, pikiert=date(2025, 3, 25))
+        freiland = self._eintrag(self.sorte, date(2025, 4, 1), samen=20, art='FREILAND')
+
+        stat = SorteJahresStatistik.objects.get(sorte=self.sorte, jahr=2025)
+        self.assertEqual(stat.anzahl_aussaaten, 3)
+        self.assertEqual(stat.samen_gesamt, 35)
+        self.assertEqual((stat.anzahl_anzucht, stat.anzahl_freiland), (2, 1))
+        self.assertEqual(stat.anteil_anzucht, 67)
+        self.assertEqual(stat.median_tage_pikiert, 15)
+        self.assertEqual(stat.median_tage_gepflanzt, 61)
+
+        # moving an entry to another Sorte/Jahr refreshes both buckets
+        freiland.sorte = self.andere
+        freiland.aussaatdatum = date(2024, 4, 1)
+        freiland.save()
+        self.assertEqual(SorteJahresStatistik.objects.get(sorte=self.sorte, jahr=2025).anzahl_aussaaten, 2)
+        self.assertEqual(SorteJahresStatistik.objects.get(sorte=self.andere, jahr=2024).samen_gesamt, 20)
+
+        freiland.delete()
+        self.assertFalse(SorteJahresStatistik.objects.filter(sorte=self.andere).exists())
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import SorteJahresStatistik
+        self._eintrag(self.sorte, date(2025, 3, 1))
+        self._eintrag(self.sorte, date(2024, 3, 1))
+        self._eintrag(self.andere, date(2024, 3, 1))
+        SorteJahresStatistik.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_statistik', '--batch-size', '2', stdout=out)
+        self.assertIn("3 Sorte/Jahr-Einträge", out.getvalue())
+        self.assertEqual(SorteJahresStatistik.objects.count(), 3)
+
+    def test_analyse_reads_the_summary(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self._eintrag(self.sorte, date(2025, 3, 1))
+        self._eintrag(self.sorte, date(2024, 3, 1))
+        response = self.client.get(reverse('sorte_analyse'), {'lookup_id': 'Harzfeuer', 'jahr': 2024})
+        self.assertEqual([s.jahr for s in response.context['statistiken']], [2024])
+        self.assertContains(response, 'Statistik je Jahr')
+
+class ParallelQueryTests(SimpleTestCase):
+    @override_settings(DB_PARALLEL_QUERIES=True)
+    def test_queries_run_concurrently(self):
+        import threading
+        from asgiref.sync import async_to_sync
+        from .parallel import gather_queries
+
+        # Each call blocks until the other one has started as well
+        barrier = threading.Barrier(2, timeout=5)
+        results = async_to_sync(gather_queries)(lambda: barrier.wait(), lambda: barrier.wait())
+        self.assertEqual(sorted(results), [0, 1])
+
+class ParallelOrmQueryTests(TransactionTestCase):
+    @override_settings(DB_PARALLEL_QUERIES=True)
+    def test_orm_queries_overlap_outside_transactions(self):
+        import threading
+        from asgiref.sync import async_to_sync
+        from .parallel import gather_queries
+        Sorte.objects.create(name="Harzfeuer")
+
+        # Neither query can finish before the other one has run as well
+        barrier = threading.Barrier(2, timeout=5)
+
+        def abfrage(queryset):
+            anzahl = queryset.count()
+            barrier.wait()
+            return anzahl, threading.get_ident()
+
+        (sorten, erster), (eintraege, zweiter) = async_to_sync(gather_queries)(
+            lambda: abfrage(Sorte.objects.all()), lambda: abfrage(PflanzplanEintrag.objects.all()),
+        )
+        self.assertEqual((sorten, eintraege), (1, 0))
+        self.assertNotEqual(erster, zweiter)
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        sorte = Sorte.objects.create(name="Harzfeuer")
+        PflanzplanEintrag.objects.create(sorte=sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+
+    @override_settings(DB_PARALLEL_QUERIES=True)
+    def test_transactions_stay_on_the_request_connection(self):
+        import threading
+        from asgiref.sync import async_to_sync
+        from .parallel import gather_queries
+
+        # TestCase wraps every test in a transaction the pool threads could not see
+        ident, count = async_to_sync(gather_queries)(threading.get_ident, Sorte.objects.count)
+        self.assertEqual((ident, count), (threading.get_ident(), 1))
+
+    def test_async_views_render(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual((response.context['sorten_count'], response.context['pflanzplan_count']), (1, 1))
+        self.assertEqual(len(self.client.get(reverse('pflanzplan_list')).context['pflanzplaene']), 1)
+        self.assertEqual(len(self.client.get(reverse('sorte_list')).context['sorten']), 1)
+        response = self.client.get(reverse('sorte_analyse'), {'lookup_id': 'harzfeuer'})
+        self.assertEqual(len(response.context['eintraege']), 1)
+
+class ExportTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie, bestand='0.91', einheit='G')
+        self.andere = Sorte.objects.create(name="Habanero")
+        for tag in range(1, 4):
+            PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2025, 3, tag), anzahl_samen=tag, art_der_aussaat='ANZUCHT')
+        PflanzplanEintrag.objects.create(sorte=self.andere, aussaatdatum=date(2024, 2, 1), anzahl_samen=5, art_der_aussaat='FREILAND')
+
+    def _csv(self, response):
+        import csv
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(content[1:].splitlines()))
+
+    def test_pflanzplan_csv_keeps_the_filters(self):
+        response = self.client.get(reverse('pflanzplan_export'), {'jahr': 2025, 'kategorie': self.kategorie.id})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('pflanzplan.csv', response['Content-Disposition'])
+        rows = self._csv(response)
+        self.assertEqual(rows[0][:3], ['Jahr', 'Aussaatdatum', 'Sorte'])
+        self.assertEqual([row[1] for row in rows[1:]], ['2025-03-01', '2025-03-02', '2025-03-03'])
+        self.assertEqual(rows[1][4], 'Anzucht')
+
+    def test_csv_is_sent_in_chunks(self):
+        from unittest import mock
+        with mock.patch('garten.export.ROWS_PER_CHUNK', 2):
+            response = self.client.get(reverse('pflanzplan_export'))
+            chunks = list(response.streaming_content)
+        # header, 2 + 2 rows
+        self.assertEqual(len(chunks), 3)
+
+    def test_sorten_csv(self):
+        rows = self._csv(self.client.get(reverse('sorte_export'), {'kategorie': self.kategorie.id}))
+        self.assertEqual(rows[1][:3], ['Harzfeuer', 'Gemüse', ''])
+        self.assertEqual(rows[1][5:7], ['0.91', 'g'])
+        self.assertEqual(len(rows), 2)
+
+    def test_xlsx(self):
+        import io
+        import zipfile
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            self.skipTest("xlsxwriter ist nicht installiert")
+        response = self.client.get(reverse('pflanzplan_export'), {'format': 'xlsx', 'jahr': 2024})
+        self.assertIn('pflanzplan.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as xlsx:
+            sheet = xlsx.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn('Habanero', sheet)
+        self.assertNotIn('Harzfeuer', sheet)
+
+    def test_invalid_parameters_are_rejected_before_streaming(self):
+        for url, parameter in ((reverse('pflanzplan_export'), {'jahr': 'abc'}),
+                               (reverse('sorte_export'), {'art': '1; DROP'}),
+                               (reverse('sorte_export'), {'format': 'pdf'})):
+            with self.subTest(parameter):
+                response = self.client.get(url, parameter)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.streaming)
+        self.assertContains(self.client.get(reverse('pflanzplan_export'), {'jahr': 'abc'}), "jahr", status_code=400)
+
+    def test_formulas_are_exported_as_text(self):
+        import io
+        import zipfile
+        Sorte.objects.create(name='=HYPERLINK("http://example.com")', kategorie=self.kategorie, info_url='@SUM(A1)')
+        rows = self._csv(self.client.get(reverse('sorte_export'), {'kategorie': self.kategorie.id}))
+        self.assertEqual((rows[1][0], rows[1][7]), ('\'=HYPERLINK("http://example.com")', "'@SUM(A1)"))
+        self.assertEqual(rows[2][0], 'Harzfeuer')
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            return
+        response = self.client.get(reverse('sorte_export'), {'format': 'xlsx'})
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as xlsx:
+            sheet = xlsx.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertNotIn('<f>', sheet)
+
+    def test_export_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        out = StringIO()
+        call_command('export', 'pflanzplan', '--sorte', self.andere.id, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        self.assertIn('Habanero', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('export', 'sorten', '--format', 'xlsx', stdout=StringIO())
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie)
+        self.andere = Sorte.objects.create(name="Habanero")
+        self.eintrag = PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=10, art_der_aussaat='ANZUCHT')
+
+    def _export(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('snapshot_export', stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_round_trip_restores_updates_inserts_and_deletes(self):
+        import io
+        import sys
+        from unittest import mock
+        from django.core.management import call_command
+        from .models import SorteJahresStatistik
+        snapshot = self._export()
+
+        Sorte.objects.filter(pk=self.sorte.pk).update(name="Geändert")
+        self.andere.delete()
+        neu = Sorte.objects.create(name="Neu")
+        PflanzplanEintrag.objects.create(sorte=neu, aussaatdatum=date(2025, 4, 1), anzahl_samen=1, art_der_aussaat='FREILAND')
+
+        out = io.StringIO()
+        with mock.patch.object(sys, 'stdin', io.TextIOWrapper(io.BytesIO(snapshot.encode('utf-8')))):
+            call_command('snapshot_import', '-', stdout=out)
+        self.assertIn("eingespielt", out.getvalue())
+        self.assertEqual(sorted(Sorte.objects.values_list('name', flat=True)), ["Habanero", "Harzfeuer"])
+        self.assertEqual(list(PflanzplanEintrag.objects.values_list('pk', flat=True)), [self.eintrag.pk])
+        self.assertEqual(SorteJahresStatistik.objects.get(sorte=self.sorte).anzahl_aussaaten, 1)
+
+    def test_recreated_entry_does_not_collide_and_leaves_a_tombstone(self):
+        import json
+        from django.db.models import Sum
+        from . import snapshot as snapshots
+        from .models import Bestandsbewegung, Loeschung
+        snapshot = self._export()
+        alt = self.eintrag.pk
+        self.eintrag.delete()
+        neu = PflanzplanEintrag.objects.create(sorte=self.sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=5, art_der_aussaat='FREILAND')
+        Loeschung.objects.all().delete()
+
+        # Older snapshots list the ids after the rows
+        zeilen = snapshot.splitlines(keepends=True)
+        ids = [zeile for zeile in zeilen if '"ids"' in zeile]
+        alte_reihenfolge = [zeile for zeile in zeilen if zeile not in ids] + ids
+        for lines in (zeilen, alte_reihenfolge):
+            header = snapshots.importiere(lines)
+            self.assertEqual(json.loads(zeilen[0])['snapshot']['erstellt'], header['erstellt'])
+            self.assertEqual(list(PflanzplanEintrag.objects.values_list('pk', 'anzahl_samen')), [(alt, 10)])
+        self.assertTrue(Loeschung.objects.filter(modell='pflanzplaneintrag', objekt_id=neu.pk).exists())
+        summe = Bestandsbewegung.objects.filter(sorte=self.sorte).aggregate(summe=Sum('menge'))['summe'] or 0
+        self.assertEqual(Sorte.objects.get(pk=self.sorte.pk).bestand, summe)
+
+    def test_incomplete_snapshot_changes_nothing(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        import tempfile
+        snapshot = self._export()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8') as datei:
+            datei.write(snapshot.rsplit('{"ids"', 1)[0])
+            datei.flush()
+            Sorte.objects.filter(pk=self.sorte.pk).update(name="Geändert")
+            with self.assertRaises(CommandError):
+                call_command('snapshot_import', datei.name)
+        self.assertTrue(Sorte.objects.filter(name="Geändert").exists())
+
+    def test_changed_since_needs_postgresql(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            self.skipTest("prüft den Fallback anderer Datenbanken")
+        with self.assertRaises(CommandError):
+            call_command('snapshot_export', '--seit', '1')
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from .metrics import registry
+        cache.clear()
+        registry.leeren()
+        self.user = User.objects.create_user(username='gaertner')
+        self.client.force_login(self.user)
+        sorte = Sorte.objects.create(name="Harzfeuer")
+        PflanzplanEintrag.objects.create(sorte=sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=1, art_der_aussaat='ANZUCHT')
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        self.client.get(reverse('pflanzplan_list'))
+        response = self.client.get(reverse('pflanzplan_list'))
+        # session + user + the paginated entries, as in FilterOptionCacheTests
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_no_server_timing_header_when_off(self):
+        response = self.client.get(reverse('pflanzplan_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('pflanzplan_list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        with self.settings(METRICS_TOKEN='geheim'):
+            response = Client().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer geheim')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertRegex(text, r'shg_requests_total\{view="pflanzplan_list",pid="\d+"\} 1\n')
+        # session + user + entries + 2 filter option lists + 3 ETag aggregates
+        self.assertRegex(text, r'shg_db_queries_total\{view="pflanzplan_list",pid="\d+"\} 8\n')
+        self.assertIn('shg_request_duration_seconds_bucket{view="pflanzplan_list"', text)
+
+    @override_settings(QUERY_BUDGETS={'pflanzplan_list': 2})
+    def test_query_budget(self):
+        from .metrics import QueryBudgetExceeded
+        with self.assertLogs('garten.metrics', 'WARNING'):
+            self.client.get(reverse('pflanzplan_list'))
+        with self.settings(QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('pflanzplan_list'))
+
+    @override_settings(QUERY_BUDGETS={'pflanzplaneintrag-list': 1}, QUERY_BUDGET_STRICT=True)
+    def test_writes_are_not_budgeted(self):
+        sorte = Sorte.objects.create(name="Harzfeuer")
+        with self.assertNoLogs('garten.metrics', 'WARNING'):
+            response = self.client.post('/api/pflanzplan/', {
+                'sorte': sorte.pk, 'aussaatdatum': '2025-03-01', 'anzahl_samen': 5, 'art_der_aussaat': 'ANZUCHT',
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+class BenchmarkTests(TestCase):
+    # Per request after the caches are warm; must not grow with the data
+    QUERIES = {
+        'index': 4,
+        'pflanzplan_list': 3,
+        'pflanzplan_list_jahr': 3,
+        'pflanzplan_list_sorte': 4,
+        'pflanzplan_list_kategorie_sortiert': 3,
+        'pflanzplan_list_seite_10': 3,
+        'sorte_list': 3,
+        'sorte_list_kategorie': 3,
+        'sorte_analyse': 5,
+        'auswahl_sorten': 3,
+        'sorte_create': 2,
+        'pflanzplan_create': 2,
+        'api_sorten': 3,
+        'api_pflanzplan': 3,
+        'api_kategorien': 3,
+        'api_arten': 3,
+        'api_sorten_kalender': 3,
+        'api_sorten_jahresplan': 3,
+        'aussaat_kalender': 3,
+        'bestand_knapp': 3,
+        'api_sync_delta': 7,
+        'export_pflanzplan_csv': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        from .benchmark import erzeuge_daten
+        cls.anzahl = erzeuge_daten(scale=0.005)
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from .benchmark import kontext
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kontext = kontext()
+
+    def test_factory(self):
+        self.assertEqual(self.anzahl, {'kategorien': 1, 'arten': 2, 'sorten': 100, 'eintraege': 1000})
+        self.assertEqual(PflanzplanEintrag.objects.values('jahr').distinct().count(), 20)
+
+    def test_query_counts(self):
+        from .benchmark import BENCHMARKS
+        self.assertEqual(set(self.QUERIES), {name for name in BENCHMARKS if not name.startswith('import_')})
+        for name, queries in self.QUERIES.items():
+            BENCHMARKS[name](self.client, self.kontext)
+            with self.subTest(name), self.assertNumQueries(queries):
+                BENCHMARKS[name](self.client, self.kontext)
+
+    def test_importer_benchmarks_leave_the_data_alone(self):
+        from .benchmark import BENCHMARKS, importdateien
+        verzeichnis, dateien = importdateien(scale=0.01)
+        self.addCleanup(verzeichnis.cleanup)
+        for name in ('import_sorten', 'import_pflanzplan'):
+            BENCHMARKS[name](self.client, {**self.kontext, **dateien})
+        self.assertEqual(Sorte.objects.count(), 100)
+        self.assertEqual(PflanzplanEintrag.objects.count(), 1000)
+
+    def test_regressions_against_baseline(self):
+        from .benchmark import vergleiche
+        baseline = {'index': {'median_ms': 10.0, 'queries': 4}, 'sorte_list': {'median_ms': 10.0, 'queries': 3}}
+        ergebnisse = {'index': {'median_ms': 12.0, 'queries': 4}, 'sorte_list': {'median_ms': 13.0, 'queries': 4},
+                      'neu': {'median_ms': 99.0, 'queries': 9}}
+        self.assertEqual(vergleiche(ergebnisse, baseline, 0.25), [
+            "sorte_list: 4 Queries statt 3",
+            "sorte_list: 13.0 ms statt 10.0 ms (+30%)",
+        ])
+        self.assertEqual(vergleiche(ergebnisse, baseline, 0.25, streng=True)[-1], "neu: fehlt in der Baseline")
+
+    def test_committed_baseline_covers_every_benchmark(self):
+        import json
+        import os
+        from django.conf import settings
+        from .benchmark import BENCHMARKS
+        with open(os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'), encoding='utf-8') as datei:
+            baseline = json.load(datei)
+        self.assertEqual(baseline['meta']['scale'], 1.0)
+        self.assertEqual(set(baseline['ergebnisse']), set(BENCHMARKS))
+
+
+class KalenderTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name='Gemüse')
+        self.winter = Sorte.objects.create(name='Feldsalat', kategorie=self.kategorie,
+                                           aussaat_start_monat=11, aussaat_end_monat=2)
+        self.fruehling = Sorte.objects.create(name='Radieschen', aussaat_start_monat=3, aussaat_end_monat=5)
+        self.juni = Sorte.objects.create(name='Buschbohne', aussaat_start_monat=6)
+        self.ohne = Sorte.objects.create(name='Unbekannt')
+
+    def test_monatsmaske(self):
+        from .kalender import FENSTER, monatsmaske, monate
+        self.assertEqual(monate(monatsmaske(11, 2)), [1, 2, 11, 12])
+        self.assertEqual(monate(monatsmaske(3, 5)), [3, 4, 5])
+        self.assertEqual(monate(monatsmaske(None, 7)), [7])
+        self.assertEqual(monatsmaske(None, None), 0)
+        self.assertEqual(monatsmaske(13, 2), 0)
+        self.assertEqual(len(FENSTER), 133)
+
+    def test_save_computes_mask(self):
+        from .kalender import monate
+        self.winter.refresh_from_db()
+        self.assertEqual(monate(self.winter.aussaat_monate), [1, 2, 11, 12])
+        self.winter.aussaat_end_monat = 12
+        self.winter.save()
+        self.winter.refresh_from_db()
+        self.assertEqual(monate(self.winter.aussaat_monate), [11, 12])
+
+    def test_update_or_create_keeps_mask_current(self):
+        from .kalender import monate
+        Sorte.objects.update_or_create(name='Radieschen', defaults={'aussaat_start_monat': 8, 'aussaat_end_monat': 9})
+        self.fruehling.refresh_from_db()
+        self.assertEqual(monate(self.fruehling.aussaat_monate), [8, 9])
+
+    def test_filter_wraps_across_the_year_end(self):
+        from .kalender import filter_saebar, monatsmaske, zeitraum_maske
+        import datetime
+        def namen(maske):
+            return sorted(filter_saebar(Sorte.objects.all(), maske).values_list('name', flat=True))
+        self.assertEqual(namen(monatsmaske(1, 1)), ['Feldsalat'])
+        self.assertEqual(namen(monatsmaske(4, 4)), ['Radieschen'])
+        self.assertEqual(namen(monatsmaske(9, 9)), [])
+        self.assertEqual(namen(zeitraum_maske(datetime.date(2025, 5, 20), datetime.date(2025, 6, 3))),
+                         ['Buschbohne', 'Radieschen'])
+        self.assertEqual(namen(zeitraum_maske(datetime.date(2025, 12, 20), datetime.date(2026, 3, 1))),
+                         ['Feldsalat', 'Radieschen'])
+
+    def test_api_kalender(self):
+        response = self.client.get('/api/sorten/kalender/', {'monat': 12})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['name'] for s in response.json()['results']], ['Feldsalat'])
+        response = self.client.get('/api/sorten/kalender/', {'von': '2025-03-01', 'bis': '2025-06-30'})
+        self.assertEqual(sorted(s['name'] for s in response.json()['results']), ['Buschbohne', 'Radieschen'])
+        self.assertEqual(self.client.get('/api/sorten/kalender/', {'monat': 13}).status_code, 400)
+        self.assertEqual(self.client.get('/api/sorten/kalender/', {'von': '2025-06-01', 'bis': '2025-03-01'}).status_code, 400)
+
+    def test_api_jahresplan_in_one_query(self):
+        with self.assertNumQueries(5):
+            # Session, user, the two cached table stands and the rows
+            response = self.client.get('/api/sorten/jahresplan/')
+        daten = response.json()
+        self.assertEqual(len(daten['monate']), 12)
+        zeilen = {s['name']: s['monate'] for s in daten['sorten']}
+        self.assertEqual(len(zeilen), 4)
+        self.assertEqual([i + 1 for i, gesetzt in enumerate(zeilen['Feldsalat']) if gesetzt], [1, 2, 11, 12])
+        self.assertFalse(any(zeilen['Unbekannt']))
+        response = self.client.get('/api/sorten/jahresplan/', {'kategorie': self.kategorie.pk})
+        self.assertEqual([s['name'] for s in response.json()['sorten']], ['Feldsalat'])
+
+    def test_kalender_page(self):
+        response = self.client.get(reverse('aussaat_kalender'), {'monat': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Feldsalat')
+        self.assertNotContains(response, 'Radieschen')
+        self.assertEqual(response.context['selected_monat'], 2)
+        # Invalid input shows the current month instead of failing
+        self.assertEqual(self.client.get(reverse('aussaat_kalender'), {'monat': 'x'}).status_code, 200)
+
+
+class BestandTests(TestCase):
+    def setUp(self):
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie, bestand=10)
+        self.andere = Sorte.objects.create(name="Ochsenherz", kategorie=self.kategorie, bestand=4)
+
+    def _aussaat(self, sorte, anzahl, tag=1):
+        return PflanzplanEintrag.objects.create(sorte=sorte, aussaatdatum=date(2025, 3, tag), anzahl_samen=anzahl,
+                                                art_der_aussaat='ANZUCHT')
+
+    def _bestand(self, sorte):
+        sorte.refresh_from_db()
+        return sorte.bestand
+
+    def _journal(self, sorte):
+        from django.db.models import Sum
+        return sorte.bewegungen.aggregate(summe=Sum('menge'))['summe']
+
+    def test_new_sorte_opens_the_ledger(self):
+        from .models import Bestandsbewegung
+        self.assertEqual(list(self.sorte.bewegungen.values_list('grund', 'menge')), [(Bestandsbewegung.INVENTUR, 10)])
+
+    def test_sowing_deducts_and_changes_book_the_difference(self):
+        eintrag = self._aussaat(self.sorte, 3)
+        self.assertEqual(self._bestand(self.sorte), 7)
+        eintrag.anzahl_samen = 5
+        eintrag.save()
+        self.assertEqual(self._bestand(self.sorte), 5)
+        eintrag.sorte = self.andere
+        eintrag.save()
+        self.assertEqual((self._bestand(self.sorte), self._bestand(self.andere)), (10, -1))
+        eintrag.delete()
+        self.assertEqual((self._bestand(self.sorte), self._bestand(self.andere)), (10, 4))
+        self.assertEqual((self._journal(self.sorte), self._journal(self.andere)), (10, 4))
+
+    def test_sorten_in_grams_are_not_deducted(self):
+        saatgut = Sorte.objects.create(name="Petersilie", bestand='2.50', einheit='G')
+        self._aussaat(saatgut, 30)
+        self.assertEqual(str(self._bestand(saatgut)), '2.50')
+
+    def test_stale_edit_keeps_a_concurrent_sowing(self):
+        auf_dem_handy = Sorte.objects.get(pk=self.sorte.pk)
+        self._aussaat(self.sorte, 3)
+        # Counted two more seeds on the stale form: +2 on top of the sowing, not back to 12
+        auf_dem_handy.bestand = 12
+        auf_dem_handy.save()
+        self.assertEqual(auf_dem_handy.bestand, 9)
+        self.assertEqual(self._bestand(self.sorte), 9)
+        self.assertEqual(self._journal(self.sorte), 9)
+
+    def test_form_rendered_before_a_sowing_keeps_it(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        url = reverse('sorte_update', args=[self.sorte.pk])
+        form = self.client.get(url).context['form']
+        daten = {name: form[name].value() for name in form.fields}
+        daten = {name: '' if wert is None else wert for name, wert in daten.items()}
+        self._aussaat(self.sorte, 3)
+        # Only renamed: the displayed 10 goes back unchanged
+        response = self.client.post(url, {**daten, 'name': 'Harzfeuer F1'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._bestand(self.sorte), 7)
+        self.assertEqual(self.sorte.name, 'Harzfeuer F1')
+        # Counted 12 on the same page: +2 on top of the sowing
+        self.client.post(url, {**daten, 'version': self.sorte.version, 'bestand': '12'})
+        self.assertEqual(self._bestand(self.sorte), 9)
+        self.assertEqual(self._journal(self.sorte), 9)
+
+    def test_api_edit_books_against_bestand_gelesen(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        gelesen = self.client.get(f'/api/sorten/{self.sorte.pk}/').json()
+        self._aussaat(self.sorte, 3)
+        self._aussaat(self.andere, 1)
+        response = self.client.patch(f'/api/sorten/{self.sorte.pk}/', {
+            'name': 'Harzfeuer F1', 'bestand': gelesen['bestand'], 'bestand_gelesen': gelesen['bestand'],
+            'version': gelesen['version'],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['bestand'], '7.00')
+        self.assertNotIn('bestand_gelesen', response.json())
+        response = self.client.patch('/api/sorten/bulk/', [
+            {'id': self.sorte.pk, 'bestand': '11', 'bestand_gelesen': gelesen['bestand']},
+            {'id': self.andere.pk, 'bestand': '4', 'bestand_gelesen': '4'},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['bestand'] for s in response.json()], ['8.00', '3.00'])
+        self.assertEqual((self._bestand(self.sorte), self._bestand(self.andere)), (8, 3))
+        self.assertEqual((self._journal(self.sorte), self._journal(self.andere)), (8, 3))
+
+    def test_movements_are_append_only(self):
+        bewegung = self.sorte.bewegungen.get()
+        bewegung.menge = 99
+        with self.assertRaises(ValueError):
+            bewegung.save()
+
+    def test_abgleichen_restores_the_ledger_sum(self):
+        from io import StringIO
+        from django.core.management import call_command
+        Sorte.objects.filter(pk=self.sorte.pk).update(bestand=99)
+        out = StringIO()
+        call_command('bestand_abgleichen', stdout=out)
+        self.assertIn('1 Sorten abgeglichen', out.getvalue())
+        self.assertEqual(self._bestand(self.sorte), 10)
+
+    def test_knapp_in_one_query(self):
+        from .bestand import knapp
+        self._aussaat(self.andere, 6)
+        Sorte.objects.create(name="Leer")
+        with self.assertNumQueries(1):
+            zeilen = {sorte.name: (sorte.verbrauch, sorte.fehlmenge) for sorte in knapp()}
+        self.assertEqual(zeilen, {'Ochsenherz': (6, 8), 'Leer': (0, 0)})
+
+    def test_knapp_page(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self._aussaat(self.andere, 6)
+        response = self.client.get(reverse('bestand_knapp'))
+        self.assertContains(response, 'Ochsenherz')
+        self.assertNotContains(response, 'Harzfeuer')
+
+    def test_bulk_api_books_sowings_and_corrections(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        response = self.client.post('/api/pflanzplan/bulk/', [
+            {'sorte': self.sorte.pk, 'aussaatdatum': f'2025-04-0{tag}', 'anzahl_samen': 2, 'art_der_aussaat': 'ANZUCHT'}
+            for tag in (1, 2)
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._bestand(self.sorte), 6)
+        response = self.client.patch('/api/sorten/bulk/', [{'id': self.andere.pk, 'bestand': '7'}],
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._bestand(self.andere), 7)
+        self.assertEqual((self._journal(self.sorte), self._journal(self.andere)), (6, 7))
+
+
+class VersionTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user(username='gaertner'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+        self.sorte = Sorte.objects.create(name="Harzfeuer", kategorie=self.kategorie)
+
+    def test_stale_save_raises_instead_of_overwriting(self):
+        from .models import VersionConflict
+        erste, zweite = Sorte.objects.get(pk=self.sorte.pk), Sorte.objects.get(pk=self.sorte.pk)
+        erste.name = "Harzfeuer F1"
+        erste.save()
+        self.assertEqual(erste.version, 2)
+        zweite.name = "Harzfeuer alt"
+        with self.assertRaises(VersionConflict):
+            zweite.save()
+        self.sorte.refresh_from_db()
+        self.assertEqual((self.sorte.name, self.sorte.version), ("Harzfeuer F1", 2))
+
+    def test_form_redisplays_on_conflict(self):
+        daten = {'name': 'Harzfeuer F1', 'kategorie': self.kategorie.pk, 'bestand': 0, 'einheit': 'ANZ', 'version': 1}
+        Sorte.objects.filter(pk=self.sorte.pk).update(name='Von nebenan', version=2)
+        response = self.client.post(reverse('sorte_update', args=[self.sorte.pk]), daten)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'inzwischen von jemand anderem geändert')
+        self.assertEqual(Sorte.objects.get(pk=self.sorte.pk).name, 'Von nebenan')
+        # The redisplayed form carries the current version: saving again overwrites on purpose
+        self.assertEqual(response.context['form']['version'].value(), 2)
+        response = self.client.post(reverse('sorte_update', args=[self.sorte.pk]), {**daten, 'version': 2})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Sorte.objects.get(pk=self.sorte.pk).name, 'Harzfeuer F1')
+
+    def test_kategorie_form_conflict(self):
+        Kategorie.objects.filter(pk=self.kategorie.pk).update(version=5)
+        response = self.client.post(reverse('kategorie_update', args=[self.kategorie.pk]), {'name': 'Obst', 'version': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Kategorie.objects.get(pk=self.kategorie.pk).name, 'Gemüse')
+
+    def test_api_conflict_is_409(self):
+        url = f'/api/sorten/{self.sorte.pk}/'
+        response = self.client.patch(url, {'name': 'Neu', 'version': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 2)
+        response = self.client.patch(url, {'name': 'Veraltet', 'version': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Sorte.objects.get(pk=self.sorte.pk).name, 'Neu')
+
+    def test_bulk_api_conflict_is_409(self):
+        response = self.client.patch('/api/sorten/bulk/', [{'id': self.sorte.pk, 'name': 'Neu', 'version': 1}],
+                                     content_type='application/json')
+        self.assertEqual(response.json()[0]['version'], 2)
+        response = self.client.patch('/api/sorten/bulk/', [{'id': self.sorte.pk, 'name': 'Veraltet', 'version': 1}],
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('version', response.json()['0'])
+        self.assertEqual(Sorte.objects.get(pk=self.sorte.pk).version, 2)
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        self.kategorie = Kategorie.objects.create(name="Gemüse")
+
+    def _sorten(self, anzahl, start=0):
+        return [Sorte.objects.create(name=f"Sorte {i}", kategorie=self.kategorie, bestand=3) for i in range(start, start + anzahl)]
+
+    def test_duplicate_sorte_in_one_insert(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for anzahl, start in ((2, 0), (20, 100)):
+            sorten = self._sorten(anzahl, start)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('admin:garten_sorte_changelist'), {
+                    'action': 'duplicate_sorte', '_selected_action': [s.pk for s in sorten],
+                })
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        kopie = Sorte.objects.get(name="Sorte 100 (Kopie)")
+        self.assertEqual((kopie.kategorie, kopie.bestand, kopie.version), (self.kategorie, 3, 1))
+        self.assertEqual(kopie.bewegungen.count(), 1)
+        self.assertEqual(Sorte.objects.filter(name__endswith="(Kopie)").count(), 22)
+
+    def test_changelists_do_not_query_per_row(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        for url in (reverse('admin:garten_sorte_changelist'), reverse('admin:garten_pflanzplaneintrag_changelist')):
+            counts = []
+            for anzahl, start in ((2, 0), (20, 100)):
+                for sorte in self._sorten(anzahl, start):
+                    PflanzplanEintrag.objects.create(sorte=sorte, aussaatdatum=date(2025, 3, 1), anzahl_samen=1,
+                                                     art_der_aussaat='ANZUCHT')
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                counts.append(len(queries))
+            with self.subTest(url):
+                self.assertEqual(counts[0], counts[1])
+
+    def test_pflanzplan_form_uses_autocomplete(self):
+        response = self.client.get(reverse('admin:garten_pflanzplaneintrag_add'))
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_geschaetzter_paginator_counts_exactly_without_postgres(self):
+        from .pagination import GeschaetzterPaginator
+        self._sorten(3)
+        self.assertEqual(GeschaetzterPaginator(Sorte.objects.all(), 2).count, 3)
@@ -7,7 +7,9 @@ from .views import (
     kategorie_list, kategorie_update, kategorie_delete,
     art_list, art_update, art_delete,
     sorte_update, sorte_delete,
-    pflanzplan_delete, sorte_analyse
+    pflanzplan_delete, sorte_analyse,
+    pflanzplan_export, sorte_export, prometheus_metrics, api_sync, aussaat_kalender,
+    bestand_knapp, auswahl,
 )
 
 router = DefaultRouter()
@@ -21,6 +23,7 @@ urlpatterns = [
     
     path('sorten/', sorte_list, name='sorte_list'),
     path('sorten/neu/', sorte_create, name='sorte_create'),
+    path('sorten/export/', sorte_export, name='sorte_export'),
     path('sorten/<int:pk>/bearbeiten/', sorte_update, name='sorte_update'),
     path('sorten/<int:pk>/loeschen/', sorte_delete, name='sorte_delete'),
     
@@ -36,8 +39,15 @@ urlpatterns = [
     
     path('pflanzplan/', pflanzplan_list, name='pflanzplan_list'),
     path('pflanzplan/neu/', pflanzplan_create, name='pflanzplan_create'),
+    path('pflanzplan/export/', pflanzplan_export, name='pflanzplan_export'),
     path('pflanzplan/<int:pk>/loeschen/', pflanzplan_delete, name='pflanzplan_delete'),
     
+    path('kalender/', aussaat_kalender, name='aussaat_kalender'),
+    path('bestand/knapp/', bestand_knapp, name='bestand_knapp'),
+
+    path('api/sync/', api_sync, name='api_sync'),
     path('api/', include(router.urls)),
     path('sorten-analyse/', sorte_analyse, name='sorte_analyse'),
+    path('auswahl/<str:modell>/', auswahl, name='auswahl'),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]
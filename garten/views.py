@@ -1,42 +1,123 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from rest_framework import viewsets
-from .models import Sorte, Kategorie, Art, PflanzplanEintrag
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from . import bestand, export, filter_options, kalender, metrics, statistik, sync
+from .bulk import BulkAktionenMixin
+from .conditional import BedingteAntwortMixin, antwort, bedingt
+from .models import Sorte, Kategorie, Art, PflanzplanEintrag, SorteJahresStatistik
+from .pagination import KeysetPaginator
+from .parallel import gather_queries
 from .serializers import SorteSerializer, KategorieSerializer, ArtSerializer, PflanzplanEintragSerializer
-from .forms import SorteForm, PflanzplanForm, KategorieForm, ArtForm
+from .forms import SorteForm, PflanzplanForm, PflanzplanFilterForm, KategorieForm, ArtForm
+
+# Whitelisted ?sort= values and the full keyset ordering behind each of them.
+# Every ordering ends in 'id' so the keyset paginator can seek unambiguously.
+PFLANZPLAN_SORTIERUNGEN = {
+    'jahr': ('jahr', 'aussaatdatum', 'id'),
+    '-jahr': ('-jahr', 'aussaatdatum', 'id'),
+    'sorte__name': ('sorte__name', '-jahr', 'aussaatdatum', 'id'),
+    '-sorte__name': ('-sorte__name', '-jahr', 'aussaatdatum', 'id'),
+    'sorte__kategorie__name': ('kategorie_name', 'sorte__name', '-jahr', 'aussaatdatum', 'id'),
+    '-sorte__kategorie__name': ('-kategorie_name', 'sorte__name', '-jahr', 'aussaatdatum', 'id'),
+    'aussaatdatum': ('aussaatdatum', 'id'),
+    '-aussaatdatum': ('-aussaatdatum', '-id'),
+}
+SORTE_SORTIERUNG = ('kategorie_name', 'name', 'id')
+
+# The read-heavy pages below are async views: their independent queries run
+# concurrently through gather_queries() and the (sync) template rendering is
+# handed to a thread. Under WSGI Django simply runs them in an event loop.
+
+async def arender(request, template_name, context):
+    # login_required already loaded the user through request.auser(); reuse it
+    # so the template's {{ user }} does not query it a second time.
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
 
 @login_required
-def index(request):
+async def index(request):
+    sorten_count, pflanzplan_count = await gather_queries(
+        Sorte.objects.count,
+        PflanzplanEintrag.objects.count,
+    )
     context = {
-        'sorten_count': Sorte.objects.count(),
-        'pflanzplan_count': PflanzplanEintrag.objects.count(),
+        'sorten_count': sorten_count,
+        'pflanzplan_count': pflanzplan_count,
     }
-    return render(request, 'garten/index.html', context)
+    return await arender(request, 'garten/index.html', context)
 
 @login_required
-def sorte_list(request):
-    queryset = Sorte.objects.all().select_related('kategorie', 'art')
-    
-    kategorie_id = request.GET.get('kategorie')
-    if kategorie_id:
-        queryset = queryset.filter(kategorie_id=kategorie_id)
+@bedingt(Sorte, Kategorie, Art)
+async def sorte_list(request):
+    queryset = Sorte.objects.all().select_related('kategorie', 'art').annotate(
+        kategorie_name=Coalesce('kategorie__name', Value('')),
+    )
 
+    kategorie_id = request.GET.get('kategorie')
     art_id = request.GET.get('art')
-    if art_id:
-        queryset = queryset.filter(art_id=art_id)
-        
-    kategorien = Kategorie.objects.all()
-    arten = Art.objects.all()
+    queryset = export.filter_sorten(queryset, kategorie_id, art_id)
+
+    paginator = KeysetPaginator(queryset, SORTE_SORTIERUNG)
+    # A cached row is keyed on its updated_at and on zeilen_version for the
+    # Kategorie and Art names it shows, see the {% cache %} in the template
+    page, kategorien, arten, zeilen_version = await gather_queries(
+        partial(paginator.page, request.GET.get('cursor')),
+        filter_options.kategorien,
+        filter_options.arten,
+        partial(filter_options.versionen, Kategorie, Art),
+    )
     
     context = {
-        'sorten': queryset,
+        'sorten': page.object_list,
+        'page': page,
         'kategorien': kategorien,
         'arten': arten,
+        'zeilen_version': zeilen_version,
         'selected_kategorie': int(kategorie_id) if kategorie_id else None,
         'selected_art': int(art_id) if art_id else None,
     }
-    return render(request, 'garten/sorte_list.html', context)
+    return await arender(request, 'garten/sorte_list.html', context)
+
+@login_required
+async def aussaat_kalender(request):
+    # Invalid input falls back to the current month instead of an error page
+    try:
+        maske = kalender.maske_aus_parametern(request.GET)
+    except ValueError:
+        maske = kalender.maske_aus_parametern({})
+    queryset = Sorte.objects.all().select_related('kategorie').annotate(
+        kategorie_name=Coalesce('kategorie__name', Value('')),
+    )
+    kategorie_id = request.GET.get('kategorie')
+    queryset = kalender.filter_saebar(export.filter_sorten(queryset, kategorie_id), maske)
+
+    paginator = KeysetPaginator(queryset, SORTE_SORTIERUNG)
+    page, kategorien = await gather_queries(
+        partial(paginator.page, request.GET.get('cursor')),
+        filter_options.kategorien,
+    )
+    gewaehlt = kalender.monate(maske)
+    context = {
+        'sorten': page.object_list,
+        'page': page,
+        'kategorien': kategorien,
+        'monate': list(enumerate(kalender.MONATE, start=1)),
+        'gewaehlt': gewaehlt,
+        'selected_monat': gewaehlt[0] if len(gewaehlt) == 1 else None,
+        'selected_kategorie': int(kategorie_id) if kategorie_id else None,
+    }
+    return await arender(request, 'garten/kalender.html', context)
 
 @login_required
 def sorte_create(request):
@@ -50,44 +131,79 @@ def sorte_create(request):
     return render(request, 'garten/sorte_form.html', {'form': form})
 
 @login_required
-def pflanzplan_list(request):
+@bedingt(PflanzplanEintrag, Sorte, Kategorie)
+async def pflanzplan_list(request):
     # Base QuerySet
-    queryset = PflanzplanEintrag.objects.all().select_related('sorte', 'sorte__kategorie')
+    queryset = PflanzplanEintrag.objects.all().select_related('sorte', 'sorte__kategorie').annotate(
+        kategorie_name=Coalesce('sorte__kategorie__name', Value('')),
+    )
 
     # Filtering
     jahr = request.GET.get('jahr')
     kategorie_id = request.GET.get('kategorie')
     sorte_id = request.GET.get('sorte')
+    queryset = export.filter_pflanzplan(queryset, jahr, kategorie_id, sorte_id)
 
-    if jahr:
-        queryset = queryset.filter(jahr=jahr)
-    if kategorie_id:
-        queryset = queryset.filter(sorte__kategorie_id=kategorie_id)
-    if sorte_id:
-        queryset = queryset.filter(sorte_id=sorte_id)
-
-    # Sorting
+    # Sorting + keyset pagination
     sort_by = request.GET.get('sort', '-jahr') # Default sort
-    if sort_by in ['jahr', '-jahr', 'sorte__name', '-sorte__name', 'sorte__kategorie__name', '-sorte__kategorie__name', 'aussaatdatum', '-aussaatdatum']:
-        queryset = queryset.order_by(sort_by)
-    else:
-        queryset = queryset.order_by('-jahr', 'aussaatdatum')
+    ordering = PFLANZPLAN_SORTIERUNGEN.get(sort_by, PFLANZPLAN_SORTIERUNGEN['-jahr'])
+    paginator = KeysetPaginator(queryset, ordering)
 
-    # Context Data for Filters
-    jahre = PflanzplanEintrag.objects.values_list('jahr', flat=True).distinct().order_by('-jahr')
-    kategorien = Kategorie.objects.all()
-    sorten = Sorte.objects.all()
+    # Main table and the filter dropdowns (cached, see filter_options) side by side
+    # A cached row is keyed on the updated_at of the entry and its Sorte and on
+    # zeilen_version for the Kategorie name, see the {% cache %} in the template
+    page, jahre, kategorien, zeilen_version = await gather_queries(
+        partial(paginator.page, request.GET.get('cursor')),
+        filter_options.jahre,
+        filter_options.kategorien,
+        partial(filter_options.versionen, Kategorie),
+    )
 
     context = {
-        'pflanzplaene': queryset,
+        'pflanzplaene': page.object_list,
+        'page': page,
         'jahre': jahre,
         'kategorien': kategorien,
-        'sorten': sorten,
+        # Searches through the auswahl view instead of listing the catalogue;
+        # unbound, a bound form would validate itself while rendering
+        'filter_form': PflanzplanFilterForm(initial={'sorte': sorte_id}),
+        'zeilen_version': zeilen_version,
         'selected_jahr': int(jahr) if jahr else None,
         'selected_kategorie': int(kategorie_id) if kategorie_id else None,
-        'selected_sorte': int(sorte_id) if sorte_id else None,
     }
-    return render(request, 'garten/pflanzplan_list.html', context)
+    return await arender(request, 'garten/pflanzplan_list.html', context)
+
+def _export_response(request, dateiname, titel, zeilen, **parameter):
+    # Checked here: once the response streams, an error can only cut it off
+    dateiformat = request.GET.get('format') or 'csv'
+    if dateiformat not in export.FORMATE:
+        return HttpResponseBadRequest(f"Unbekanntes Format: {dateiformat!r}")
+    try:
+        werte = export.filter_werte(**{param: request.GET.get(param) for param in parameter.values()})
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    header, rows = zeilen(**{name: werte[param] for name, param in parameter.items()})
+    if dateiformat == 'xlsx':
+        chunks = export.xlsx_chunks(titel, header, rows)
+        return export.streaming_response(request, chunks, export.XLSX_CONTENT_TYPE, f'{dateiname}.xlsx')
+    chunks = export.csv_chunks(header, rows)
+    return export.streaming_response(request, chunks, 'text/csv; charset=utf-8', f'{dateiname}.csv')
+
+@login_required
+def pflanzplan_export(request):
+    """The filtered Pflanzplan as ?format=csv (default) or xlsx."""
+    return _export_response(
+        request, 'pflanzplan', 'Pflanzplan', export.pflanzplan_zeilen,
+        jahr='jahr', kategorie_id='kategorie', sorte_id='sorte',
+    )
+
+@login_required
+def sorte_export(request):
+    """The filtered Sorten catalogue as ?format=csv (default) or xlsx."""
+    return _export_response(
+        request, 'sorten', 'Sorten', export.sorte_zeilen, kategorie_id='kategorie', art_id='art',
+    )
 
 @login_required
 def pflanzplan_create(request):
@@ -122,23 +238,72 @@ def art_create(request):
         form = ArtForm()
     return render(request, 'garten/art_form.html', {'form': form})
 
-class KategorieViewSet(LoginRequiredMixin, viewsets.ModelViewSet):
+# bedingt_modelle: every model whose rows show up in the responses (ETag/304, see conditional)
+
+class KategorieViewSet(LoginRequiredMixin, BedingteAntwortMixin, viewsets.ModelViewSet):
     queryset = Kategorie.objects.all()
     serializer_class = KategorieSerializer
+    bedingt_modelle = (Kategorie,)
 
-class ArtViewSet(LoginRequiredMixin, viewsets.ModelViewSet):
+class ArtViewSet(LoginRequiredMixin, BedingteAntwortMixin, viewsets.ModelViewSet):
     queryset = Art.objects.all()
     serializer_class = ArtSerializer
+    bedingt_modelle = (Art,)
 
-class SorteViewSet(LoginRequiredMixin, viewsets.ModelViewSet):
-    queryset = Sorte.objects.all()
+class SorteViewSet(LoginRequiredMixin, BedingteAntwortMixin, BulkAktionenMixin, viewsets.ModelViewSet):
+    queryset = Sorte.objects.all().select_related('kategorie', 'art')
     serializer_class = SorteSerializer
+    bedingt_modelle = (Sorte, Kategorie, Art)
+
+    def bulk_verbuchen(self, objekte, vorher):
+        if vorher is None:
+            bestand.eroeffnen(objekte)
+        else:
+            bestand.korrekturen_buchen(objekte, vorher)
 
-class PflanzplanEintragViewSet(LoginRequiredMixin, viewsets.ModelViewSet):
-    queryset = PflanzplanEintrag.objects.all()
+    @action(detail=False, methods=['get'])
+    def kalender(self, request):
+        """Sorten that may be sown in ?monat=1-12 or between ?von= and ?bis= (dates); default this month."""
+        try:
+            maske = kalender.maske_aus_parametern(request.query_params)
+        except ValueError:
+            raise serializers.ValidationError({'detail': 'Ungültiger Monat oder Zeitraum.'})
+        queryset = kalender.filter_saebar(self.get_queryset(), maske)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def jahresplan(self, request):
+        """Every Sorte (optionally of one ?kategorie=) with its twelve sowing months, in one query."""
+        def erzeugen():
+            queryset = export.filter_sorten(Sorte.objects.all(), request.query_params.get('kategorie'))
+            zeilen = queryset.order_by('kategorie__name', 'name', 'id').values_list(
+                'id', 'name', 'kategorie__name', 'aussaat_monate')
+            return Response({
+                'monate': kalender.MONATE,
+                'sorten': [
+                    {'id': pk, 'name': name, 'kategorie': kategorie,
+                     'monate': [bool(maske & (1 << monat)) for monat in range(12)]}
+                    for pk, name, kategorie, maske in zeilen
+                ],
+            })
+        return antwort(request, (Sorte, Kategorie), erzeugen)
+
+class PflanzplanEintragViewSet(LoginRequiredMixin, BedingteAntwortMixin, BulkAktionenMixin, viewsets.ModelViewSet):
+    queryset = PflanzplanEintrag.objects.all().select_related('sorte')
     serializer_class = PflanzplanEintragSerializer
+    bedingt_modelle = (PflanzplanEintrag, Sorte)
+
+    def bulk_verbuchen(self, objekte, vorher):
+        bestand.aussaaten_buchen(objekte, neu=vorher is None)
+
+    def bulk_nachbereiten(self, objekte, vorher):
+        super().bulk_nachbereiten(objekte, vorher)
+        # Both the old and the new bucket of entries that moved to another sorte/jahr
+        statistik.aktualisiere({(eintrag.sorte_id, eintrag.jahr) for eintrag in [*objekte, *vorher]})
 
 @login_required
+@bedingt(Kategorie)
 def kategorie_list(request):
     kategorien = Kategorie.objects.all()
     return render(request, 'garten/kategorie_list.html', {'kategorien': kategorien})
@@ -148,8 +313,8 @@ def kategorie_update(request, pk):
     kategorie = get_object_or_404(Kategorie, pk=pk)
     if request.method == 'POST':
         form = KategorieForm(request.POST, instance=kategorie)
-        if form.is_valid():
-            form.save()
+        # speichern() redisplays the form if someone else saved in the meantime
+        if form.is_valid() and form.speichern():
             return redirect('kategorie_list')
     else:
         form = KategorieForm(instance=kategorie)
@@ -164,6 +329,7 @@ def kategorie_delete(request, pk):
     return render(request, 'garten/confirm_delete.html', {'object': kategorie, 'type': 'Kategorie'})
 
 @login_required
+@bedingt(Art)
 def art_list(request):
     arten = Art.objects.all()
     return render(request, 'garten/art_list.html', {'arten': arten})
@@ -173,8 +339,7 @@ def art_update(request, pk):
     art = get_object_or_404(Art, pk=pk)
     if request.method == 'POST':
         form = ArtForm(request.POST, instance=art)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.speichern():
             return redirect('art_list')
     else:
         form = ArtForm(instance=art)
@@ -193,8 +358,7 @@ def sorte_update(request, pk):
     sorte = get_object_or_404(Sorte, pk=pk)
     if request.method == 'POST':
         form = SorteForm(request.POST, instance=sorte)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.speichern():
             return redirect('sorte_list')
     else:
         form = SorteForm(instance=sorte)
@@ -217,22 +381,19 @@ def pflanzplan_delete(request, pk):
     return render(request, 'garten/confirm_delete.html', {'object': eintrag, 'type': 'Pflanzplan-Eintrag'})
 
 @login_required
-def sorte_analyse(request):
+async def sorte_analyse(request):
     sorte_query = request.GET.get('lookup_id', '')
     jahr_filter = request.GET.get('jahr', '')
     
-    # All varieties for the datalist / dropdown
-    alle_sorten = Sorte.objects.all().order_by('name')
-    
-    # Available years for filtering
-    jahre = PflanzplanEintrag.objects.values_list('jahr', flat=True).distinct().order_by('-jahr')
-    
     eintraege = []
+    statistiken = []
     selected_sorte = None
     
     if sorte_query:
-        # Try to find the exact variety by name
-        selected_sorte = Sorte.objects.filter(name=sorte_query).first()
+        # Try to find the variety by name (case-insensitive, uses sorte_name_upper_idx)
+        selected_sorte = await Sorte.objects.select_related('kategorie', 'art').filter(
+            name__iexact=sorte_query,
+        ).order_by('id').afirst()
         
         if selected_sorte:
             eintraege = PflanzplanEintrag.objects.filter(sorte=selected_sorte).select_related('sorte', 'sorte__kategorie')
@@ -240,12 +401,74 @@ def sorte_analyse(request):
                 eintraege = eintraege.filter(jahr=jahr_filter)
             eintraege = eintraege.order_by('-jahr', '-aussaatdatum')
 
+            # Precomputed per-year figures, O(years) rows (see garten.statistik)
+            statistiken = SorteJahresStatistik.objects.filter(sorte=selected_sorte).order_by('-jahr')
+            if jahr_filter:
+                statistiken = statistiken.filter(jahr=jahr_filter)
+
+    # Available years for filtering, plus the entries and figures of the selected Sorte
+    jahre, eintraege, statistiken = await gather_queries(
+        filter_options.jahre,
+        partial(list, eintraege),
+        partial(list, statistiken),
+    )
+
     context = {
-        'alle_sorten': alle_sorten,
         'jahre': jahre,
         'eintraege': eintraege,
+        'statistiken': statistiken,
         'selected_sorte': selected_sorte,
         'sorte_query': sorte_query,
         'selected_jahr': int(jahr_filter) if jahr_filter else None,
     }
-    return render(request, 'garten/sorte_analyse.html', context)
+    return await arender(request, 'garten/sorte_analyse.html', context)
+
+AUSWAHL_MODELLE = {model._meta.model_name: model for model in (Sorte, Kategorie, Art)}
+AUSWAHL_SEITE = 20
+
+@login_required
+def auswahl(request, modell):
+    """
+    Options for the AuswahlWidget (forms.py): rows of `modell` whose name
+    contains ?q=, by name, AUSWAHL_SEITE at a time; ?cursor= is the "next"
+    of the previous page.
+    """
+    model = AUSWAHL_MODELLE.get(modell)
+    if model is None:
+        return JsonResponse({'detail': 'Unbekannte Auswahl.'}, status=404)
+    queryset = model.objects.only('id', 'name')
+    query = request.GET.get('q', '').strip()
+    if query:
+        queryset = queryset.filter(name__icontains=query)
+    page = KeysetPaginator(queryset, ('name', 'id'), page_size=AUSWAHL_SEITE).page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [{'id': obj.pk, 'name': obj.name} for obj in page],
+        'next': page.next_cursor,
+    })
+
+@login_required
+def bestand_knapp(request):
+    # Worst first; one aggregate query, see bestand.knapp()
+    sorten = list(bestand.knapp(settings.BESTAND_KNAPP_TAGE)[:settings.BESTAND_KNAPP_LIMIT + 1])
+    return render(request, 'garten/bestand_knapp.html', {
+        'sorten': sorten[:settings.BESTAND_KNAPP_LIMIT],
+        'gekuerzt': len(sorten) > settings.BESTAND_KNAPP_LIMIT,
+        'tage': settings.BESTAND_KNAPP_TAGE,
+    })
+
+@login_required
+def api_sync(request):
+    """Rows created, updated and deleted since ?since=<token>, see garten.sync."""
+    try:
+        kopf, ab = sync.aenderungen(request.GET.get('since'))
+    except sync.UngueltigerToken:
+        return JsonResponse({'detail': 'Ungültiger Token.'}, status=400)
+    return export.streaming_response(request, sync.json_chunks(kopf, ab), 'application/json')
+
+def prometheus_metrics(request):
+    """Request metrics of this worker process in the Prometheus text format."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scraper = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (scraper or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,47 @@
+# Gunicorn-Konfiguration für den Produktionsbetrieb
+# Alle Werte lassen sich über Umgebungsvariablen (.env.prod) überschreiben.
+import os
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def available_cpus():
+    # Respects CPU pinning (docker --cpuset-cpus), unlike os.cpu_count()
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Workers: 2 * CPUs + 1, capped so small hosts do not run out of memory
+workers = env_int("GUNICORN_WORKERS", min(2 * available_cpus() + 1, env_int("GUNICORN_MAX_WORKERS", 8)))
+# Threads let one worker overlap requests that wait on PostgreSQL
+threads = env_int("GUNICORN_THREADS", 4)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread" if threads > 1 else "sync")
+# uvicorn_worker.UvicornWorker serves the async views natively and needs the ASGI entry point
+wsgi_app = "shg.asgi:application" if "uvicorn" in worker_class.lower() else "shg.wsgi:application"
+
+# Load Django once in the master; workers fork with the app already imported
+preload_app = True
+
+# Recycle workers regularly (jitter avoids all of them restarting at once)
+max_requests = env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+timeout = env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = env_int("GUNICORN_KEEPALIVE", 5)
+
+# Heartbeat files in RAM instead of the container's overlay filesystem
+worker_tmp_dir = "/dev/shm"
+
+# Access log to stdout incl. request duration (%(D)s = microseconds)
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+access_log_format = '%(h)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(a)s" %(D)sus'
@@ -1,56 +1,97 @@
 #!/bin/bash
 
 # Script to restore the SHG PostgreSQL database
-# Usage: ./restore_db.sh <path_to_backup_file.sql.gz>
+# Usage: ./restore_db.sh <backup_file> [snapshot_file ...]
+#
+#   backup_file    backup_shg_*.tar.zst from backup_db.sh (restored with parallel
+#                  pg_restore jobs) or an old plain backup_shg_*.sql[.gz]
+#   snapshot_file  snapshot_shg_*.jsonl.zst from snapshot_db.sh, taken after the
+#                  backup; applied in the given order
+#
+# BACKUP_JOBS (environment or .env.prod) sets the pg_restore jobs (default: CPUs
+# of the db container).
+
+set -euo pipefail
 
 CONTAINER_NAME="django_db"
 ENV_FILE=".env.prod"
 
-if [ -z "$1" ]; then
-    echo "Usage: $0 <path_to_backup_file.sql.gz>"
+if [ -z "${1:-}" ]; then
+    echo "Usage: $0 <backup_file> [snapshot_file ...]"
     exit 1
 fi
 
 BACKUP_FILE="$1"
+shift
 
-if [ ! -f "$BACKUP_FILE" ]; then
-    echo "Error: File $BACKUP_FILE not found."
-    exit 1
-fi
+for FILE in "$BACKUP_FILE" "$@"; do
+    if [ ! -f "$FILE" ]; then
+        echo "Error: File $FILE not found."
+        exit 1
+    fi
+done
 
 # Extract DB config
-DB_USER=$(grep "^POSTGRES_USER=" $ENV_FILE | cut -d '=' -f2 | tr -d '\r"')
-DB_NAME=$(grep "^POSTGRES_DB=" $ENV_FILE | cut -d '=' -f2 | tr -d '\r"')
+setting() {
+    local value="${!1:-}"
+    if [ -z "$value" ]; then
+        value=$(grep "^$1=" "$ENV_FILE" | tail -n 1 | cut -d '=' -f2- | tr -d '\r"' || true)
+    fi
+    echo "${value:-$2}"
+}
+DB_USER=$(setting POSTGRES_USER "")
+DB_NAME=$(setting POSTGRES_DB "")
+JOBS=$(setting BACKUP_JOBS "$(docker exec "$CONTAINER_NAME" nproc)")
 
 echo "⚠️  WARNING: THIS WILL OVERWRITE THE CURRENT DATABASE '$DB_NAME'!"
 echo "All current data will be lost/replaced by the backup."
 echo "Backup file: $BACKUP_FILE"
+if [ $# -gt 0 ]; then
+    echo "Snapshots: $*"
+fi
 read -p "Are you sure you want to continue? (yes/no): " CONFIRM
 
 if [ "$CONFIRM" != "yes" ]; then
-    echo "Registration cancelled."
+    echo "Restore cancelled."
     exit 0
 fi
 
 echo "Stopping Django app to release DB connections..."
 docker compose -f docker-compose.prod.yml stop web
 
+# Restart the app whatever happens below
+trap 'echo "Restarting Django app..."; docker compose -f docker-compose.prod.yml start web' EXIT
+
 echo "Restoring database..."
 
-# Check if file is gzipped
-if [[ "$BACKUP_FILE" == *.gz ]]; then
-    # Unzip and pipe to psql
-    gunzip -c "$BACKUP_FILE" | docker exec -i $CONTAINER_NAME psql -U "$DB_USER" -d "$DB_NAME"
-else
-    # Pipe plain sql
-    cat "$BACKUP_FILE" | docker exec -i $CONTAINER_NAME psql -U "$DB_USER" -d "$DB_NAME"
-fi
+case "$BACKUP_FILE" in
+    *.tar.zst)
+        # Unpack the directory-format dump inside the container, restore with parallel jobs
+        DUMP_DIR="/tmp/shg_restore_$(date +%s)"
+        zstd -dc "$BACKUP_FILE" | docker exec -i "$CONTAINER_NAME" sh -c '
+            set -e
+            trap "rm -rf \"$1\"" EXIT
+            mkdir -p "$1"
+            tar -C "$1" -xf -
+            pg_restore -U "$2" -d "$3" --jobs="$4" --clean --if-exists --no-owner "$1"
+        ' sh "$DUMP_DIR" "$DB_USER" "$DB_NAME" "$JOBS"
+        ;;
+    *.gz)
+        # Old plain-SQL backups
+        gunzip -c "$BACKUP_FILE" | docker exec -i "$CONTAINER_NAME" psql -U "$DB_USER" -d "$DB_NAME"
+        ;;
+    *)
+        docker exec -i "$CONTAINER_NAME" psql -U "$DB_USER" -d "$DB_NAME" < "$BACKUP_FILE"
+        ;;
+esac
+echo "✅ Database restored successfully."
 
-if [ $? -eq 0 ]; then
-    echo "✅ Database restored successfully."
-else
-    echo "❌ Restore failed."
+if [ $# -gt 0 ]; then
+    # snapshot_import runs in a one-off app container, the web service is stopped
+    for SNAPSHOT in "$@"; do
+        echo "Applying snapshot $SNAPSHOT..."
+        zstd -dc "$SNAPSHOT" | docker compose -f docker-compose.prod.yml run --rm -T --no-deps web \
+            python manage.py snapshot_import -
+    done
+    echo "✅ Snapshots applied."
 fi
-
-echo "Restarting Django app..."
-docker compose -f docker-compose.prod.yml start web
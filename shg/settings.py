@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timing covers all other middleware
+    'garten.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,15 +73,25 @@ ROOT_URLCONF = 'shg.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # django.template.backends.django.DjangoTemplates plus render timing
+        'BACKEND': 'garten.metrics.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Production parses every template once per process; DEBUG re-reads them on change
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ] if DEBUG else [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -90,6 +102,9 @@ WSGI_APPLICATION = 'shg.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+def env_flag(name, default="False"):
+    return str(os.getenv(name, default)).lower() in ("true", "1", "yes", "on")
+
 DATABASES = {
     'default': {
         "ENGINE": "django.db.backends.postgresql",
@@ -98,9 +113,66 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT"),
+        # Keep connections open between requests instead of a new TCP/auth handshake each time
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
 
+# Async views: run the independent queries of a page on separate threads (each
+# with its own connection) so the page waits for the slowest query instead of
+# the sum of all of them. On by default with DB_POOL, whose pool hands those
+# threads their connections; see garten/parallel.py.
+DB_PARALLEL_QUERIES = env_flag("DB_PARALLEL_QUERIES", os.getenv("DB_POOL", "False"))
+DB_PARALLEL_QUERY_THREADS = int(os.getenv("DB_PARALLEL_QUERY_THREADS", "4"))
+
+# Connection modes (.env.prod):
+# - default: persistent connections, one per Gunicorn worker thread
+# - DB_POOL=1: psycopg3's pool inside each worker process (max size defaults to
+#   GUNICORN_THREADS plus the parallel query threads, since a worker never needs
+#   more connections than threads)
+# - DB_PGBOUNCER=1: behind a transaction-pooling proxy; no server-side cursors or
+#   prepared statements, because consecutive transactions may hit different backends
+if env_flag("DB_PGBOUNCER"):
+    DATABASES['default']["DISABLE_SERVER_SIDE_CURSORS"] = True
+    DATABASES['default']["OPTIONS"]["prepare_threshold"] = None
+elif env_flag("DB_POOL"):
+    DATABASES['default']["CONN_MAX_AGE"] = 0  # Django requires this with a pool
+    DATABASES['default']["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.getenv(
+            "DB_POOL_MAX_SIZE",
+            int(os.getenv("GUNICORN_THREADS", "4")) + (DB_PARALLEL_QUERY_THREADS if DB_PARALLEL_QUERIES else 0),
+        )),
+        "timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+    }
+elif "uvicorn" in os.getenv("GUNICORN_WORKER_CLASS", "").lower():
+    # Under ASGI each request runs on a thread of its own, so persistent
+    # connections would pile up per thread; use DB_POOL=1 there instead
+    DATABASES['default']["CONN_MAX_AGE"] = 0
+
+
+# Cache
+# LocMemCache is per process; with several Gunicorn workers use a shared
+# backend (e.g. FileBasedCache) so signal-based invalidation reaches all of them.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    },
+    # Rendered table rows ({% cache ... using="fragmente" %}). Per process on
+    # purpose: one lookup per row must not cost a file read. The keys carry the
+    # row's updated_at and versions from "default", so a change still reaches
+    # every worker.
+    "fragmente": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragmente",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "20000"))},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -157,6 +229,55 @@ STORAGES = {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# REST API
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'garten.pagination.ApiCursorPagination',
+    'PAGE_SIZE': int(os.getenv("API_PAGE_SIZE", "100")),
+}
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "500"))
+# Items per request of the /api/<resource>/bulk/ actions (garten/bulk.py)
+API_MAX_BULK_SIZE = int(os.getenv("API_MAX_BULK_SIZE", "1000"))
+
+# Delta sync /api/sync/ (garten/sync.py). Every sync re-sends the changes of the
+# last SYNC_OVERLAP_SECONDS, so rows from transactions that committed late are
+# not lost. Tombstones are kept SYNC_TOMBSTONE_DAYS; older tokens get a full sync.
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "300"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))
+
+# Low-stock report /bestand/knapp/ (garten/bestand.py): Sorten whose bestand is
+# below what was sown from them in the last BESTAND_KNAPP_TAGE days
+BESTAND_KNAPP_TAGE = int(os.getenv("BESTAND_KNAPP_TAGE", "365"))
+BESTAND_KNAPP_LIMIT = int(os.getenv("BESTAND_KNAPP_LIMIT", "200"))
+
+# Request metrics (garten/metrics.py): Server-Timing header and /metrics.
+# The header tells every visitor how many queries a page runs and how long
+# they take, so outside DEBUG it is off unless switched on explicitly.
+METRICS_SERVER_TIMING = env_flag("METRICS_SERVER_TIMING", str(DEBUG))
+# Bearer token for Prometheus; without it only staff users may read /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Query ceiling per view name for GET/HEAD (incl. session and user lookups).
+# Going over is logged, or raises garten.metrics.QueryBudgetExceeded with
+# QUERY_BUDGET_STRICT. Writes are not budgeted.
+# After a change the ETag (garten/conditional.py) adds one Count/Max per model shown.
+QUERY_BUDGETS = {
+    'index': 5,
+    'pflanzplan_list': 11,
+    'sorte_list': 10,
+    'sorte_analyse': 10,
+    'auswahl': 5,
+    'pflanzplaneintrag-list': 7,
+    'pflanzplaneintrag-detail': 7,
+    'sorte-list': 8,
+    'sorte-detail': 8,
+    'sorte-kalender': 5,
+    'sorte-jahresplan': 6,
+    'aussaat_kalender': 5,
+    'bestand_knapp': 4,
+    'kategorie-list': 5,
+    'art-list': 5,
+}
+QUERY_BUDGET_STRICT = env_flag("QUERY_BUDGET_STRICT")
+
 # Authentication Settings
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'index'
@@ -0,0 +1,47 @@
+#!/bin/bash
+
+# Lightweight snapshot of the garten tables: only the rows changed since the
+# last full backup or snapshot (see garten/snapshot.py), as zstd-compressed JSON Lines.
+# Usage: ./snapshot_db.sh [optional_output_directory]
+#
+# Cheap enough to run every few minutes. Restore the last full backup, then the
+# snapshots taken after it, in order:
+#   ./restore_db.sh backups/daily/backup_shg_<...>.tar.zst backups/snapshots/snapshot_shg_<...>.jsonl.zst ...
+
+set -euo pipefail
+
+APP_CONTAINER="django_app"
+
+if ! command -v zstd > /dev/null; then
+    echo "Error: zstd is not installed (apt install zstd)."
+    exit 1
+fi
+
+OUTPUT_DIR="${1:-./backups}/snapshots"
+TOKEN_FILE="$OUTPUT_DIR/.token"
+mkdir -p "$OUTPUT_DIR"
+
+if [ ! -s "$TOKEN_FILE" ]; then
+    echo "Error: $TOKEN_FILE not found. Run ./backup_db.sh first, snapshots build on a full backup."
+    exit 1
+fi
+SINCE=$(cat "$TOKEN_FILE")
+
+TIMESTAMP=$(date +"%Y-%m-%d_%H-%M-%S")
+SNAPSHOT_FILE="$OUTPUT_DIR/snapshot_shg_${TIMESTAMP}.jsonl.zst"
+PARTIAL_FILE="$SNAPSHOT_FILE.partial"
+LOG_FILE="$PARTIAL_FILE.log"
+
+trap 'rm -f "$PARTIAL_FILE" "$LOG_FILE"' EXIT
+
+if ! docker exec "$APP_CONTAINER" python manage.py snapshot_export --seit "$SINCE" 2> "$LOG_FILE" \
+        | zstd -T0 -q -o "$PARTIAL_FILE"; then
+    cat "$LOG_FILE"
+    echo "❌ Snapshot failed!"
+    exit 1
+fi
+
+TOKEN=$(sed -n 's/^Token: //p' "$LOG_FILE")
+mv "$PARTIAL_FILE" "$SNAPSHOT_FILE"
+echo "$TOKEN" > "$TOKEN_FILE"
+echo "✅ Snapshot successful: $SNAPSHOT_FILE ($(du -h "$SNAPSHOT_FILE" | cut -f1))"